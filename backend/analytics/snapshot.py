@@ -0,0 +1,260 @@
+"""
+Local columnar snapshot of Soil_Sample.
+
+Each column is a .npy file that analysis jobs open with np.load(mmap_mode="r"),
+so any number of processes can share the pages without touching MySQL.
+Rows are kept sorted by soil_id. Nutrients are float64 with NaN for NULL,
+fertility_class_id uses -1 for NULL and sample_status is 0 (waiting) /
+1 (tested).
+
+sync() fetches only rows whose updated_at is at or after the stored
+watermark minus WATERMARK_OVERLAP_SECONDS and merges them in by soil_id. The
+overlap catches transactions that commit after the sync with an updated_at
+older than the watermark. Deleted rows are noticed by comparing row
+counts and then pruned against the live ID list. Every sync writes a new
+generation directory and switches manifest.json to it atomically, so
+readers that already have the previous generation mapped are not disturbed.
+
+    python -m analytics.snapshot --sync
+    python -m analytics.snapshot --rebuild
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pymysql
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "snapshots", "soil_sample")
+)
+MANIFEST = "manifest.json"
+FETCH_SIZE = 10000
+WATERMARK_OVERLAP_SECONDS = int(os.getenv("SNAPSHOT_OVERLAP_SECONDS", "5"))
+STATUS_CODES = {"waiting": 0, "tested": 1}
+
+COLUMNS = {
+    "soil_id": np.int64,
+    "farmer_id": np.int32,
+    "lab_id": np.int32,
+    **{col: np.float64 for col in NUTRIENT_COLUMNS},
+    "farm_latitude": np.float64,
+    "farm_longitude": np.float64,
+    "fertility_class_id": np.int16,
+    "sample_status": np.int8,
+    "test_date": "datetime64[s]",
+    "updated_at": "datetime64[s]",
+}
+
+
+class Snapshot:
+    """Read-only view of one snapshot generation; columns are memory-mapped."""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.watermark = manifest["watermark"]
+        self.row_count = manifest["row_count"]
+        self._columns = {}
+
+    def __getitem__(self, name):
+        if name not in self._columns:
+            if name not in COLUMNS:
+                raise KeyError(name)
+            self._columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    def __len__(self):
+        return self.row_count
+
+    def nutrients(self, columns=NUTRIENT_COLUMNS):
+        """Stack nutrient columns into an (n, len(columns)) array (this copies)."""
+        return np.column_stack([self[col] for col in columns])
+
+    def rows_for(self, soil_ids):
+        """Positions of `soil_ids` in the snapshot, -1 where absent."""
+        ids = self["soil_id"]
+        soil_ids = np.asarray(soil_ids, dtype=np.int64)
+        pos = np.searchsorted(ids, soil_ids)
+        pos[pos >= len(ids)] = 0
+        found = ids[pos] == soil_ids if len(ids) else np.zeros(len(soil_ids), dtype=bool)
+        return np.where(found, pos, -1)
+
+
+def _read_manifest(snapshot_dir):
+    path = os.path.join(snapshot_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def open_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    manifest = _read_manifest(snapshot_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No soil sample snapshot in {snapshot_dir}; run with --sync first")
+    return Snapshot(os.path.join(snapshot_dir, manifest["generation"]), manifest)
+
+
+def _to_columns(rows):
+    data = {name: [] for name in COLUMNS}
+    for row in rows:
+        for name in COLUMNS:
+            value = row[name]
+            if name == "fertility_class_id":
+                value = -1 if value is None else value
+            elif name == "sample_status":
+                value = STATUS_CODES.get(value, 0)
+            elif value is None:
+                value = np.nan
+            data[name].append(value)
+    return {name: np.array(values, dtype=COLUMNS[name]) for name, values in data.items()}
+
+
+def _empty_columns():
+    return {name: np.array([], dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _fetch_changed(conn, watermark, fetch_size=FETCH_SIZE, overlap=WATERMARK_OVERLAP_SECONDS):
+    """
+    Stream rows updated at or after `watermark` less `overlap` seconds (all
+    rows if None) in column chunks.
+    """
+    query = f"SELECT {', '.join(COLUMNS)} FROM Soil_Sample"
+    params = None
+    if watermark:
+        # Re-reading the overlap window also picks up late commits stamped
+        # before the watermark; _merge() replaces rows by soil_id, so
+        # re-applying an unchanged row is harmless.
+        query += " WHERE updated_at >= %s - INTERVAL %s SECOND"
+        params = (watermark, overlap)
+    with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield _to_columns(rows)
+
+
+def _merge(base, changes):
+    """Upsert `changes` into `base` by soil_id; both are dicts of column arrays."""
+    if not len(changes["soil_id"]):
+        return base
+    # Keep the last version of any soil_id that appears twice in the changes.
+    order = np.argsort(changes["soil_id"], kind="stable")
+    ids = changes["soil_id"][order]
+    last = np.append(ids[1:] != ids[:-1], True)
+    changes = {name: values[order][last] for name, values in changes.items()}
+
+    keep = ~np.isin(base["soil_id"], changes["soil_id"], assume_unique=True)
+    merged = {name: np.concatenate([base[name][keep], changes[name]]) for name in COLUMNS}
+    order = np.argsort(merged["soil_id"], kind="stable")
+    return {name: values[order] for name, values in merged.items()}
+
+
+def _prune_deleted(conn, columns):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS n FROM Soil_Sample")
+        if cursor.fetchone()["n"] == len(columns["soil_id"]):
+            return columns, 0
+        cursor.execute("SELECT soil_id FROM Soil_Sample")
+        live = np.array([row["soil_id"] for row in cursor.fetchall()], dtype=np.int64)
+    alive = np.isin(columns["soil_id"], live)
+    return {name: values[alive] for name, values in columns.items()}, int((~alive).sum())
+
+
+def _write_generation(snapshot_dir, columns, watermark, previous):
+    generation = f"gen-{(previous['sequence'] + 1) if previous else 1}"
+    path = os.path.join(snapshot_dir, generation)
+    os.makedirs(path, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(path, f"{name}.npy"), values)
+
+    manifest = {
+        "generation": generation,
+        "sequence": (previous["sequence"] + 1) if previous else 1,
+        "watermark": watermark,
+        "row_count": int(len(columns["soil_id"])),
+        "columns": list(COLUMNS),
+        "synced_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp = os.path.join(snapshot_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp, os.path.join(snapshot_dir, MANIFEST))
+    return manifest
+
+
+def _remove_old_generations(snapshot_dir, keep):
+    """Delete generation directories other than `keep` (the current and previous)."""
+    for entry in os.listdir(snapshot_dir):
+        if entry.startswith("gen-") and entry not in keep:
+            shutil.rmtree(os.path.join(snapshot_dir, entry), ignore_errors=True)
+
+
+def sync(snapshot_dir=SNAPSHOT_DIR, full=False):
+    """
+    Bring the snapshot up to date. Returns a summary dict with the number of
+    changed and deleted rows, the new row count and watermark.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    previous = None if full else _read_manifest(snapshot_dir)
+    if previous:
+        current = open_snapshot(snapshot_dir)
+        columns = {name: np.array(current[name]) for name in COLUMNS}
+        watermark = previous["watermark"]
+    else:
+        columns, watermark = _empty_columns(), None
+
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        chunks = list(_fetch_changed(conn, watermark))
+        changes = {
+            name: np.concatenate([chunk[name] for chunk in chunks]) if chunks else empty
+            for name, empty in _empty_columns().items()
+        }
+        changed = len(changes["soil_id"])
+        columns = _merge(columns, changes)
+        columns, deleted = _prune_deleted(conn, columns)
+    finally:
+        conn.close()
+
+    if len(columns["updated_at"]):
+        watermark = str(columns["updated_at"].max()).replace("T", " ")
+    manifest = _write_generation(snapshot_dir, columns, watermark, _read_manifest(snapshot_dir))
+    keep = {manifest["generation"], previous["generation"]} if previous else {manifest["generation"]}
+    _remove_old_generations(snapshot_dir, keep)
+    return {
+        "changed": changed,
+        "deleted": deleted,
+        "row_count": manifest["row_count"],
+        "watermark": watermark,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar Soil_Sample snapshot for analysis jobs")
+    parser.add_argument("--sync", action="store_true", help="fetch rows changed since the last sync")
+    parser.add_argument("--rebuild", action="store_true", help="discard the snapshot and fetch everything")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    if args.sync or args.rebuild:
+        summary = sync(args.dir, full=args.rebuild)
+        print(f"Synced {summary['changed']} changed and {summary['deleted']} deleted rows in "
+              f"{summary['seconds']:.1f}s; snapshot has {summary['row_count']} rows "
+              f"up to {summary['watermark']}.")
+    else:
+        snapshot = open_snapshot(args.dir)
+        print(f"Snapshot {snapshot.manifest['generation']}: {len(snapshot)} rows, "
+              f"watermark {snapshot.watermark}, synced {snapshot.manifest['synced_at']}")
+
+
+if __name__ == "__main__":
+    main()
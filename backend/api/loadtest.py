@@ -0,0 +1,96 @@
+"""
+Load test for the JSON API.
+
+Opens --clients keep-alive connections. Each client logs in with the given
+account (or not, with --no-login) and sends requests to --path until
+--requests in total have been sent. The script prints throughput, latency
+percentiles and a count per status code.
+
+    python -m api.loadtest --email farmer@example.com --password secret \\
+        --path /recommendations/crops --clients 200 --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+
+async def call(reader, writer, method, path, host, token=None, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n"
+    if token:
+        head += f"Authorization: Bearer {token}\r\n"
+    writer.write((head + "\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    data = await reader.readexactly(length) if length else b""
+    return status, data
+
+
+async def client(url, args, counter, latencies, statuses):
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    try:
+        token = None
+        if not args.no_login:
+            status, data = await call(reader, writer, "POST", "/login", url.netloc,
+                                      payload={"email": args.email, "password": args.password})
+            if status != 200:
+                raise SystemExit(f"Login failed with {status}: {data.decode()}")
+            token = json.loads(data)["token"]
+        payload = json.loads(args.body) if args.body else None
+        while counter[0] < args.requests:
+            counter[0] += 1
+            started = time.perf_counter()
+            status, _ = await call(reader, writer, args.method, args.path, url.netloc, token, payload)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    counter, latencies, statuses = [0], [], {}
+    started = time.perf_counter()
+    await asyncio.gather(*(client(url, args, counter, latencies, statuses) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.2f}s "
+          f"-> {len(latencies) / elapsed:.0f} requests/sec")
+    if len(ms):
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        print(f"Latency ms: p50 {p50:.1f} | p95 {p95:.1f} | p99 {p99:.1f} | max {ms.max():.1f}")
+    print("Status codes: " + ", ".join(f"{code}: {count}" for code, count in sorted(statuses.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the soil database JSON API")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--no-login", action="store_true", help="call the endpoint without a token")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--body", help="JSON body to send with each request")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=10000)
+    args = parser.parse_args()
+    if not args.no_login and not (args.email and args.password):
+        parser.error("--email and --password are required unless --no-login is given")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+"""
+Asyncio JSON API over the stored-procedure layer.
+
+A small HTTP/1.1 server (keep-alive, JSON bodies) built on asyncio streams,
+so farmers, technicians and admins can be served concurrently instead of
+one per main.py process. PyMySQL calls block, so each runs on a bounded
+ThreadPoolExecutor sized to the connection pool. Every request also holds
+a slot of a semaphore (MAX_CONCURRENT). A request that cannot get a slot
+within QUEUE_TIMEOUT seconds gets 503, and one whose handler runs longer
+than REQUEST_TIMEOUT gets 504.
+
+Logging in returns a bearer token that is kept in memory for
+SESSION_TTL seconds.
+
+    python -m api.server --port 8080
+
+    POST /login                          {"email", "password"}
+    GET  /labs/suggest?lat=..&lon=..
+    GET  /samples                        farmer's classified samples
+    POST /samples                        {"lab_id", "sample_name", optional nutrients}
+    GET  /samples/<soil_id>/results
+    GET  /labs/pending                   technician's lab queue
+    POST /samples/<soil_id>/results      {"nitrogen", ..., "moisture"}
+    GET  /recommendations/crops
+    GET  /recommendations/fertilizers?crop_id=..
+    GET  /crop-growth
+    GET  /reports/regions[?region=..]    admin
+    GET  /reports/crop-growth?region=..  admin, region's growth records with yield estimates
+    GET  /farms/nearby?lat=..&lon=..&radius_km=..[&limit=..]    admin
+    GET  /farms/nearest?lat=..&lon=..[&k=..]                     admin
+    GET  /farms?min_lat=..&min_lon=..&max_lat=..&max_lon=..      admin, map view
+    GET  /heatmap/<layer>/<zoom>/<x>/<y>[?region=..]             admin, nutrient or fertility_class grid
+    GET  /health
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+from db.connection import POOL_SIZE, get_connection, get_pool
+from db.lookup_cache import cache_stats
+from db import stored_procedures as sp
+from fertility.engine import NUTRIENT_COLUMNS
+from geo.heatmap import LAYERS, get_heatmap_tile
+from geo.spatial_index import farms_in_bbox, farms_within_radius, nearest_farms
+from ingest.validation import parse_nutrient
+from labs.routing import suggest_labs
+from ml.inference import (
+    CLASSIFIER_BACKEND, get_inference_service, start_inference_service, stop_inference_service
+)
+
+MAX_CONCURRENT = int(os.getenv("API_MAX_CONCURRENT", "200"))
+QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "2"))
+REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "10"))
+SESSION_TTL = float(os.getenv("API_SESSION_TTL", "3600"))
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class Sessions:
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def create(self, user):
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._users[token] = (user, time.monotonic() + self.ttl)
+        return token
+
+    def get(self, token):
+        with self._lock:
+            entry = self._users.get(token)
+            if entry and entry[1] < time.monotonic():
+                del self._users[token]
+                entry = None
+        return entry[0] if entry else None
+
+
+class Request:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.user = None
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return data
+
+    def arg(self, name, cast=str, required=True):
+        values = self.query.get(name)
+        if not values:
+            if required:
+                raise ApiError(400, f"Missing query parameter '{name}'")
+            return None
+        try:
+            return cast(values[0])
+        except ValueError:
+            raise ApiError(400, f"Invalid value for '{name}'")
+
+
+# --- handlers: plain blocking functions, run on the executor ---------------
+
+def login(request):
+    body = request.json()
+    user = sp.authenticate_user(body.get("email", ""), body.get("password", ""))
+    if not user:
+        raise ApiError(401, "Invalid email or password")
+    token = request.sessions.create(user)
+    return 200, {"token": token, "user_id": user["user_id"], "role": user["role"]}
+
+
+def suggest(request):
+    return 200, suggest_labs(request.arg("lat", float), request.arg("lon", float),
+                             request.arg("limit", int, required=False) or 3)
+
+
+def list_samples(request):
+    return 200, sp.get_all_classified_soil_samples(request.user["user_id"])
+
+
+def request_sample(request):
+    body = request.json()
+    farmer_id = request.user["user_id"]
+    coords = sp.get_farm_coordinates(farmer_id)
+    if not coords:
+        raise ApiError(400, "No farm location found; add a farm location first")
+    try:
+        lab_id = int(body["lab_id"])
+        nutrients = [parse_nutrient(body.get(col), col) for col in NUTRIENT_COLUMNS]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ApiError(400, f"Invalid sample request: {e}")
+    if lab_id not in {lab["lab_id"] for lab in sp.get_all_labs()}:
+        raise ApiError(400, f"Unknown lab {lab_id}")
+
+    args = [farmer_id, lab_id, *nutrients, coords["latitude"], coords["longitude"],
+            body.get("sample_name")]
+    if all(value is not None for value in nutrients):
+        result = sp.request_soil_sample_tested(*args)
+        return 201, {"status": "tested", "sample": result}
+    if any(value is not None for value in nutrients):
+        raise ApiError(400, "Send all nine nutrients for immediate processing, or none")
+    sp.request_soil_sample(*args)
+    return 201, {"status": "waiting"}
+
+
+def sample_results(request, soil_id):
+    sample = sp.get_soil_sample_results(int(soil_id))
+    if not sample:
+        raise ApiError(404, f"No results for soil sample {soil_id}")
+    user = request.user
+    if ((user["role"] == "Farmer" and sample["farmer_id"] != user["user_id"])
+            or (user["role"] == "Lab_Technician" and sample["lab_id"] != user["lab_id"])):
+        raise ApiError(403, "Not your soil sample")
+    return 200, sample
+
+
+def pending_samples(request):
+    return 200, sp.get_lab_pending_samples(request.user["lab_id"])
+
+
+def submit_results(request, soil_id):
+    soil_id = int(soil_id)
+    body = request.json()
+    try:
+        values = {col: parse_nutrient(body.get(col), col) for col in NUTRIENT_COLUMNS}
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    missing = [col for col, value in values.items() if value is None]
+    if missing:
+        raise ApiError(400, f"Missing nutrients: {', '.join(missing)}")
+    pending = {row["soil_id"] for row in sp.get_lab_pending_samples(request.user["lab_id"])}
+    if soil_id not in pending:
+        raise ApiError(404, f"Soil sample {soil_id} is not pending in your lab")
+    classes = sp.submit_soil_test_results_bulk([dict(values, soil_id=soil_id)])
+    if soil_id not in classes:
+        raise ApiError(409, f"Soil sample {soil_id} is no longer waiting for results")
+    return 200, {"soil_id": soil_id, "fertility_class_id": classes[soil_id]}
+
+
+def crop_recommendations(request):
+    latest = sp.get_latest_classified_soil_sample(request.user["user_id"])
+    if not latest:
+        raise ApiError(404, "No classified soil sample found")
+    return 200, {"fertility_class_id": latest["fertility_class_id"],
+                 "crops": sp.get_crop_recommendations(latest["fertility_class_id"])}
+
+
+def fertilizer_recommendations(request):
+    return 200, sp.get_fertilizer_recommendations(request.arg("crop_id", int))
+
+
+def crop_growth(request):
+    return 200, sp.get_crop_growth_with_estimates(request.user["user_id"])
+
+
+def region_reports(request):
+    region = request.arg("region", required=False)
+    conn = get_connection()
+    try:
+        if region:
+            return 200, sp.get_regional_fertility_reports(conn, region)
+        return 200, sp.get_all_regional_fertility_reports(conn)
+    finally:
+        conn.close()
+
+
+def region_crop_growth(request):
+    return 200, sp.get_region_crop_growth_with_estimates(request.arg("region"))
+
+
+def farms_nearby(request):
+    radius_km = request.arg("radius_km", float)
+    if radius_km <= 0:
+        raise ApiError(400, "radius_km must be positive")
+    return 200, farms_within_radius(request.arg("lat", float), request.arg("lon", float), radius_km,
+                                    request.arg("limit", int, required=False))
+
+
+def farms_nearest(request):
+    k = request.arg("k", int, required=False) or 5
+    if k <= 0:
+        raise ApiError(400, "k must be positive")
+    return 200, nearest_farms(request.arg("lat", float), request.arg("lon", float), k)
+
+
+def farms_in_area(request):
+    return 200, farms_in_bbox(request.arg("min_lat", float), request.arg("min_lon", float),
+                              request.arg("max_lat", float), request.arg("max_lon", float))
+
+
+def heatmap_tile(request, layer, zoom, x, y):
+    zoom, x, y = int(zoom), int(x), int(y)
+    if layer not in LAYERS:
+        raise ApiError(404, f"Unknown heatmap layer '{layer}'")
+    if zoom > 20 or x >= 2 ** zoom or y >= 2 ** zoom:
+        raise ApiError(404, f"No tile {zoom}/{x}/{y}")
+    grid = get_heatmap_tile(layer, zoom, x, y, request.arg("region", required=False))
+    # NaN (no tested farm in range) becomes null.
+    rows = [[None if math.isnan(value) else round(float(value), 2) for value in row] for row in grid]
+    return 200, {"layer": layer, "zoom": zoom, "x": x, "y": y, "grid": rows}
+
+
+# (method, path pattern, handler, roles allowed or None for no login)
+ROUTES = [
+    ("POST", r"/login", login, None),
+    ("GET", r"/labs/suggest", suggest, {"Farmer", "Admin"}),
+    ("GET", r"/samples", list_samples, {"Farmer"}),
+    ("POST", r"/samples", request_sample, {"Farmer"}),
+    ("GET", r"/samples/(\d+)/results", sample_results, {"Farmer", "Lab_Technician", "Admin"}),
+    ("POST", r"/samples/(\d+)/results", submit_results, {"Lab_Technician"}),
+    ("GET", r"/labs/pending", pending_samples, {"Lab_Technician"}),
+    ("GET", r"/recommendations/crops", crop_recommendations, {"Farmer"}),
+    ("GET", r"/recommendations/fertilizers", fertilizer_recommendations, {"Farmer", "Admin"}),
+    ("GET", r"/crop-growth", crop_growth, {"Farmer"}),
+    ("GET", r"/reports/regions", region_reports, {"Admin"}),
+    ("GET", r"/reports/crop-growth", region_crop_growth, {"Admin"}),
+    ("GET", r"/farms/nearby", farms_nearby, {"Admin"}),
+    ("GET", r"/farms/nearest", farms_nearest, {"Admin"}),
+    ("GET", r"/farms", farms_in_area, {"Admin"}),
+    ("GET", r"/heatmap/(\w+)/(\d+)/(\d+)/(\d+)", heatmap_tile, {"Admin"}),
+]
+ROUTES = [(method, re.compile(pattern + r"\Z"), handler, roles) for method, pattern, handler, roles in ROUTES]
+
+
+class ApiServer:
+    def __init__(self, max_concurrent=MAX_CONCURRENT, queue_timeout=QUEUE_TIMEOUT,
+                 request_timeout=REQUEST_TIMEOUT, workers=POOL_SIZE):
+        self.queue_timeout = queue_timeout
+        self.request_timeout = request_timeout
+        self.sessions = Sessions()
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-db")
+        self.started = time.monotonic()
+        self.served = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.in_flight = 0
+
+    def route(self, request):
+        allowed = False
+        for method, pattern, handler, roles in ROUTES:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+            allowed = True
+            if method != request.method:
+                continue
+            if roles is not None:
+                auth = request.headers.get("authorization", "")
+                user = self.sessions.get(auth[7:]) if auth.startswith("Bearer ") else None
+                if user is None:
+                    raise ApiError(401, "Log in first")
+                if user["role"] not in roles:
+                    raise ApiError(403, "Not allowed for your role")
+                request.user = user
+            return handler, match.groups()
+        raise ApiError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+
+    def health(self):
+        service = get_inference_service()
+        return {
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+            "served": self.served,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "in_flight": self.in_flight,
+            "pool": get_pool().stats(),
+            "lookup_cache": cache_stats(),
+            "inference": service.stats() if service else None,
+        }
+
+    async def dispatch(self, request):
+        if request.path == "/health":
+            return 200, self.health()
+        handler, args = self.route(request)
+        request.sessions = self.sessions
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ApiError(503, "Server busy, try again")
+        self.in_flight += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, lambda: handler(request, *args)
+            )
+        except BaseException:
+            self._finished(None)
+            raise
+        # The worker thread cannot be interrupted, so its slot is released when
+        # it finishes, even if the client already got a 504.
+        future.add_done_callback(self._finished)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise ApiError(504, "Request timed out")
+
+    def _finished(self, future):
+        # Retrieve the exception so a failure after a 504 is not logged as unhandled.
+        if future is not None and not future.cancelled():
+            future.exception()
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                try:
+                    status, payload = await self.dispatch(request)
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    print(f"Error handling {request.method} {request.path}: {e}")
+                    status, payload = 500, {"error": "Internal server error"}
+                self.served += 1
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                await write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ApiError as e:
+            await write_response(writer, e.status, {"error": str(e)}, False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        if CLASSIFIER_BACKEND == "model":
+            try:
+                service = start_inference_service()
+                print(f"Loaded soil classifier model v{service.metadata.get('version')}.")
+            except FileNotFoundError as e:
+                print(f"{e}. Using threshold-based classification.")
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+        print(f"API listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=True)
+            stop_inference_service()
+
+
+async def _readline(reader):
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        # readline() reports a line longer than the reader's limit as ValueError.
+        raise ApiError(400, "Request line or header too long")
+
+
+async def read_request(reader):
+    line = await _readline(reader)
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ApiError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await _readline(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise ApiError(400, "Invalid Content-Length")
+    if length < 0:
+        raise ApiError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise ApiError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    return Request(method.upper(), url.path.rstrip("/") or "/", parse_qs(url.query), headers, body)
+
+
+async def write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload, default=_json_default).encode()
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON API over the soil database")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT)
+    parser.add_argument("--request-timeout", type=float, default=REQUEST_TIMEOUT)
+    parser.add_argument("--workers", type=int, default=POOL_SIZE,
+                        help="database worker threads (defaults to DB_POOL_SIZE)")
+    args = parser.parse_args()
+
+    api = ApiServer(args.max_concurrent, QUEUE_TIMEOUT, args.request_timeout, args.workers)
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print(f"Stopped. Served {api.served} requests, rejected {api.rejected}, timed out {api.timed_out}.")
+
+
+if __name__ == "__main__":
+    main()
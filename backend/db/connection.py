@@ -1,14 +1,182 @@
 import pymysql
 import os
+import threading
+import time
+from collections import deque
+from pymysql.constants import SERVER_STATUS
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_connection():
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def create_connection(**options):
     return pymysql.connect(
         host=os.getenv("DB_HOST"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         database=os.getenv("DB_NAME"),
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=pymysql.cursors.DictCursor,
+        **options
     )
+
+
+class PooledConnection:
+    """
+    Wraps a PyMySQL connection checked out of a ConnectionPool.
+    close() and leaving a `with` block hand the connection back to the pool
+    instead of closing the socket; everything else is forwarded to PyMySQL.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise pymysql.err.InterfaceError("Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._raw is not None:
+            try:
+                self._raw.rollback()
+            except pymysql.err.Error:
+                self._pool._discard(self._raw)
+                self._raw = None
+        self.close()
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw, self._created_at)
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of PyMySQL connections.
+
+    Idle connections are pinged on checkout and replaced if the ping fails,
+    and connections older than `recycle` seconds are closed instead of reused.
+    """
+
+    def __init__(self, factory=create_connection, max_size=POOL_SIZE,
+                 recycle=POOL_RECYCLE, timeout=POOL_TIMEOUT):
+        self.factory = factory
+        self.max_size = max_size
+        self.recycle = recycle
+        self.timeout = timeout
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise pymysql.err.OperationalError(
+                        f"Connection pool exhausted ({self.max_size} connections in use)"
+                    )
+                self._cond.wait(remaining)
+            if self._idle:
+                raw, created_at = self._idle.pop()
+            else:
+                raw, created_at = None, None
+                self._size += 1
+
+        if raw is not None and not self._is_usable(raw, created_at):
+            self._close_quietly(raw)
+            raw = None
+
+        if raw is None:
+            try:
+                raw = self.factory()
+            except Exception:
+                self._forget_slot()
+                raise
+            created_at = time.monotonic()
+
+        return PooledConnection(self, raw, created_at)
+
+    def release(self, raw, created_at):
+        if raw.open and time.monotonic() - created_at < self.recycle:
+            try:
+                if raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    raw.rollback()
+            except pymysql.err.Error:
+                self._discard(raw)
+                return
+            with self._cond:
+                self._idle.append((raw, created_at))
+                self._cond.notify()
+        else:
+            self._discard(raw)
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "open": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+            }
+
+    def _is_usable(self, raw, created_at):
+        if time.monotonic() - created_at >= self.recycle:
+            return False
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except pymysql.err.Error:
+            return False
+
+    def _discard(self, raw):
+        self._close_quietly(raw)
+        self._forget_slot()
+
+    def _forget_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_connection():
+    return get_pool().acquire()
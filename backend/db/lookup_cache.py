@@ -0,0 +1,108 @@
+"""
+Read-through cache for the small lookup procedures (labs, crops, regions,
+fertility classes) that nearly every menu flow calls.
+
+Entries are keyed by (procedure name, arguments). Each entry belongs to a
+group named after the data it reads. The writers in stored_procedures.py
+invalidate their group after committing, so changes made in this process
+show up immediately: each group carries a generation number that
+invalidation bumps, and a load that raced with an invalidation is returned
+to its caller but not stored. Changes from other processes show up within
+LOOKUP_CACHE_TTL seconds. The cache holds at most LOOKUP_CACHE_SIZE
+entries, and the least recently used entry is evicted first.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "60"))
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "256"))
+
+LABS = "labs"
+CROPS = "crops"
+REGIONS = "regions"
+FERTILITY_CLASSES = "fertility_classes"
+
+
+class LookupCache:
+    def __init__(self, ttl=LOOKUP_CACHE_TTL, max_entries=LOOKUP_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, procedure, args, group, load):
+        """
+        The cached result of `procedure` called with `args`, calling load()
+        on a miss. Callers get a copy, so mutating it never touches the cache.
+        """
+        key = (procedure, args)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry[2]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self.misses += 1
+            generation = self._generation(group)
+
+        value = load()
+        with self._lock:
+            if self._generation(group) != generation:
+                # Invalidated while loading: the value may predate the write.
+                return value
+            self._entries[key] = (group, copy.deepcopy(value), now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def _generation(self, group):
+        return (self._generations.get(None, 0), self._generations.get(group, 0))
+
+    def invalidate(self, *groups):
+        with self._lock:
+            # None is the generation of "every group".
+            for group in groups or (None,):
+                self._generations[group] = self._generations.get(group, 0) + 1
+            stale = [key for key, entry in self._entries.items() if not groups or entry[0] in groups]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache = LookupCache()
+
+
+def cached(procedure, args, group, load):
+    return _cache.get(procedure, tuple(args), group, load)
+
+
+def invalidate(*groups):
+    """Drop the entries of `groups` (every entry if none are given)."""
+    _cache.invalidate(*groups)
+
+
+def cache_stats():
+    return _cache.stats()
@@ -1,5 +1,44 @@
 from .connection import get_connection
+from .lookup_cache import cached, invalidate, LABS, CROPS, REGIONS, FERTILITY_CLASSES
+from fertility.reclassify import fetch_thresholds, reclassify_after_threshold_change
+from fertility.decision_table import invalidate_decision_table
+from ml.inference import predict_fertility_class, active_model_service
+from ml.anomaly import observe_soil_samples
+from reports.sketches import record_soil_samples
+from geo.spatial_index import farm_added
+from geo.heatmap import samples_landed
+from labs.routing import invalidate_lab_router, note_sample_requested
+from ml.yield_model import predict_yields, attach_yield_estimates, growth_changed
+from reference.catalog import (
+    recommend_crops, recommend_fertilizers, cached_latest_sample,
+    invalidate_latest_samples, invalidate_reference_index
+)
+from fertility.engine import NUTRIENT_COLUMNS, write_back_classes
+from ingest.validation import parse_nutrient
 import pymysql
+import json
+
+
+def samples_tested(samples):
+    # samples: [(soil_id, [nine nutrients in NUTRIENT_COLUMNS order]), ...]
+    # Feeds new results to the anomaly detector, the quantile sketches and
+    # any cached heatmap tiles; returns {soil_id: anomaly score}. The results
+    # are already committed, so a failing hook is reported and skipped.
+    invalidate_latest_samples()
+    scores = {}
+    try:
+        scores = observe_soil_samples(samples)
+    except Exception as e:
+        print(f"Error scoring tested samples for anomalies: {e}")
+    try:
+        record_soil_samples(samples)
+    except Exception as e:
+        print(f"Error recording tested samples in the quantile sketches: {e}")
+    try:
+        samples_landed(samples)
+    except Exception as e:
+        print(f"Error updating the heatmap for tested samples: {e}")
+    return scores
 
 def create_user(first_name, last_name, email, password, contact, role,
                 admin_date=None, farm_size=None, crop_count=None,
@@ -83,6 +122,9 @@ def add_farm_location(region_name, street, city, state, country, zipcode,
             conn.commit()
     finally:
         conn.close()
+    invalidate(REGIONS)
+    farm_added({"latitude": latitude, "longitude": longitude,
+                "user_id": user_id, "region_name": region_name})
 
 def request_soil_sample(
     farmer_id, lab_id, n, p, k, ca, mg, s, lime, c, moisture,
@@ -98,6 +140,7 @@ def request_soil_sample(
             conn.commit()
     finally:
         conn.close()
+    note_sample_requested(lab_id)
 
 def assign_sample_to_technician(soil_id, technician_id, lab_id):
     conn = get_connection()
@@ -118,18 +161,22 @@ def submit_soil_test_results(soil_id, n, p, k, ca, mg, s, lime, carbon, moisture
             conn.commit()
     finally:
         conn.close()
+    return samples_tested([(soil_id, [n, p, k, ca, mg, s, lime, carbon, moisture])]).get(soil_id)
 
-def get_soil_sample_results(soil_id):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.callproc("sp_get_soil_sample_results", [soil_id])
-            result = cursor.fetchall()
-            return result
-    finally:
-        conn.close()
+def classify_soil_sample(soil_id, nutrients=None):
+    # When the caller already has the nutrient values, decide the class in
+    # memory (decision table or resident model) and only store the result.
+    if nutrients is not None:
+        class_id = predict_fertility_class(nutrients)
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.callproc("sp_set_soil_sample_class", [soil_id, class_id])
+                conn.commit()
+                return {"Fertility_Class_ID": class_id}
+        finally:
+            conn.close()
 
-def classify_soil_sample(soil_id):
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
@@ -224,6 +271,7 @@ def set_fertility_thresholds(fert_class_id, min_n, max_n, min_p, max_p,
                              min_lime, max_lime, min_s, max_s, min_moist, max_moist):
     conn = get_connection()
     try:
+        old_thresholds = fetch_thresholds(conn, fert_class_id)
         with conn.cursor() as cursor:
             cursor.callproc("sp_set_fertility_thresholds", [
                 fert_class_id, min_n, max_n, min_p, max_p,
@@ -233,6 +281,11 @@ def set_fertility_thresholds(fert_class_id, min_n, max_n, min_p, max_p,
             conn.commit()
     finally:
         conn.close()
+    invalidate(FERTILITY_CLASSES)
+    invalidate_decision_table()
+    invalidate_reference_index()
+    reclassify_after_threshold_change(fert_class_id, old_thresholds)
+    invalidate_latest_samples()
 
 def create_soil_test_lab(name, address, contact, admin_id):
     conn = get_connection()
@@ -244,6 +297,8 @@ def create_soil_test_lab(name, address, contact, admin_id):
             conn.commit()
     finally:
         conn.close()
+    invalidate(LABS)
+    invalidate_lab_router()
 
 def create_lab_technician(first_name, last_name, email, password, contact,
                           certification, specialization, hire_date, lab_id):
@@ -292,6 +347,9 @@ def get_soil_sample_results(soil_id):
         conn.close()
 
 def get_latest_classified_soil_sample(farmer_id):
+    return cached_latest_sample(farmer_id, fetch_latest_classified_soil_sample)
+
+def fetch_latest_classified_soil_sample(farmer_id):
     conn = get_connection()
     try:
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
@@ -342,24 +400,16 @@ def get_crop_growth_records(farmer_id):
 
 
 def get_crop_recommendations(fert_class_id):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.callproc("sp_get_crop_recommendations", [fert_class_id])
-            return cursor.fetchall()
-    finally:
-        conn.close()
+    # Served from the in-memory reference index (see reference/catalog.py).
+    return recommend_crops(fert_class_id)
 
 def get_fertilizer_recommendations(crop_id):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.callproc("sp_get_fertilizer_recommendations", [crop_id])
-            return cursor.fetchall()
-    finally:
-        conn.close()
+    return recommend_fertilizers(crop_id)
 
 def get_all_labs():
+    return cached("sp_get_all_labs", (), LABS, fetch_all_labs)
+
+def fetch_all_labs():
     conn = get_connection()
     try:
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
@@ -381,6 +431,9 @@ def get_all_users():
 
 
 def get_all_soil_labs():
+    return cached("sp_get_all_soil_labs", (), LABS, fetch_all_soil_labs)
+
+def fetch_all_soil_labs():
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
@@ -398,6 +451,8 @@ def add_soil_lab(lab_name, address, contact):
             conn.commit()
     finally:
         conn.close()
+    invalidate(LABS)
+    invalidate_lab_router()
 
 def remove_soil_lab(lab_id):
     conn = get_connection()
@@ -407,6 +462,19 @@ def remove_soil_lab(lab_id):
             conn.commit()
     finally:
         conn.close()
+    invalidate(LABS)
+    invalidate_lab_router()
+
+def set_lab_location(lab_id, latitude, longitude):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.callproc("sp_set_lab_location", [lab_id, latitude, longitude])
+            conn.commit()
+    finally:
+        conn.close()
+    invalidate(LABS)
+    invalidate_lab_router()
 
 
 def set_fertility_thresholds(fertility_class_id, threshold_values):
@@ -432,10 +500,18 @@ def set_fertility_thresholds(fertility_class_id, threshold_values):
         }
         
         conn = get_connection()
+        old_thresholds = fetch_thresholds(conn, fertility_class_id)
         with conn.cursor() as cursor:
             cursor.callproc("sp_set_fertility_thresholds", list(params.values()))
             conn.commit()
         print("Fertility thresholds updated successfully.")
+        invalidate(FERTILITY_CLASSES)
+        invalidate_decision_table()
+        invalidate_reference_index()
+        affected, updated = reclassify_after_threshold_change(fertility_class_id, old_thresholds)
+        invalidate_latest_samples()
+        if affected:
+            print(f"Reclassified {affected} affected soil samples ({updated} changed class).")
     except Exception as e:
         print(f"Error in set_fertility_thresholds: {e}")
     finally:
@@ -458,6 +534,15 @@ def get_regional_fertility_reports(conn, region_name):
         print(f"Error retrieving regional fertility data: {e}")
         return []
 
+def get_all_regional_fertility_reports(conn):
+    try:
+        with conn.cursor() as cursor:
+            cursor.callproc('sp_get_all_regional_fertility_reports')
+            return cursor.fetchall()
+    except Exception as e:
+        print(f"Error retrieving regional fertility data: {e}")
+        return []
+
 def submit_soil_test_results(soil_id, n, p, k, ca, mg, s, lime, c, moisture):
     conn = get_connection()
     try:
@@ -466,19 +551,70 @@ def submit_soil_test_results(soil_id, n, p, k, ca, mg, s, lime, c, moisture):
             conn.commit()
     finally:
         conn.close()
+    return samples_tested([(soil_id, [n, p, k, ca, mg, s, lime, c, moisture])]).get(soil_id)
 
 
-def classify_soil_sample(soil_id):
+def classify_soil_sample(soil_id, nutrients=None):
+    # When the caller already has the nutrient values, decide the class in
+    # memory (decision table or resident model) and only store the result.
+    if nutrients is not None:
+        class_id = predict_fertility_class(nutrients)
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.callproc("sp_set_soil_sample_class", [soil_id, class_id])
+                conn.commit()
+                return {"Fertility_Class_ID": class_id}
+        finally:
+            conn.close()
+
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
             cursor.callproc("sp_classify_soil_sample", [soil_id])
             result = cursor.fetchone()
             conn.commit()
-            return result 
+            return result
     finally:
         conn.close()
 
+def submit_soil_test_results_bulk(results):
+    # results: [{"soil_id": ..., "nitrogen": ..., ..., "moisture": ...}, ...]
+    # Applied and classified in one transaction; returns {soil_id: class_id}
+    # for the samples that were still waiting. Every reading is required.
+    if not results:
+        return {}
+    rows = []
+    for r in results:
+        row = {"soil_id": int(r["soil_id"])}
+        for col in NUTRIENT_COLUMNS:
+            value = parse_nutrient(r.get(col), col)
+            if value is None:
+                raise ValueError(f"soil sample {row['soil_id']}: {col} is missing")
+            row[col] = value
+        rows.append(row)
+    payload = json.dumps(rows)
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.callproc("sp_submit_soil_test_results_bulk", [payload])
+            classes = {row["soil_id"]: row["Fertility_Class_ID"] for row in cursor.fetchall()}
+        service = active_model_service()
+        if service is not None and classes:
+            # The resident model is the classifier of record: the whole batch
+            # goes through its micro-batching queue and overrides the SQL class.
+            tested = [r for r in rows if r["soil_id"] in classes]
+            predicted = service.classify_many(tested)
+            write_back_classes(conn, [r["soil_id"] for r in tested], predicted)
+            classes.update((r["soil_id"], class_id) for r, class_id in zip(tested, predicted))
+        conn.commit()
+    finally:
+        conn.close()
+    samples_tested([
+        (r["soil_id"], [r[col] for col in NUTRIENT_COLUMNS]) for r in rows if r["soil_id"] in classes
+    ])
+    return classes
+
 def get_lab_pending_samples(lab_id):
     conn = get_connection()
     try:
@@ -501,9 +637,11 @@ def request_soil_sample_tested(
             ])
             result = cursor.fetchone()
             conn.commit()
-            return result
     finally:
         conn.close()
+    if result:
+        samples_tested([(result["soil_id"], [n, p, k, ca, mg, s, lime, c, moisture])])
+    return result
 
 
 
@@ -517,6 +655,9 @@ def get_all_classified_soil_samples(farmer_id):
         conn.close()
 
 def get_all_fertility_classes():
+    return cached("sp_get_all_fertility_classes", (), FERTILITY_CLASSES, fetch_all_fertility_classes)
+
+def fetch_all_fertility_classes():
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
@@ -527,6 +668,10 @@ def get_all_fertility_classes():
         conn.close()
 
 def get_fertility_class_by_id(class_id):
+    return cached("sp_get_fertility_class_by_id", (class_id,), FERTILITY_CLASSES,
+                  lambda: fetch_fertility_class_by_id(class_id))
+
+def fetch_fertility_class_by_id(class_id):
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
@@ -540,14 +685,16 @@ def get_fertility_class_by_id(class_id):
 
 def get_all_regions(conn):
     try:
-        with conn.cursor() as cursor:
-            cursor.callproc("sp_get_all_regions")
-            results = cursor.fetchall()
-            return results
+        return cached("sp_get_all_regions", (), REGIONS, lambda: fetch_all_regions(conn))
     except Exception as e:
         print(f"Error fetching regions: {e}")
         return []
 
+def fetch_all_regions(conn):
+    with conn.cursor() as cursor:
+        cursor.callproc("sp_get_all_regions")
+        return cursor.fetchall()
+
 def get_tested_samples_by_lab(lab_id):
     conn = get_connection()
     try:
@@ -558,11 +705,19 @@ def get_tested_samples_by_lab(lab_id):
         conn.close()
 
 def get_all_crops(conn):
+    return cached("sp_get_all_crops", (), CROPS, lambda: fetch_all_crops(conn))
+
+def fetch_all_crops(conn):
     with conn.cursor(pymysql.cursors.DictCursor) as cursor:
         cursor.callproc("sp_get_all_crops")
         return cursor.fetchall()
 
 def get_yield_estimate(growth_id):
+    # Served by the trained yield model (cached per growth record and model
+    # version); fn_calculate_yield_estimate is used until one is trained.
+    estimates = predict_yields([growth_id])
+    if estimates is not None:
+        return estimates.get(growth_id)
     conn = get_connection()
     try:
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
@@ -572,6 +727,26 @@ def get_yield_estimate(growth_id):
     finally:
         conn.close()
 
+def get_crop_growth_with_estimates(farmer_id):
+    conn = get_connection()
+    try:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.callproc("sp_get_crop_growth_with_estimates", [farmer_id])
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+    return attach_yield_estimates(rows)
+
+def get_region_crop_growth_with_estimates(region_name):
+    conn = get_connection()
+    try:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.callproc("sp_get_region_crop_growth_with_estimates", [region_name])
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+    return attach_yield_estimates(rows)
+
 def get_years_experience(hire_date):
     conn = get_connection()
     try:
@@ -599,4 +774,13 @@ def delete_crop_growth_record(growth_id):
             conn.commit()
     finally:
         conn.close()
+    growth_changed(growth_id)
 
+def get_lab_anomalies(lab_id):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.callproc("sp_get_lab_anomalies", [lab_id])
+            return cursor.fetchall()
+    finally:
+        conn.close()
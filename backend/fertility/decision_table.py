@@ -0,0 +1,120 @@
+"""
+In-memory fertility decision table.
+
+Fertility_Class is read once and compiled into a sorted list of nitrogen
+edges plus two lookup arrays (P/K gate passed or failed), so a sample is
+classified with one binary search instead of a fn_calculate_fertility_class
+call. The table reloads itself when sp_set_fertility_thresholds bumps the
+Fertility_Class row in Data_Version.
+"""
+import threading
+import time
+import numpy as np
+from db.connection import get_connection
+from fertility.engine import CLASS_1, CLASS_2, CLASS_3, CLASS_4, DEFAULT_CUTOFFS, to_hundredths
+
+VERSION_CHECK_INTERVAL = 5.0
+
+
+class DecisionTable:
+    def __init__(self, rows, version=0):
+        self.version = version
+        self.classes = {row["fertility_class_id"]: row for row in rows}
+
+        cut = {}
+        for (class_id, column), fallback in DEFAULT_CUTOFFS.items():
+            value = self.classes.get(class_id, {}).get(column)
+            cut[(class_id, column)] = to_hundredths([fallback if value is None else value])[0]
+        self._very_high_n = cut[(1, "min_nitrogen")]
+        self._high_n = cut[(2, "min_nitrogen")]
+        self._moderate_n = cut[(3, "min_nitrogen")]
+        self._p_cut = cut[(1, "min_phosphorus")]
+        self._k_cut = cut[(1, "min_potassium")]
+
+        # Band i covers edges[i-1] <= nitrogen < edges[i]. Every nitrogen
+        # comparison in the cascade has the same outcome across a band, so the
+        # class for each band can be worked out once from one probe value.
+        self.edges = np.unique([self._very_high_n, self._high_n, self._moderate_n])
+        probes = np.concatenate(([self.edges[0] - 1], self.edges))
+        self.band_pass = np.array([self._cascade(n, True) for n in probes], dtype=np.int8)
+        self.band_fail = np.array([self._cascade(n, False) for n in probes], dtype=np.int8)
+
+    def _cascade(self, n, pk_ok):
+        if n >= self._very_high_n and pk_ok:
+            return CLASS_1
+        if n >= self._high_n:
+            return CLASS_2
+        if n >= self._moderate_n:
+            return CLASS_3
+        return CLASS_4
+
+    def classify(self, nitrogen, phosphorus, potassium, calcium=None, magnesium=None,
+                 sulfur=None, lime=None, carbon=None, moisture=None):
+        """Vectorized lookup; same results and NULL handling as the SQL function."""
+        n = np.atleast_1d(to_hundredths(nitrogen))
+        p = np.atleast_1d(to_hundredths(phosphorus))
+        k = np.atleast_1d(to_hundredths(potassium))
+        with np.errstate(invalid="ignore"):
+            pk_ok = (p >= self._p_cut) & (k >= self._k_cut)
+        band = np.searchsorted(self.edges, n, side="right")
+        classes = np.where(pk_ok, self.band_pass[band], self.band_fail[band])
+        classes[np.isnan(n)] = CLASS_4
+        return classes
+
+    def classify_one(self, nitrogen, phosphorus, potassium, **nutrients):
+        return int(self.classify([nitrogen], [phosphorus], [potassium])[0])
+
+    def class_name(self, class_id):
+        row = self.classes.get(class_id)
+        return row["class_name"] if row else None
+
+    def ranges(self, class_id):
+        """All min/max thresholds stored for a class, keyed by column name."""
+        row = self.classes.get(class_id, {})
+        return {key: value for key, value in row.items() if key.startswith(("min_", "max_"))}
+
+
+def fetch_version(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM Data_Version WHERE table_name = 'Fertility_Class'")
+        row = cursor.fetchone()
+    return row["version"] if row else 0
+
+
+def load_decision_table(conn):
+    version = fetch_version(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM Fertility_Class ORDER BY fertility_class_id")
+        rows = cursor.fetchall()
+    return DecisionTable(rows, version)
+
+
+_table = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_decision_table():
+    """
+    Return the shared decision table, checking Data_Version at most once
+    every VERSION_CHECK_INTERVAL seconds and recompiling when it moved.
+    """
+    global _table, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _table is None or now - _checked_at >= VERSION_CHECK_INTERVAL:
+            conn = get_connection()
+            try:
+                if _table is None or fetch_version(conn) != _table.version:
+                    _table = load_decision_table(conn)
+            finally:
+                conn.close()
+            _checked_at = now
+        return _table
+
+
+def invalidate_decision_table():
+    """Drop the cached table so the next lookup reloads it (used after local writes)."""
+    global _table
+    with _lock:
+        _table = None
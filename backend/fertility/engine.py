@@ -0,0 +1,250 @@
+"""
+Vectorized fertility classification.
+
+classify() reproduces fn_calculate_fertility_class (db/procedures.sql) over
+whole columns at once, so the archive can be reclassified without one
+stored-procedure call per sample.
+"""
+import argparse
+import time
+import numpy as np
+from db.connection import get_connection
+
+NUTRIENT_COLUMNS = [
+    "nitrogen", "phosphorus", "potassium", "calcium", "magnesium",
+    "sulfur", "lime", "carbon", "moisture"
+]
+
+# The Fertility_Class minimums that fn_calculate_fertility_class reads:
+# Very High (1) needs N, P and K, High (2) and Moderate (3) are banded on
+# nitrogen alone and everything else is Low (4). The values here are the
+# fallbacks the SQL function uses when a threshold is NULL.
+DEFAULT_CUTOFFS = {
+    (1, "min_nitrogen"): 70,
+    (1, "min_phosphorus"): 45,
+    (1, "min_potassium"): 50,
+    (2, "min_nitrogen"): 50,
+    (3, "min_nitrogen"): 30,
+}
+CLASSIFYING_THRESHOLDS = list(DEFAULT_CUTOFFS)
+
+CLASS_1, CLASS_2, CLASS_3, CLASS_4 = 1, 2, 3, 4
+
+
+def load_cutoffs(conn):
+    """Read the classifying thresholds from Fertility_Class."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT fertility_class_id, min_nitrogen, min_phosphorus, min_potassium "
+            "FROM Fertility_Class WHERE fertility_class_id IN (1, 2, 3)"
+        )
+        rows = {row["fertility_class_id"]: row for row in cursor.fetchall()}
+    cutoffs = {}
+    for (class_id, column), fallback in DEFAULT_CUTOFFS.items():
+        value = rows.get(class_id, {}).get(column)
+        cutoffs[(class_id, column)] = float(value) if value is not None else fallback
+    return cutoffs
+
+
+def to_hundredths(values):
+    """
+    Convert a column to integer hundredths the way MySQL stores a value
+    passed into a DECIMAL(5,2) parameter (round half away from zero).
+    None and NaN become NaN, which is how NULL is carried through.
+    """
+    arr = np.asarray(values)
+    if arr.dtype == object:
+        arr = np.array([np.nan if v is None else float(v) for v in arr.ravel()],
+                       dtype=np.float64).reshape(arr.shape)
+    else:
+        arr = arr.astype(np.float64, copy=False)
+    scaled = np.round(arr * 100.0, 6)
+    return np.sign(scaled) * np.floor(np.abs(scaled) + 0.5)
+
+
+def classify(nitrogen, phosphorus, potassium, calcium=None, magnesium=None,
+             sulfur=None, lime=None, carbon=None, moisture=None, cutoffs=None):
+    """
+    Return an int8 array of fertility class IDs, one per sample.
+
+    Only nitrogen, phosphorus and potassium affect the result, exactly as in
+    the SQL function; the other columns are accepted so callers can pass a
+    full sample. A NULL in a comparison is false in MySQL, so a missing
+    nitrogen value always ends up in class 4. `cutoffs` comes from
+    load_cutoffs(); the seeded thresholds are used when it is omitted.
+    """
+    cutoffs = cutoffs or DEFAULT_CUTOFFS
+    cut = {key: to_hundredths([value])[0] for key, value in cutoffs.items()}
+    n = to_hundredths(nitrogen)
+    p = to_hundredths(phosphorus)
+    k = to_hundredths(potassium)
+
+    with np.errstate(invalid="ignore"):
+        very_high = ((n >= cut[(1, "min_nitrogen")])
+                     & (p >= cut[(1, "min_phosphorus")])
+                     & (k >= cut[(1, "min_potassium")]))
+        high = n >= cut[(2, "min_nitrogen")]
+        moderate = n >= cut[(3, "min_nitrogen")]
+
+    return np.select(
+        [very_high, high, moderate],
+        [CLASS_1, CLASS_2, CLASS_3],
+        default=CLASS_4
+    ).astype(np.int8)
+
+
+def classify_rows(rows, cutoffs=None):
+    """Classify a list of Soil_Sample dicts (as returned by DictCursor)."""
+    if not rows:
+        return np.empty(0, dtype=np.int8)
+    columns = {
+        col: np.array([row.get(col) for row in rows], dtype=object)
+        for col in NUTRIENT_COLUMNS
+    }
+    return classify(cutoffs=cutoffs, **columns)
+
+
+def write_back_classes(conn, soil_ids, class_ids, chunk_size=5000):
+    """
+    Store class IDs in Soil_Sample.fertility_class_id.
+
+    There are only a handful of classes, so each chunk is written as one
+    UPDATE ... WHERE soil_id IN (...) per class instead of one per row.
+    The caller owns the transaction.
+    """
+    soil_ids = np.asarray(soil_ids)
+    class_ids = np.asarray(class_ids)
+    updated = 0
+    with conn.cursor() as cursor:
+        for start in range(0, len(soil_ids), chunk_size):
+            ids_chunk = soil_ids[start:start + chunk_size]
+            class_chunk = class_ids[start:start + chunk_size]
+            for class_id in np.unique(class_chunk):
+                ids = ids_chunk[class_chunk == class_id].tolist()
+                placeholders = ", ".join(["%s"] * len(ids))
+                updated += cursor.execute(
+                    f"UPDATE Soil_Sample SET fertility_class_id = %s "
+                    f"WHERE soil_id IN ({placeholders})",
+                    [int(class_id)] + ids
+                )
+    return updated
+
+
+def reclassify_all(chunk_size=50000, progress=None):
+    """
+    Reclassify every tested sample in soil_id order, one chunk per
+    transaction. Only rows whose stored class differs are written.
+    Returns (rows_scanned, rows_updated).
+    """
+    conn = get_connection()
+    scanned = updated = 0
+    last_id = 0
+    try:
+        cutoffs = load_cutoffs(conn)
+        while True:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT soil_id, fertility_class_id, nitrogen, phosphorus, potassium "
+                    "FROM Soil_Sample "
+                    "WHERE sample_status = 'tested' AND soil_id > %s "
+                    "ORDER BY soil_id LIMIT %s",
+                    (last_id, chunk_size)
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                break
+
+            soil_ids = np.array([r["soil_id"] for r in rows], dtype=np.int64)
+            current = np.array([r["fertility_class_id"] or 0 for r in rows], dtype=np.int64)
+            new = classify_rows(rows, cutoffs)
+            changed = current != new
+
+            if changed.any():
+                updated += write_back_classes(conn, soil_ids[changed], new[changed])
+            conn.commit()
+
+            scanned += len(rows)
+            last_id = int(soil_ids[-1])
+            if progress:
+                progress(scanned, updated)
+    finally:
+        conn.close()
+    return scanned, updated
+
+
+def parity_cases(cutoffs=None):
+    """
+    Edge cases for comparing classify() with fn_calculate_fertility_class:
+    values on and around every cutoff, NULLs in each position and inputs
+    that only land on a cutoff after DECIMAL(5,2) rounding.
+    """
+    cutoffs = cutoffs or DEFAULT_CUTOFFS
+    around = lambda cut: [None, 0, cut - 0.01, cut - 0.005, cut - 0.004, cut, cut + 0.01, 999.99]
+    nitrogen = around(cutoffs[(1, "min_nitrogen")])
+    for class_id in (2, 3):
+        cut = cutoffs[(class_id, "min_nitrogen")]
+        nitrogen += [cut - 0.01, cut - 0.005, cut]
+    cases = []
+    for n in nitrogen:
+        for p in around(cutoffs[(1, "min_phosphorus")]):
+            for k in around(cutoffs[(1, "min_potassium")]):
+                cases.append((n, p, k))
+    return cases
+
+
+def check_parity(conn, cases=None):
+    """
+    Run each case through fn_calculate_fertility_class on the server and
+    through classify(), and return the cases where they disagree.
+    """
+    cutoffs = load_cutoffs(conn)
+    cases = cases or parity_cases(cutoffs)
+    expected = []
+    with conn.cursor() as cursor:
+        for n, p, k in cases:
+            cursor.execute(
+                "SELECT fn_calculate_fertility_class(%s, %s, %s, NULL, NULL, NULL, NULL, NULL, NULL) AS c",
+                (n, p, k)
+            )
+            expected.append(cursor.fetchone()["c"])
+
+    columns = np.array(cases, dtype=object)
+    actual = classify(columns[:, 0], columns[:, 1], columns[:, 2], cutoffs=cutoffs)
+    return [
+        (case, exp, int(act))
+        for case, exp, act in zip(cases, expected, actual)
+        if exp != act
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized soil fertility classification")
+    parser.add_argument("--check-parity", action="store_true",
+                        help="compare against fn_calculate_fertility_class on the server")
+    parser.add_argument("--reclassify", action="store_true",
+                        help="reclassify every tested Soil_Sample row")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    if args.check_parity:
+        conn = get_connection()
+        try:
+            cases = parity_cases(load_cutoffs(conn))
+            mismatches = check_parity(conn, cases)
+        finally:
+            conn.close()
+        for case, exp, act in mismatches:
+            print(f"Mismatch for N/P/K {case}: SQL={exp} engine={act}")
+        print(f"Parity check finished: {len(mismatches)} mismatch(es) in {len(cases)} cases.")
+
+    if args.reclassify:
+        started = time.time()
+        scanned, updated = reclassify_all(
+            args.chunk_size,
+            progress=lambda s, u: print(f"  scanned {s} rows, updated {u}")
+        )
+        print(f"Reclassified {scanned} samples ({updated} changed) in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Incremental reclassification after a fertility threshold change.
+
+A sample's class can only change if one of its nutrient values lies between
+the old and the new value of a threshold that fn_calculate_fertility_class
+actually reads, so only those rows are looked up (through the nutrient
+indexes) and rewritten.
+"""
+import numpy as np
+from db.connection import get_connection
+from fertility.engine import (
+    CLASSIFYING_THRESHOLDS, DEFAULT_CUTOFFS, classify_rows, load_cutoffs, write_back_classes
+)
+
+THRESHOLD_COLUMNS = [
+    "min_nitrogen", "max_nitrogen", "min_phosphorus", "max_phosphorus",
+    "min_potassium", "max_potassium", "min_calcium", "max_calcium",
+    "min_carbon", "max_carbon", "min_lime", "max_lime",
+    "min_sulfur", "max_sulfur", "min_moisture", "max_moisture"
+]
+
+
+def fetch_thresholds(conn, fertility_class_id):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {', '.join(THRESHOLD_COLUMNS)} FROM Fertility_Class "
+            f"WHERE fertility_class_id = %s",
+            (fertility_class_id,)
+        )
+        return cursor.fetchone()
+
+
+def changed_ranges(fertility_class_id, old, new):
+    """
+    Return (nutrient_column, low, high) for every classifying threshold of
+    this class that moved. Samples with low <= value < high are the only
+    ones whose `value >= threshold` test can have flipped.
+    """
+    ranges = []
+    for class_id, column in CLASSIFYING_THRESHOLDS:
+        if class_id != fertility_class_id:
+            continue
+        # A NULL threshold means the SQL function falls back to its default.
+        fallback = DEFAULT_CUTOFFS[(class_id, column)]
+        before = old.get(column)
+        after = new.get(column)
+        before = fallback if before is None else before
+        after = fallback if after is None else after
+        if before != after:
+            ranges.append((column[len("min_"):], min(before, after), max(before, after)))
+    return ranges
+
+
+def find_affected_samples(conn, ranges):
+    """Return the sorted, de-duplicated soil_ids of tested samples inside any range."""
+    found = []
+    with conn.cursor() as cursor:
+        for column, low, high in ranges:
+            cursor.execute(
+                f"SELECT soil_id FROM Soil_Sample "
+                f"WHERE {column} >= %s AND {column} < %s AND sample_status = 'tested'",
+                (low, high)
+            )
+            found.append(np.fromiter((row["soil_id"] for row in cursor.fetchall()), dtype=np.int64))
+    if not found:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(found))
+
+
+def reclassify_samples(conn, soil_ids, chunk_size=1000, progress=None):
+    """
+    Recompute the class of the given samples with the current thresholds and
+    write back the ones that changed, committing after every chunk.
+    """
+    cutoffs = load_cutoffs(conn)
+    total = len(soil_ids)
+    done = updated = 0
+    for start in range(0, total, chunk_size):
+        chunk = soil_ids[start:start + chunk_size].tolist()
+        placeholders = ", ".join(["%s"] * len(chunk))
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT soil_id, fertility_class_id, nitrogen, phosphorus, potassium "
+                f"FROM Soil_Sample WHERE soil_id IN ({placeholders})",
+                chunk
+            )
+            rows = cursor.fetchall()
+
+        if rows:
+            ids = np.array([r["soil_id"] for r in rows], dtype=np.int64)
+            current = np.array([r["fertility_class_id"] or 0 for r in rows], dtype=np.int64)
+            new = classify_rows(rows, cutoffs)
+            changed = current != new
+            if changed.any():
+                updated += write_back_classes(conn, ids[changed], new[changed])
+        conn.commit()
+
+        done += len(chunk)
+        if progress:
+            progress(done, total, updated)
+    return updated
+
+
+def print_progress(done, total, updated):
+    print(f"  Reclassified {done}/{total} affected samples ({updated} changed)")
+
+
+def reclassify_after_threshold_change(fertility_class_id, old, chunk_size=1000,
+                                      progress=print_progress):
+    """
+    Bring stored classes up to date after Fertility_Class row
+    `fertility_class_id` changed from `old` (as returned by fetch_thresholds).
+    Returns (affected, updated).
+    """
+    conn = get_connection()
+    try:
+        new = fetch_thresholds(conn, fertility_class_id)
+        if old is None or new is None:
+            return 0, 0
+        ranges = changed_ranges(fertility_class_id, old, new)
+        if not ranges:
+            return 0, 0
+        soil_ids = find_affected_samples(conn, ranges)
+        updated = reclassify_samples(conn, soil_ids, chunk_size, progress)
+        return len(soil_ids), updated
+    finally:
+        conn.close()
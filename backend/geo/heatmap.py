@@ -0,0 +1,356 @@
+"""
+Fertility heatmap tiles by inverse-distance weighting.
+
+Tested samples are averaged per farm location. Those farm points are kept in
+memory in a FarmIndex and interpolated onto TILE_SIZE x TILE_SIZE grids
+addressed like web map tiles (zoom, x, y in Web Mercator). Each grid cell
+takes the IDW mean of the farms within SEARCH_RADIUS_KM. The distance and
+weight matrices are computed in vectorized chunks. The fertility class layer
+runs the interpolated N/P/K through the fertility decision table.
+
+Tiles are cached per (layer, region, zoom, x, y). When results change,
+the sums of just the farms they belong to are re-read from Soil_Sample, and
+only the cached tiles within reach of a farm whose sums moved are dropped.
+Every other tile stays valid. Writes made by other processes are picked up
+at most every TILE_TTL seconds. The farms of samples whose updated_at is at
+or after the watermark, minus WATERMARK_OVERLAP_SECONDS, are re-read the same
+way. The overlap covers edits within the watermark's second and transactions
+that commit late with an older updated_at. A drop in the Soil_Sample row count
+means a sample was deleted, which updated_at cannot show, and triggers a
+full reload.
+"""
+import math
+import os
+import threading
+import time
+import numpy as np
+from db.connection import get_connection
+from fertility.decision_table import get_decision_table
+from fertility.engine import NUTRIENT_COLUMNS
+from geo.spatial_index import FarmIndex, KM_PER_DEGREE
+
+TILE_SIZE = 64
+SEARCH_RADIUS_KM = float(os.getenv("HEATMAP_RADIUS_KM", "25"))
+IDW_POWER = 2.0
+TILE_TTL = float(os.getenv("HEATMAP_TILE_TTL", "600"))
+WATERMARK_OVERLAP_SECONDS = 5
+MAX_CACHED_TILES = 2000
+CHUNK_CELLS = 1024
+CLASS_LAYER = "fertility_class"
+LAYERS = NUTRIENT_COLUMNS + [CLASS_LAYER]
+
+
+def tile_bounds(zoom, x, y):
+    """(min_lat, min_lon, max_lat, max_lon) of a Web Mercator tile."""
+    n = 2 ** zoom
+    lon_w, lon_e = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+    lat_n = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_s = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lat_s, lon_w, lat_n, lon_e
+
+
+def tiles_covering(zoom, min_lat, min_lon, max_lat, max_lon):
+    """(x, y) of every tile at `zoom` that overlaps the box."""
+    n = 2 ** zoom
+
+    def tile_x(lon):
+        return min(max(int((lon + 180.0) / 360.0 * n), 0), n - 1)
+
+    def tile_y(lat):
+        lat = min(max(lat, -85.0511), 85.0511)
+        rad = math.radians(lat)
+        return min(max(int((1 - math.asinh(math.tan(rad)) / math.pi) / 2 * n), 0), n - 1)
+
+    return [(x, y)
+            for x in range(tile_x(min_lon), tile_x(max_lon) + 1)
+            for y in range(tile_y(max_lat), tile_y(min_lat) + 1)]
+
+
+def cell_centers(zoom, x, y, size=TILE_SIZE):
+    """Latitude and longitude of each cell centre, row-major from the north-west corner."""
+    n = 2 ** zoom
+    frac = (np.arange(size) + 0.5) / size
+    lons = (x + frac) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + frac) / n))))
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+    return grid_lat.ravel(), grid_lon.ravel()
+
+
+def idw(cell_lats, cell_lons, point_lats, point_lons, values,
+        radius_km=SEARCH_RADIUS_KM, power=IDW_POWER):
+    """
+    Inverse-distance weighted mean of `values` (points x layers, NaN allowed)
+    at each cell, using points within `radius_km`. Cells with no point in
+    range are NaN.
+    """
+    out = np.full((len(cell_lats), values.shape[1]), np.nan)
+    if not len(point_lats):
+        return out
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    cos_lat = np.cos(np.radians(cell_lats))
+    for start in range(0, len(cell_lats), CHUNK_CELLS):
+        end = start + CHUNK_CELLS
+        # Equirectangular distance: accurate to well under 1% over a search radius.
+        dy = (point_lats[None, :] - cell_lats[start:end, None]) * KM_PER_DEGREE
+        dx = (point_lons[None, :] - cell_lons[start:end, None]) * KM_PER_DEGREE * cos_lat[start:end, None]
+        dist = np.hypot(dx, dy)
+        weights = np.where(dist <= radius_km, 1.0 / np.maximum(dist, 1e-3) ** power, 0.0)
+        numerator = weights @ filled
+        denominator = weights @ valid
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[start:end] = np.where(denominator > 0, numerator / denominator, np.nan)
+    return out
+
+
+def farm_sums_query(conditions=""):
+    sums = ", ".join(f"SUM(ss.{col}) AS {col}_sum, COUNT(ss.{col}) AS {col}_n" for col in NUTRIENT_COLUMNS)
+    return (
+        f"SELECT fl.latitude, fl.longitude, fl.region_name, {sums} "
+        f"FROM Soil_Sample ss "
+        f"JOIN Farm_Location fl "
+        f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+        f"WHERE ss.sample_status = 'tested' {conditions}"
+        f"GROUP BY fl.latitude, fl.longitude, fl.region_name"
+    )
+
+
+def fetch_fingerprint(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS samples, MAX(updated_at) AS updated_at FROM Soil_Sample")
+        row = cursor.fetchone()
+    return (row["samples"], row["updated_at"])
+
+
+def fetch_farm_sums(conn, condition, params):
+    """
+    The farms of the samples matching `condition` (over Soil_Sample ss) and
+    their current sums: (locations, rows) for HeatmapCache.set_farms().
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT fl.latitude, fl.longitude, fl.region_name "
+            f"FROM Soil_Sample ss "
+            f"JOIN Farm_Location fl "
+            f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+            f"WHERE {condition}",
+            params
+        )
+        farms = cursor.fetchall()
+        if not farms:
+            return [], []
+        pairs = ", ".join(["(%s, %s)"] * len(farms))
+        cursor.execute(
+            farm_sums_query(f"AND (fl.latitude, fl.longitude) IN ({pairs}) "),
+            [value for farm in farms for value in (farm["latitude"], farm["longitude"])]
+        )
+        rows = cursor.fetchall()
+    return [(f["latitude"], f["longitude"], f["region_name"]) for f in farms], rows
+
+
+def _sums_and_counts(rows):
+    sums = np.array([[float(row[f"{col}_sum"] or 0) for col in NUTRIENT_COLUMNS] for row in rows])
+    counts = np.array([[row[f"{col}_n"] for col in NUTRIENT_COLUMNS] for row in rows], dtype=np.float64)
+    return sums.reshape(len(rows), len(NUTRIENT_COLUMNS)), counts.reshape(len(rows), len(NUTRIENT_COLUMNS))
+
+
+class HeatmapCache:
+    def __init__(self, radius_km=SEARCH_RADIUS_KM, ttl=TILE_TTL, max_tiles=MAX_CACHED_TILES):
+        self.radius_km = radius_km
+        self.ttl = ttl
+        self.max_tiles = max_tiles
+        self.index = None
+        self.sums = None
+        self.counts = None
+        self.sample_count = None
+        self.watermark = None
+        self.tiles = {}
+        self.hits = 0
+        self.misses = 0
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    def _load(self, conn):
+        self.sample_count, self.watermark = fetch_fingerprint(conn)
+        with conn.cursor() as cursor:
+            cursor.execute(farm_sums_query())
+            rows = cursor.fetchall()
+
+        self.sums, self.counts = _sums_and_counts(rows)
+        self.index = FarmIndex(
+            {"latitude": row["latitude"], "longitude": row["longitude"],
+             "region_name": row["region_name"], "row": i}
+            for i, row in enumerate(rows)
+        )
+        self.tiles.clear()
+
+    def _ensure_loaded(self):
+        """
+        Load the farm sums on first use, and catch up with other processes'
+        writes once every TILE_TTL seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.index is not None and now - self._checked_at < self.ttl:
+                return
+            conn = get_connection()
+            try:
+                if self.index is None:
+                    self._load(conn)
+                else:
+                    self._catch_up(conn)
+            finally:
+                conn.close()
+            self._checked_at = now
+
+    def _catch_up(self, conn):
+        count, newest = fetch_fingerprint(conn)
+        if count < self.sample_count or (self.watermark is None and newest is not None):
+            self._load(conn)
+            return
+        self.sample_count = count
+        if newest is None:
+            return
+        locations, rows = fetch_farm_sums(
+            conn, "ss.updated_at >= %s - INTERVAL %s SECOND", (self.watermark, WATERMARK_OVERLAP_SECONDS)
+        )
+        self.set_farms(locations, rows)
+        self.watermark = max(self.watermark, newest)
+
+    def _points(self, min_lat, min_lon, max_lat, max_lon, region_name):
+        farms = self.index.in_bbox(min_lat, min_lon, max_lat, max_lon)
+        if region_name is not None:
+            farms = [farm for farm in farms if farm["region_name"] == region_name]
+        rows = np.array([farm["row"] for farm in farms], dtype=np.int64)
+        lats = np.array([farm["latitude"] for farm in farms])
+        lons = np.array([farm["longitude"] for farm in farms])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = self.sums[rows] / self.counts[rows]
+        return lats, lons, means.reshape(len(rows), len(NUTRIENT_COLUMNS))
+
+    def _render(self, layer, region_name, zoom, x, y):
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, x, y)
+        pad_lat = self.radius_km / KM_PER_DEGREE
+        pad_lon = pad_lat / max(math.cos(math.radians((min_lat + max_lat) / 2)), 1e-6)
+        lats, lons, means = self._points(min_lat - pad_lat, min_lon - pad_lon,
+                                         max_lat + pad_lat, max_lon + pad_lon, region_name)
+        cell_lats, cell_lons = cell_centers(zoom, x, y)
+
+        if layer == CLASS_LAYER:
+            surface = idw(cell_lats, cell_lons, lats, lons, means, self.radius_km)
+            classes = get_decision_table().classify(*surface.T).astype(np.float64)
+            classes[np.isnan(surface[:, 0])] = np.nan
+            grid = classes
+        else:
+            col = NUTRIENT_COLUMNS.index(layer)
+            grid = idw(cell_lats, cell_lons, lats, lons, means[:, col:col + 1], self.radius_km)[:, 0]
+        return grid.reshape(TILE_SIZE, TILE_SIZE)
+
+    def get_tile(self, layer, zoom, x, y, region_name=None):
+        """
+        TILE_SIZE x TILE_SIZE float array for one tile (row 0 is the north
+        edge); NaN marks cells with no tested farm within the search radius.
+        """
+        if layer not in LAYERS:
+            raise ValueError(f"Unknown heatmap layer: {layer}")
+        self._ensure_loaded()
+        key = (layer, region_name, zoom, x, y)
+        with self._lock:
+            cached = self.tiles.get(key)
+            if cached is not None:
+                self.hits += 1
+                # Re-insert so eviction drops the least recently used tiles first.
+                self.tiles[key] = self.tiles.pop(key)
+                return cached
+            self.misses += 1
+            grid = self._render(layer, region_name, zoom, x, y)
+            self.tiles[key] = grid
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.pop(next(iter(self.tiles)))
+            return grid
+
+    def set_farms(self, locations, rows):
+        """
+        Replace the sums of the farms at `locations` ((latitude, longitude,
+        region_name) triples) with `rows` from farm_sums_query(), and drop
+        the cached tiles near each farm whose sums changed. A farm missing
+        from `rows` has no tested samples left. Returns the number of tiles
+        invalidated.
+        """
+        with self._lock:
+            if self.index is None:
+                return 0
+            fresh = {(float(row["latitude"]), float(row["longitude"])): row for row in rows}
+            empty = np.zeros(len(NUTRIENT_COLUMNS))
+            dropped = 0
+            for lat, lon, region_name in locations:
+                lat, lon = float(lat), float(lon)
+                farm = self.index.farms.get((lat, lon))
+                if farm is None:
+                    row = len(self.sums)
+                    self.sums = np.vstack([self.sums, empty])
+                    self.counts = np.vstack([self.counts, empty])
+                    self.index.add({"latitude": lat, "longitude": lon, "region_name": region_name, "row": row})
+                else:
+                    row = farm["row"]
+                if (lat, lon) in fresh:
+                    sums, counts = _sums_and_counts([fresh[(lat, lon)]])
+                    sums, counts = sums[0], counts[0]
+                else:
+                    sums, counts = empty, empty
+                if np.array_equal(self.sums[row], sums) and np.array_equal(self.counts[row], counts):
+                    continue
+                self.sums[row], self.counts[row] = sums, counts
+                dropped += self._invalidate_near(lat, lon)
+            return dropped
+
+    def _invalidate_near(self, lat, lon):
+        pad_lat = self.radius_km / KM_PER_DEGREE
+        pad_lon = pad_lat / max(math.cos(math.radians(lat)), 1e-6)
+        box = (lat - pad_lat, lon - pad_lon, lat + pad_lat, lon + pad_lon)
+        affected = {}
+        stale = []
+        for key in self.tiles:
+            zoom = key[2]
+            if zoom not in affected:
+                affected[zoom] = set(tiles_covering(zoom, *box))
+            if (key[3], key[4]) in affected[zoom]:
+                stale.append(key)
+        for key in stale:
+            del self.tiles[key]
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {"tiles": len(self.tiles), "hits": self.hits, "misses": self.misses,
+                    "farms": len(self.index) if self.index is not None else 0}
+
+
+_cache = HeatmapCache()
+
+
+def get_heatmap_tile(layer, zoom, x, y, region_name=None):
+    return _cache.get_tile(layer, zoom, x, y, region_name)
+
+
+def samples_landed(samples):
+    """
+    Update the heatmap for freshly tested (soil_id, values) pairs by
+    re-reading the sums of the farms they belong to, so a resubmitted
+    sample replaces its earlier values instead of adding to them. A no-op
+    until this process has rendered a tile.
+    """
+    if _cache.index is None or not samples:
+        return 0
+    placeholders = ", ".join(["%s"] * len(samples))
+    conn = get_connection()
+    try:
+        locations, rows = fetch_farm_sums(conn, f"ss.soil_id IN ({placeholders})",
+                                          [soil_id for soil_id, _ in samples])
+    finally:
+        conn.close()
+    return _cache.set_farms(locations, rows)
+
+
+def heatmap_stats():
+    return _cache.stats()
@@ -0,0 +1,191 @@
+"""
+In-memory spatial index over Farm_Location.
+
+Farms are bucketed into a fixed latitude/longitude grid (CELL_DEGREES per
+side, about 11 km at the default 0.1). A radius, nearest-neighbour or
+bounding-box query only looks at the cells that can contain answers.
+Exact great-circle distances are then computed for those candidates in
+one vectorized pass.
+
+The shared index is loaded once, and local add_farm_location() calls
+update it in place. Writes from other processes are picked up through the
+Data_Version 'Farm_Location' row plus the table's row count (farms removed
+by cascading deletes do not bump the version). Both are checked at most
+every VERSION_CHECK_INTERVAL seconds.
+"""
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from db.connection import get_connection
+
+CELL_DEGREES = float(os.getenv("FARM_INDEX_CELL_DEGREES", "0.1"))
+VERSION_CHECK_INTERVAL = 5.0
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from (lat, lon) to each point in lats/lons."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class FarmIndex:
+    def __init__(self, farms=(), cell_degrees=CELL_DEGREES, fingerprint=None):
+        self.cell_degrees = cell_degrees
+        self.fingerprint = fingerprint
+        self.farms = {}
+        self.cells = defaultdict(set)
+        self._lock = threading.RLock()
+        for farm in farms:
+            self.add(farm)
+
+    def __len__(self):
+        return len(self.farms)
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees)))
+
+    def add(self, farm):
+        """
+        Insert or replace a farm: a dict with latitude and longitude plus any
+        other fields (user_id, region_name, ...) to return from queries.
+        """
+        key = (float(farm["latitude"]), float(farm["longitude"]))
+        with self._lock:
+            self.remove(*key)
+            self.farms[key] = dict(farm, latitude=key[0], longitude=key[1])
+            self.cells[self._cell(*key)].add(key)
+
+    def remove(self, latitude, longitude):
+        key = (float(latitude), float(longitude))
+        with self._lock:
+            if self.farms.pop(key, None) is not None:
+                cell = self._cell(*key)
+                self.cells[cell].discard(key)
+                if not self.cells[cell]:
+                    del self.cells[cell]
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        lo_row, lo_col = self._cell(min_lat, min_lon)
+        hi_row, hi_col = self._cell(max_lat, max_lon)
+        with self._lock:
+            # Walk whichever is smaller: the cells in the box or the occupied cells.
+            if (hi_row - lo_row + 1) * (hi_col - lo_col + 1) <= len(self.cells):
+                keys = [key
+                        for row in range(lo_row, hi_row + 1)
+                        for col in range(lo_col, hi_col + 1)
+                        for key in self.cells.get((row, col), ())]
+            else:
+                keys = [key for (row, col), members in self.cells.items()
+                        if lo_row <= row <= hi_row and lo_col <= col <= hi_col
+                        for key in members]
+            farms = [self.farms[key] for key in keys]
+        return farms, np.array([k[0] for k in keys]), np.array([k[1] for k in keys])
+
+    @staticmethod
+    def _with_distances(farms, distances, order):
+        return [dict(farms[i], distance_km=float(distances[i])) for i in order]
+
+    def within_radius(self, lat, lon, radius_km, limit=None):
+        """Farms within `radius_km` of (lat, lon), nearest first."""
+        dlat = radius_km / KM_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dlon = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+        farms, lats, lons = self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        if not farms:
+            return []
+        distances = haversine_km(lat, lon, lats, lons)
+        inside = np.flatnonzero(distances <= radius_km)
+        order = inside[np.argsort(distances[inside], kind="stable")]
+        return self._with_distances(farms, distances, order[:limit])
+
+    def nearest(self, lat, lon, k=5, max_radius_km=2000.0):
+        """
+        The `k` farms closest to (lat, lon). The search radius doubles from
+        one cell until it holds k farms, so the cost follows local density.
+        """
+        radius = self.cell_degrees * KM_PER_DEGREE
+        while True:
+            found = self.within_radius(lat, lon, radius)
+            if len(found) >= k or radius >= max_radius_km or len(found) == len(self.farms):
+                return found[:k]
+            radius *= 2
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Farms inside the box (inclusive), e.g. the visible area of a map."""
+        farms, lats, lons = self._candidates(min_lat, min_lon, max_lat, max_lon)
+        if not farms:
+            return []
+        inside = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon))
+        return [farms[i] for i in inside]
+
+
+def fetch_fingerprint(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT (SELECT version FROM Data_Version WHERE table_name = 'Farm_Location') AS version, "
+            "(SELECT COUNT(*) FROM Farm_Location) AS farms"
+        )
+        row = cursor.fetchone()
+    return (row["version"] or 0, row["farms"])
+
+
+def load_farm_index(conn):
+    fingerprint = fetch_fingerprint(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT latitude, longitude, user_id, region_name FROM Farm_Location")
+        rows = cursor.fetchall()
+    return FarmIndex(rows, fingerprint=fingerprint)
+
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_farm_index():
+    """
+    Return the shared index, checking the Farm_Location fingerprint at most
+    once every VERSION_CHECK_INTERVAL seconds and reloading when it moved.
+    """
+    global _index, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _index is None or now - _checked_at >= VERSION_CHECK_INTERVAL:
+            conn = get_connection()
+            try:
+                if _index is None or fetch_fingerprint(conn) != _index.fingerprint:
+                    _index = load_farm_index(conn)
+            finally:
+                conn.close()
+            _checked_at = now
+        return _index
+
+
+def farm_added(farm):
+    """Apply a farm written by this process to the loaded index without a reload."""
+    with _lock:
+        if _index is None:
+            return
+        _index.add(farm)
+        version, count = _index.fingerprint or (0, 0)
+        _index.fingerprint = (version + 1, count + 1)
+
+
+def farms_within_radius(lat, lon, radius_km, limit=None):
+    return get_farm_index().within_radius(lat, lon, radius_km, limit)
+
+
+def nearest_farms(lat, lon, k=5):
+    return get_farm_index().nearest(lat, lon, k)
+
+
+def farms_in_bbox(min_lat, min_lon, max_lat, max_lon):
+    return get_farm_index().in_bbox(min_lat, min_lon, max_lat, max_lon)
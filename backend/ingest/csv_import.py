@@ -0,0 +1,258 @@
+"""
+Bulk import of soil samples from CSV lab / field exports.
+
+The file is streamed row by row, validated, and loaded in batches either as
+multi-row INSERTs (PyMySQL folds executemany into one statement per batch)
+or with LOAD DATA LOCAL INFILE. Farm coordinates, farmers and labs are
+resolved with one query per batch rather than per row. Rejected rows are
+written to a CSV report with their line number and reason.
+
+Expected columns: farmer_id, lab_id, nitrogen, phosphorus, potassium,
+calcium, magnesium, sulfur, lime, carbon, moisture and optionally
+farm_latitude, farm_longitude, sample_name, test_date. When the coordinates
+are missing, the farmer's registered farm location is used.
+
+    python -m ingest.csv_import samples.csv --batch-size 2000 --rejects rejects.csv
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from db.connection import create_connection, get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+from ingest.validation import parse_nutrient
+
+INSERT_COLUMNS = [
+    "farmer_id", "lab_id", *NUTRIENT_COLUMNS, "test_date",
+    "farm_latitude", "farm_longitude", "sample_status", "sample_name"
+]
+COORD_PLACES = Decimal("0.000001")
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_row(row):
+    """Turn one CSV dict into a partially resolved sample, or raise RowError."""
+    try:
+        farmer_id = int(row.get("farmer_id") or "")
+        lab_id = int(row.get("lab_id") or "")
+    except ValueError:
+        raise RowError("farmer_id and lab_id must be integers")
+
+    try:
+        nutrients = [parse_nutrient(row.get(col), col) for col in NUTRIENT_COLUMNS]
+    except ValueError as e:
+        raise RowError(str(e))
+
+    lat, lon = row.get("farm_latitude"), row.get("farm_longitude")
+    if lat and lon:
+        try:
+            coords = (Decimal(lat).quantize(COORD_PLACES), Decimal(lon).quantize(COORD_PLACES))
+        except InvalidOperation:
+            raise RowError("farm_latitude/farm_longitude must be numeric")
+    elif lat or lon:
+        raise RowError("farm_latitude and farm_longitude must be given together")
+    else:
+        coords = None
+
+    test_date = row.get("test_date") or None
+    if test_date:
+        try:
+            test_date = datetime.fromisoformat(test_date.strip())
+        except ValueError:
+            raise RowError(f"test_date: '{test_date}' is not an ISO date")
+
+    sample_name = (row.get("sample_name") or "").strip() or None
+    status = "tested" if all(v is not None for v in nutrients) else "waiting"
+    return {
+        "farmer_id": farmer_id, "lab_id": lab_id, "nutrients": nutrients,
+        "coords": coords, "test_date": test_date or datetime.now(),
+        "status": status, "sample_name": sample_name,
+    }
+
+
+class Resolver:
+    """Caches farmers, labs and farm locations across batches."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT lab_id FROM Soil_Test_Lab")
+            self.labs = {row["lab_id"] for row in cursor.fetchall()}
+        self.farm_of = {}
+        self.farmers = set()
+        self.known_coords = set()
+
+    def prefetch(self, samples):
+        farmer_ids = {s["farmer_id"] for s in samples} - self.farmers - set(self.farm_of)
+        coords = {s["coords"] for s in samples if s["coords"]} - self.known_coords
+        with self.conn.cursor() as cursor:
+            if farmer_ids:
+                placeholders = ", ".join(["%s"] * len(farmer_ids))
+                cursor.execute(
+                    f"SELECT f.user_id, fl.latitude, fl.longitude FROM Farmer f "
+                    f"LEFT JOIN Farm_Location fl ON fl.user_id = f.user_id "
+                    f"WHERE f.user_id IN ({placeholders})",
+                    list(farmer_ids)
+                )
+                for row in cursor.fetchall():
+                    self.farmers.add(row["user_id"])
+                    if row["latitude"] is not None:
+                        self.farm_of.setdefault(row["user_id"], (row["latitude"], row["longitude"]))
+                        self.known_coords.add((row["latitude"], row["longitude"]))
+            if coords - self.known_coords:
+                pairs = list(coords - self.known_coords)
+                placeholders = ", ".join(["(%s, %s)"] * len(pairs))
+                cursor.execute(
+                    f"SELECT latitude, longitude FROM Farm_Location "
+                    f"WHERE (latitude, longitude) IN ({placeholders})",
+                    [value for pair in pairs for value in pair]
+                )
+                self.known_coords.update((row["latitude"], row["longitude"]) for row in cursor.fetchall())
+
+    def resolve(self, sample):
+        if sample["lab_id"] not in self.labs:
+            raise RowError(f"lab_id {sample['lab_id']} does not exist")
+        if sample["farmer_id"] not in self.farmers:
+            raise RowError(f"farmer_id {sample['farmer_id']} is not a registered farmer")
+        coords = sample["coords"] or self.farm_of.get(sample["farmer_id"])
+        if coords is None:
+            raise RowError(f"farmer_id {sample['farmer_id']} has no farm location")
+        if coords not in self.known_coords:
+            raise RowError(f"farm location {coords[0]}, {coords[1]} does not exist")
+        return (
+            sample["farmer_id"], sample["lab_id"], *sample["nutrients"],
+            sample["test_date"], coords[0], coords[1], sample["status"], sample["sample_name"]
+        )
+
+
+def insert_batch(conn, rows):
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO Soil_Sample ({', '.join(INSERT_COLUMNS)}) "
+            f"VALUES ({', '.join(['%s'] * len(INSERT_COLUMNS))})",
+            rows
+        )
+    conn.commit()
+
+
+def tsv_field(value):
+    """Format one value the way LOAD DATA's default escaping expects."""
+    if value is None:
+        return "\\N"
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def load_data_batch(conn, rows):
+    """Write the batch to a temporary tab-separated file and LOAD DATA it."""
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False, encoding="utf-8") as file:
+        for row in rows:
+            file.write("\t".join(tsv_field(v) for v in row) + "\n")
+        path = file.name
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE Soil_Sample CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                f"({', '.join(INSERT_COLUMNS)})",
+                (path,)
+            )
+        conn.commit()
+    finally:
+        os.remove(path)
+
+
+def import_csv(path, batch_size=1000, rejects_path=None, use_load_data=False, progress=None):
+    """
+    Import every valid row of `path`. Returns a summary dict with loaded and
+    rejected counts, elapsed seconds and rows/sec.
+    """
+    started = time.perf_counter()
+    loaded = rejected = 0
+    conn = create_connection(local_infile=True) if use_load_data else get_connection()
+    load = load_data_batch if use_load_data else insert_batch
+    rejects_file = open(rejects_path, "w", newline="") if rejects_path else None
+    rejects = csv.writer(rejects_file) if rejects_file else None
+    if rejects:
+        rejects.writerow(["line", "reason", "row"])
+
+    def reject(line, reason, row):
+        nonlocal rejected
+        rejected += 1
+        if rejects:
+            rejects.writerow([line, reason, row])
+
+    def flush(pending):
+        nonlocal loaded
+        resolver.prefetch([sample for _, sample, _ in pending])
+        rows = []
+        for line, sample, raw in pending:
+            try:
+                rows.append(resolver.resolve(sample))
+            except RowError as e:
+                reject(line, str(e), raw)
+        if rows:
+            load(conn, rows)
+            loaded += len(rows)
+        if progress:
+            progress(loaded, rejected, time.perf_counter() - started)
+
+    try:
+        resolver = Resolver(conn)
+        with open(path, newline="", encoding="utf-8-sig") as file:
+            reader = csv.DictReader(file)
+            pending = []
+            for row in reader:
+                line = reader.line_num
+                try:
+                    pending.append((line, parse_row(row), row))
+                except RowError as e:
+                    reject(line, str(e), row)
+                if len(pending) >= batch_size:
+                    flush(pending)
+                    pending = []
+            if pending:
+                flush(pending)
+    finally:
+        conn.close()
+        if rejects_file:
+            rejects_file.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "loaded": loaded,
+        "rejected": rejected,
+        "seconds": elapsed,
+        "rows_per_sec": (loaded + rejected) / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import soil samples from a CSV export")
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--rejects", help="write rejected rows and reasons to this CSV")
+    parser.add_argument("--load-data", action="store_true",
+                        help="use LOAD DATA LOCAL INFILE instead of multi-row INSERTs")
+    args = parser.parse_args()
+
+    summary = import_csv(
+        args.path, args.batch_size, args.rejects, args.load_data,
+        progress=lambda loaded, rejected, secs: print(
+            f"  {loaded} loaded, {rejected} rejected ({(loaded + rejected) / secs:.0f} rows/sec)"
+        )
+    )
+    print(f"Imported {summary['loaded']} samples, rejected {summary['rejected']} "
+          f"in {summary['seconds']:.1f}s ({summary['rows_per_sec']:.0f} rows/sec)")
+    if summary["rejected"] and args.rejects:
+        print(f"Reject report written to {args.rejects}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Batch submission of soil analyzer result files by lab technicians.
+
+An analyzer export is a CSV (comma, semicolon or tab separated) with a
+soil_id column and one column per nutrient. The usual instrument headers
+(N, P, K, Ca, Mg, S, C, Moisture %) are accepted alongside the
+Soil_Sample column names. Every row is checked against the lab's pending
+samples, fetched once, and the accepted results are written and classified
+in chunked transactions through sp_submit_soil_test_results_bulk.
+
+    python -m ingest.result_files analyzer_run.csv --lab-id 3
+"""
+import argparse
+import csv
+import time
+from db.stored_procedures import get_lab_pending_samples, submit_soil_test_results_bulk
+from fertility.engine import NUTRIENT_COLUMNS
+from ingest.validation import parse_nutrient
+
+HEADER_ALIASES = {
+    "soil_id": "soil_id", "soil id": "soil_id", "sample_id": "soil_id", "sample id": "soil_id",
+    "n": "nitrogen", "p": "phosphorus", "k": "potassium", "ca": "calcium",
+    "mg": "magnesium", "s": "sulfur", "c": "carbon",
+    "moisture %": "moisture", "moisture%": "moisture",
+    **{col: col for col in NUTRIENT_COLUMNS},
+}
+
+SUBMITTED = "submitted"
+REJECTED = "rejected"
+FAILED = "failed"
+
+
+def read_result_file(path):
+    """
+    Yield (line, soil_id, nutrients, error) for each data row. `nutrients`
+    maps NUTRIENT_COLUMNS to floats; error is None for a well-formed row.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(file, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [HEADER_ALIASES.get(h.strip().lower()) for h in header]
+        missing = [col for col in ["soil_id", *NUTRIENT_COLUMNS] if col not in columns]
+        if missing:
+            raise ValueError(f"Result file is missing columns: {', '.join(missing)}")
+
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue
+            line = reader.line_num
+            row = {col: value for col, value in zip(columns, values) if col}
+            try:
+                soil_id = int(row.get("soil_id", ""))
+            except ValueError:
+                yield line, None, None, f"soil_id: '{row.get('soil_id', '')}' is not an integer"
+                continue
+            try:
+                nutrients = {col: parse_nutrient(row.get(col), col) for col in NUTRIENT_COLUMNS}
+            except ValueError as e:
+                yield line, soil_id, None, str(e)
+                continue
+            blank = [col for col, value in nutrients.items() if value is None]
+            if blank:
+                yield line, soil_id, None, f"missing readings: {', '.join(blank)}"
+                continue
+            yield line, soil_id, nutrients, None
+
+
+def submit_result_file(path, lab_id, chunk_size=500, progress=None):
+    """
+    Submit every valid result in `path` for samples waiting in `lab_id`.
+    Each chunk is one transaction; a failing chunk is reported and the rest
+    continue. Returns a summary dict with per-sample outcomes and timings.
+    """
+    started = time.perf_counter()
+    pending = {s["soil_id"] for s in get_lab_pending_samples(lab_id)}
+    lookup_secs = time.perf_counter() - started
+
+    outcomes = []
+    accepted = []
+    seen = set()
+    for line, soil_id, nutrients, error in read_result_file(path):
+        if error is None and soil_id not in pending:
+            error = f"soil sample {soil_id} is not waiting for results in this lab"
+        elif error is None and soil_id in seen:
+            error = f"soil sample {soil_id} appears more than once in the file"
+        if error:
+            outcomes.append({"line": line, "soil_id": soil_id, "outcome": REJECTED,
+                             "fertility_class_id": None, "reason": error})
+            continue
+        seen.add(soil_id)
+        accepted.append((line, {"soil_id": soil_id, **nutrients}))
+    parse_secs = time.perf_counter() - started - lookup_secs
+
+    write_started = time.perf_counter()
+    submitted = failed = 0
+    for start in range(0, len(accepted), chunk_size):
+        chunk = accepted[start:start + chunk_size]
+        try:
+            classes = submit_soil_test_results_bulk([result for _, result in chunk])
+        except Exception as e:
+            failed += len(chunk)
+            outcomes.extend(
+                {"line": line, "soil_id": result["soil_id"], "outcome": FAILED,
+                 "fertility_class_id": None, "reason": str(e)}
+                for line, result in chunk
+            )
+        else:
+            # Samples tested by someone else since the pending lookup are
+            # left untouched by the procedure and missing from `classes`.
+            for line, result in chunk:
+                soil_id = result["soil_id"]
+                if soil_id in classes:
+                    submitted += 1
+                    outcomes.append({"line": line, "soil_id": soil_id, "outcome": SUBMITTED,
+                                     "fertility_class_id": classes[soil_id], "reason": None})
+                else:
+                    outcomes.append({"line": line, "soil_id": soil_id, "outcome": REJECTED,
+                                     "fertility_class_id": None,
+                                     "reason": f"soil sample {soil_id} is no longer waiting for results"})
+        if progress:
+            progress(submitted, failed, time.perf_counter() - write_started)
+    write_secs = time.perf_counter() - write_started
+
+    outcomes.sort(key=lambda o: o["line"])
+    return {
+        "submitted": submitted,
+        "rejected": sum(1 for o in outcomes if o["outcome"] == REJECTED),
+        "failed": failed,
+        "outcomes": outcomes,
+        "lookup_seconds": lookup_secs,
+        "parse_seconds": parse_secs,
+        "write_seconds": write_secs,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def print_summary(summary, show_outcomes=True):
+    if show_outcomes:
+        for o in summary["outcomes"]:
+            if o["outcome"] == SUBMITTED:
+                print(f"  line {o['line']}: soil {o['soil_id']} -> Fertility Class ID {o['fertility_class_id']}")
+            else:
+                print(f"  line {o['line']}: soil {o['soil_id']} {o['outcome']} - {o['reason']}")
+    print(f"\nSubmitted {summary['submitted']}, rejected {summary['rejected']}, failed {summary['failed']} "
+          f"in {summary['seconds']:.2f}s (lookup {summary['lookup_seconds']:.2f}s, "
+          f"parse {summary['parse_seconds']:.2f}s, write {summary['write_seconds']:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Submit a soil analyzer result file for a lab")
+    parser.add_argument("path")
+    parser.add_argument("--lab-id", type=int, required=True)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--quiet", action="store_true", help="print only the totals")
+    args = parser.parse_args()
+
+    summary = submit_result_file(args.path, args.lab_id, args.chunk_size)
+    print_summary(summary, show_outcomes=not args.quiet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Asyncio ingestion gateway for soil sensor streams.
+
+Probes connect over TCP or a Unix socket and send one JSON reading per line,
+using the same fields as the CSV import (farmer_id, lab_id, the nutrient
+columns, optional farm_latitude/farm_longitude, sample_name, test_date).
+Readings are validated, queued in a bounded queue and written to
+Soil_Sample in batches cut by size or by wait time. When the database falls
+behind the queue fills up and connections simply stop being read (TCP
+backpressure), or, with --drop-when-full, new readings are dropped and
+counted instead.
+
+    python -m ingest.sensor_gateway --port 9500
+    python -m ingest.sensor_gateway --unix /tmp/soil-sensors.sock
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db.connection import get_connection
+from ingest.csv_import import Resolver, RowError, insert_batch, parse_row
+
+SENSOR_FIELDS = {"timestamp": "test_date"}
+
+
+class GatewayStats:
+    def __init__(self):
+        self.received = 0
+        self.written = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.failed = 0
+        self.failed_batches = 0
+        self.started = time.monotonic()
+        self._last_written = 0
+        self._last_at = self.started
+
+    def snapshot(self, queue_depth):
+        now = time.monotonic()
+        interval = now - self._last_at
+        rate = (self.written - self._last_written) / interval if interval else 0.0
+        self._last_written, self._last_at = self.written, now
+        return {
+            "received": self.received,
+            "written": self.written,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "failed_batches": self.failed_batches,
+            "queue_depth": queue_depth,
+            "rows_per_sec": rate,
+        }
+
+
+class SensorGateway:
+    def __init__(self, batch_size=500, max_wait_ms=200, queue_size=10000, drop_when_full=False):
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.drop_when_full = drop_when_full
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = GatewayStats()
+        # One writer thread owns the database connection, so batches are
+        # written strictly one after another and never share the connection.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sensor-writer")
+        self._conn = None
+        self._resolver = None
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                self.stats.received += 1
+                try:
+                    reading = json.loads(line)
+                    if not isinstance(reading, dict):
+                        raise ValueError("a reading must be a JSON object")
+                    for source, target in SENSOR_FIELDS.items():
+                        if source in reading and target not in reading:
+                            reading[target] = reading.pop(source)
+                    sample = parse_row(reading)
+                except (ValueError, TypeError, AttributeError, RowError):
+                    self.stats.rejected += 1
+                    continue
+
+                if self.drop_when_full:
+                    try:
+                        self.queue.put_nowait(sample)
+                    except asyncio.QueueFull:
+                        self.stats.dropped += 1
+                else:
+                    await self.queue.put(sample)
+        finally:
+            writer.close()
+
+    async def batch_writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                written, rejected = await loop.run_in_executor(self._executor, self._write, batch)
+            except Exception as e:
+                # Losing this batch must not stop the writer: the queue would
+                # fill up and block every client for good.
+                print(f"Error writing sensor batch of {len(batch)} readings: {e}")
+                self.stats.failed_batches += 1
+                self.stats.failed += len(batch)
+                self._discard_connection()
+            else:
+                self.stats.written += written
+                self.stats.rejected += rejected
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write(self, batch):
+        if self._conn is None:
+            self._conn = get_connection()
+            self._resolver = Resolver(self._conn)
+        self._resolver.prefetch(batch)
+        rows, rejected = [], 0
+        for sample in batch:
+            try:
+                rows.append(self._resolver.resolve(sample))
+            except RowError:
+                rejected += 1
+        if not rows:
+            return 0, rejected
+        try:
+            insert_batch(self._conn, rows)
+        except Exception as e:
+            print(f"Error writing sensor batch of {len(rows)} readings, retrying row by row: {e}")
+            self.stats.failed_batches += 1
+            self._reset_connection()
+            written = 0
+            for row in rows:
+                try:
+                    insert_batch(self._conn, [row])
+                    written += 1
+                except Exception:
+                    rejected += 1
+                    self._reset_connection()
+            return written, rejected
+        return len(rows), rejected
+
+    def _reset_connection(self):
+        self._discard_connection()
+        self._conn = get_connection()
+        self._resolver.conn = self._conn
+
+    def _discard_connection(self):
+        # The pool rolls the failed transaction back on close; the next batch reconnects.
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    async def report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            s = self.stats.snapshot(self.queue.qsize())
+            print(f"[gateway] {s['rows_per_sec']:.0f} rows/sec | written {s['written']} | "
+                  f"queue {s['queue_depth']} | rejected {s['rejected']} | dropped {s['dropped']} | "
+                  f"failed {s['failed']}")
+
+    async def serve(self, host="127.0.0.1", port=9500, unix_path=None, report_interval=10):
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_client, path=unix_path)
+            where = unix_path
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+            where = f"{host}:{port}"
+        print(f"Sensor gateway listening on {where}")
+
+        tasks = [asyncio.create_task(self.batch_writer()), asyncio.create_task(self.report(report_interval))]
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._executor.shutdown(wait=True)
+            if self._conn is not None:
+                self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Newline-delimited JSON soil sensor gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9500)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-wait-ms", type=float, default=200)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--drop-when-full", action="store_true",
+                        help="drop readings instead of pausing clients when the queue is full")
+    parser.add_argument("--report-interval", type=float, default=10)
+    args = parser.parse_args()
+
+    gateway = SensorGateway(args.batch_size, args.max_wait_ms, args.queue_size, args.drop_when_full)
+    try:
+        asyncio.run(gateway.serve(args.host, args.port, args.unix, args.report_interval))
+    except KeyboardInterrupt:
+        s = gateway.stats.snapshot(gateway.queue.qsize())
+        print(f"Stopped. Written {s['written']}, rejected {s['rejected']}, dropped {s['dropped']}, "
+              f"failed {s['failed']}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+NUTRIENT_MIN = 0
+NUTRIENT_MAX = 999.99
+
+
+def parse_nutrient(raw, field_name):
+    """
+    Parse one nutrient reading with the same 0-999.99 range the CLI enforces.
+    Blank means "not measured" and returns None; anything else invalid
+    raises ValueError with a message fit for a reject report.
+    """
+    if raw is None or str(raw).strip() == "":
+        return None
+    try:
+        value = float(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field_name}: '{raw}' is not a number")
+    if not NUTRIENT_MIN <= value <= NUTRIENT_MAX:
+        raise ValueError(f"{field_name}: {value} is outside {NUTRIENT_MIN}-{NUTRIENT_MAX}")
+    return value
@@ -0,0 +1,127 @@
+"""
+Proximity- and queue-aware lab suggestions for new soil sample requests.
+
+Labs are ranked by distance from the farm plus QUEUE_KM_PER_SAMPLE km for
+every sample already waiting in the lab. A lab twice as far away can
+therefore still win if the nearest lab is backed up. A lab without stored
+coordinates is placed at the centroid of the farms it has served.
+
+Lab positions and waiting counts are kept in memory. A request made in this
+process bumps its lab's count directly. Counts are reconciled with one
+GROUP BY on (lab_id, sample_status) every QUEUE_REFRESH_INTERVAL seconds,
+which also picks up finished tests and other processes. Lab changes made
+here drop the cache.
+"""
+import threading
+import time
+import numpy as np
+from db.connection import get_connection
+from geo.spatial_index import haversine_km
+
+QUEUE_KM_PER_SAMPLE = 5.0
+QUEUE_REFRESH_INTERVAL = 30.0
+UNKNOWN_DISTANCE_KM = 1000.0
+
+
+class LabRouter:
+    def __init__(self, labs):
+        self.labs = {lab["lab_id"]: dict(lab) for lab in labs}
+        self.refreshed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def note_requested(self, lab_id, count=1):
+        with self._lock:
+            if lab_id in self.labs:
+                self.labs[lab_id]["waiting"] += count
+
+    def set_waiting(self, counts):
+        with self._lock:
+            for lab in self.labs.values():
+                lab["waiting"] = counts.get(lab["lab_id"], 0)
+            self.refreshed_at = time.monotonic()
+
+    def suggest(self, lat, lon, limit=3, queue_km=QUEUE_KM_PER_SAMPLE):
+        """
+        Labs ordered best first, each a dict with lab_id, lab_name,
+        distance_km (None if the lab has no known position), waiting and score.
+        """
+        with self._lock:
+            labs = list(self.labs.values())
+        if not labs:
+            return []
+        lats = np.array([np.nan if lab["latitude"] is None else float(lab["latitude"]) for lab in labs])
+        lons = np.array([np.nan if lab["longitude"] is None else float(lab["longitude"]) for lab in labs])
+        waiting = np.array([lab["waiting"] for lab in labs], dtype=np.float64)
+        distances = haversine_km(float(lat), float(lon), lats, lons)
+        known = ~np.isnan(distances)
+        scores = np.where(known, distances, UNKNOWN_DISTANCE_KM) + queue_km * waiting
+        order = np.argsort(scores, kind="stable")[:limit]
+        return [
+            {"lab_id": labs[i]["lab_id"], "lab_name": labs[i]["lab_name"],
+             "distance_km": float(distances[i]) if known[i] else None,
+             "waiting": int(waiting[i]), "score": float(scores[i])}
+            for i in order
+        ]
+
+
+def _waiting_counts(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT lab_id, COUNT(*) AS waiting FROM Soil_Sample "
+            "WHERE sample_status = 'waiting' GROUP BY lab_id"
+        )
+        return {row["lab_id"]: row["waiting"] for row in cursor.fetchall()}
+
+
+def load_lab_router(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT l.lab_id, l.lab_name, "
+            "COALESCE(l.latitude, AVG(ss.farm_latitude)) AS latitude, "
+            "COALESCE(l.longitude, AVG(ss.farm_longitude)) AS longitude "
+            "FROM Soil_Test_Lab l "
+            "LEFT JOIN Soil_Sample ss ON ss.lab_id = l.lab_id AND l.latitude IS NULL "
+            "GROUP BY l.lab_id, l.lab_name, l.latitude, l.longitude"
+        )
+        labs = cursor.fetchall()
+    counts = _waiting_counts(conn)
+    for lab in labs:
+        lab["waiting"] = counts.get(lab["lab_id"], 0)
+    return LabRouter(labs)
+
+
+_router = None
+_lock = threading.Lock()
+
+
+def get_lab_router():
+    global _router
+    with _lock:
+        if _router is None or time.monotonic() - _router.refreshed_at >= QUEUE_REFRESH_INTERVAL:
+            conn = get_connection()
+            try:
+                if _router is None:
+                    _router = load_lab_router(conn)
+                else:
+                    _router.set_waiting(_waiting_counts(conn))
+            finally:
+                conn.close()
+        return _router
+
+
+def invalidate_lab_router():
+    """Drop the cached labs so the next suggestion reloads them (after lab writes)."""
+    global _router
+    with _lock:
+        _router = None
+
+
+def note_sample_requested(lab_id):
+    with _lock:
+        router = _router
+    if router is not None:
+        router.note_requested(lab_id)
+
+
+def suggest_labs(lat, lon, limit=3):
+    return get_lab_router().suggest(lat, lon, limit)
@@ -0,0 +1,197 @@
+"""
+Workload-balanced assignment of waiting soil samples to lab technicians.
+
+Unassigned waiting samples are taken oldest first. Each one goes to the
+technician with the lowest cost, where cost is the number of open samples
+the technician already holds plus a penalty when their specialization does
+not cover the measurements the sample still needs. Technicians sit in a heap
+keyed on workload. The search pops them in workload order and stops as soon
+as the next workload cannot beat the best cost found, so a lab with many
+technicians is not scanned per sample.
+
+Each lab is scheduled in one transaction. The candidate samples are locked
+with FOR UPDATE SKIP LOCKED, so concurrent runs never assign the same sample
+twice, and all of a lab's assignments are written with one multi-row INSERT.
+
+    python -m labs.scheduler            # every lab
+    python -m labs.scheduler --lab-id 2
+"""
+import argparse
+import heapq
+import time
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+
+MAX_OPEN_PER_TECHNICIAN = 50
+MISMATCH_PENALTY = 5.0
+
+# Words in Lab_Technician.specialization and the measurements they cover.
+SPECIALIZATION_KEYWORDS = {
+    "nutrient": {"nitrogen", "phosphorus", "potassium"},
+    "nitrogen": {"nitrogen"},
+    "phosph": {"phosphorus"},
+    "potass": {"potassium"},
+    "mineral": {"calcium", "magnesium", "sulfur"},
+    "ph": {"lime"},
+    "lime": {"lime"},
+    "organic": {"carbon"},
+    "carbon": {"carbon"},
+    "moisture": {"moisture"},
+}
+
+
+def specialization_coverage(specialization):
+    """Set of nutrient columns a specialization string covers."""
+    text = (specialization or "").lower()
+    words = [w.strip("&,;/()") for w in text.split()]
+    covered = set()
+    for keyword, columns in SPECIALIZATION_KEYWORDS.items():
+        # "ph" only as a whole word so it does not match "phosphorus".
+        if (keyword == "ph" and "ph" in words) or (keyword != "ph" and keyword in text):
+            covered |= columns
+    return covered
+
+
+def mismatch(needed, covered):
+    """Fraction of the sample's outstanding measurements outside the technician's coverage."""
+    if not needed:
+        return 0.0
+    return len(needed - covered) / len(needed)
+
+
+def plan_assignments(samples, technicians, max_open=MAX_OPEN_PER_TECHNICIAN, penalty=MISMATCH_PENALTY):
+    """
+    Pure scheduling step. `samples` are dicts with soil_id, test_date and
+    needed (set of columns). `technicians` are dicts with technician_id,
+    covered (set of columns) and open (current workload). Returns a list of
+    (soil_id, technician_id) pairs; samples that find no technician with
+    spare capacity are left out.
+    """
+    heap = [(t["open"], t["technician_id"], t) for t in technicians if t["open"] < max_open]
+    heapq.heapify(heap)
+    queue = [(s["test_date"], s["soil_id"], s) for s in samples]
+    heapq.heapify(queue)
+
+    assignments = []
+    while queue and heap:
+        _, soil_id, sample = heapq.heappop(queue)
+        popped = []
+        best = None
+        while heap and (best is None or heap[0][0] < best[0]):
+            load, tech_id, tech = heapq.heappop(heap)
+            popped.append((load, tech_id, tech))
+            cost = load + penalty * mismatch(sample["needed"], tech["covered"])
+            if best is None or cost < best[0]:
+                best = (cost, len(popped) - 1)
+
+        chosen = popped[best[1]]
+        assignments.append((soil_id, chosen[1]))
+        for i, (load, tech_id, tech) in enumerate(popped):
+            if i == best[1]:
+                load += 1
+                if load >= max_open:
+                    continue
+            heapq.heappush(heap, (load, tech_id, tech))
+    return assignments
+
+
+def _load_lab(conn, lab_id):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT lt.user_id AS technician_id, lt.specialization, "
+            "(SELECT COUNT(*) FROM Sample_Testing st "
+            " JOIN Soil_Sample ss ON ss.soil_id = st.soil_id "
+            " WHERE st.technician_id = lt.user_id AND ss.sample_status = 'waiting') AS open_samples "
+            "FROM Lab_Technician lt WHERE lt.lab_id = %s",
+            (lab_id,)
+        )
+        technicians = [
+            {"technician_id": row["technician_id"], "open": row["open_samples"],
+             "covered": specialization_coverage(row["specialization"])}
+            for row in cursor.fetchall()
+        ]
+        cursor.execute(
+            f"SELECT ss.soil_id, ss.test_date, {', '.join('ss.' + col for col in NUTRIENT_COLUMNS)} "
+            f"FROM Soil_Sample ss "
+            f"WHERE ss.lab_id = %s AND ss.sample_status = 'waiting' "
+            f"AND NOT EXISTS (SELECT 1 FROM Sample_Testing st WHERE st.soil_id = ss.soil_id) "
+            f"FOR UPDATE SKIP LOCKED",
+            (lab_id,)
+        )
+        samples = [
+            {"soil_id": row["soil_id"], "test_date": row["test_date"],
+             "needed": {col for col in NUTRIENT_COLUMNS if row[col] is None}}
+            for row in cursor.fetchall()
+        ]
+    return technicians, samples
+
+
+def assign_lab(lab_id, max_open=MAX_OPEN_PER_TECHNICIAN):
+    """
+    Assign the lab's unassigned waiting samples. Returns a summary dict with
+    the assignments made and how many samples are still unassigned.
+    """
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        technicians, samples = _load_lab(conn, lab_id)
+        assignments = plan_assignments(samples, technicians, max_open)
+        if assignments:
+            with conn.cursor() as cursor:
+                cursor.executemany(
+                    "INSERT INTO Sample_Testing (technician_id, lab_id, soil_id) VALUES (%s, %s, %s)",
+                    [(tech_id, lab_id, soil_id) for soil_id, tech_id in assignments]
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+    per_technician = {}
+    for _, tech_id in assignments:
+        per_technician[tech_id] = per_technician.get(tech_id, 0) + 1
+    return {
+        "lab_id": lab_id,
+        "assigned": len(assignments),
+        "unassigned": len(samples) - len(assignments),
+        "technicians": len(technicians),
+        "per_technician": per_technician,
+        "assignments": assignments,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def assign_all_labs(max_open=MAX_OPEN_PER_TECHNICIAN):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT lab_id FROM Soil_Sample WHERE sample_status = 'waiting' ORDER BY lab_id"
+            )
+            lab_ids = [row["lab_id"] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+    return [assign_lab(lab_id, max_open) for lab_id in lab_ids]
+
+
+def print_summary(summary):
+    print(f"Lab {summary['lab_id']}: assigned {summary['assigned']} samples across "
+          f"{summary['technicians']} technicians, {summary['unassigned']} left unassigned "
+          f"({summary['seconds']:.2f}s)")
+    for tech_id, count in sorted(summary["per_technician"].items()):
+        print(f"  - Technician {tech_id}: +{count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign waiting soil samples to lab technicians")
+    parser.add_argument("--lab-id", type=int, help="only schedule this lab")
+    parser.add_argument("--max-open", type=int, default=MAX_OPEN_PER_TECHNICIAN,
+                        help="maximum open samples per technician")
+    args = parser.parse_args()
+
+    summaries = [assign_lab(args.lab_id, args.max_open)] if args.lab_id else assign_all_labs(args.max_open)
+    for summary in summaries:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
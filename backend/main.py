@@ -1,8 +1,16 @@
 import pymysql
-import csv
 import random
 from getpass import getpass
 from db.connection import get_connection
+from ingest.validation import NUTRIENT_MIN, NUTRIENT_MAX
+from ml.inference import CLASSIFIER_BACKEND, start_inference_service, stop_inference_service
+from ingest.result_files import submit_result_file, print_summary
+from reports.export import export_regions, export_samples
+from reports.sketches import get_percentiles
+from labs.routing import suggest_labs
+from labs.scheduler import assign_lab, assign_all_labs, print_summary as print_assignment_summary
+from reports.rollups import get_trend as get_nutrient_trend, print_trend
+from fertility.engine import NUTRIENT_COLUMNS
 from db.stored_procedures import (
     create_user, authenticate_user,
     add_farm_location,
@@ -17,17 +25,17 @@ from db.stored_procedures import (
     get_fertilizer_recommendations,
     update_crop_growth,
     record_crop_growth,
-    get_crop_growth,
     get_crop_growth_records,
     map_crop_to_farm,
     get_all_users,
     get_all_soil_labs,
     add_soil_lab,
     remove_soil_lab,
+    set_lab_location,
     set_fertility_thresholds,
     get_regional_fertility_reports,
-    submit_soil_test_results,
-    classify_soil_sample,
+    get_all_regional_fertility_reports,
+    submit_soil_test_results_bulk,
     get_lab_pending_samples,
     request_soil_sample_tested,
     get_all_classified_soil_samples,
@@ -37,11 +45,12 @@ from db.stored_procedures import (
     get_all_fertility_classes,
     get_fertility_class_by_id,
     get_all_regions,
-    get_yield_estimate,
+    get_crop_growth_with_estimates,
     get_years_experience,
     get_all_lab_technicians_with_experience,
     delete_crop_growth_record,
-    update_user_details
+    update_user_details,
+    get_lab_anomalies
 )
 
 
@@ -53,6 +62,13 @@ def main():
         print(f"Database connection error: {e}")
         return
 
+    if CLASSIFIER_BACKEND == "model":
+        try:
+            service = start_inference_service()
+            print(f"Loaded soil classifier model v{service.metadata.get('version')}.")
+        except FileNotFoundError as e:
+            print(f"{e}. Using threshold-based classification.")
+
     while True:
         print("\n🌾 Welcome to Crop & Fertilizer Recommendation System 🌾")
         print("----------------------------------------------------------")
@@ -72,6 +88,7 @@ def main():
         else:
             print("Invalid choice. Please enter 1, 2, or 3.")
 
+    stop_inference_service()
     conn.close()
     print("Disconnected successfully.")
 
@@ -304,14 +321,14 @@ def map_crop_to_farm_flow(conn, farmer_id):
 def view_crop_growth_flow(conn, farmer_id):
     print("\n-- View Crop Growth --")
     try:
-        crops = get_crop_growth(farmer_id)
+        crops = get_crop_growth_with_estimates(farmer_id)
         if not crops:
             print("You have no crop growth records.")
             return
 
         print("\n🌱 Your Crop Growth Records:")
         for c in crops:
-            est_yield = get_yield_estimate(c['growth_id']) or "N/A"
+            est_yield = c['estimated_yield'] or "N/A"
             print(f"ID: {c['growth_id']} | Crop: {c['crop_name']} | Status: {c['status']} | "
                   f"Start: {c['start_date']} | End: {c['end_date']} | "
                   f"Yield: {c['yield_quantity']} kg | Est. Yield: {est_yield} kg")
@@ -401,10 +418,20 @@ def request_soil_sample_flow(conn, farmer_id):
         lat, lon = coords["latitude"], coords["longitude"]
 
         labs = get_all_labs()
+        suggestions = suggest_labs(lat, lon)
+        if suggestions:
+            print("\nSuggested Labs (nearest with the shortest queue first):")
+            for lab in suggestions:
+                distance = f"{lab['distance_km']:.0f} km" if lab['distance_km'] is not None else "distance unknown"
+                print(f"{lab['lab_id']}: {lab['lab_name']} | {distance} | {lab['waiting']} samples waiting")
+
         print("\nAvailable Labs:")
         for lab in labs:
             print(f"{lab['lab_id']}: {lab['lab_name']}")
-        lab_id = int(input("Enter the Lab ID to send your soil sample to: "))
+        default_lab = suggestions[0]['lab_id'] if suggestions else None
+        prompt = "Enter the Lab ID to send your soil sample to"
+        choice = input(f"{prompt} [{default_lab}]: " if default_lab else f"{prompt}: ").strip()
+        lab_id = int(choice) if choice or not default_lab else default_lab
         if lab_id not in [lab['lab_id'] for lab in labs]:
             print("\n Invalid Lab ID. Please select from the list above.")
             return
@@ -449,10 +476,10 @@ def get_valid_nutrient(field_name):
     while True:
         try:
             value = float(input(f"{field_name}: "))
-            if 0 <= value <= 999.99:
+            if NUTRIENT_MIN <= value <= NUTRIENT_MAX:
                 return value
             else:
-                print("Invalid Input. Please enter a number between 0 and 999.99.")
+                print(f"Invalid Input. Please enter a number between {NUTRIENT_MIN} and {NUTRIENT_MAX}.")
         except ValueError:
             print("\nInvalid input. Please enter a numeric value.")
 
@@ -551,7 +578,9 @@ def lab_technician_dashboard(conn, user):
         print("1: View Assigned Soil Samples")
         print("2: Submit Soil Test Results")
         print("3: View Soil Sample Results")
-        print("4: Back to Main Menu")
+        print("4: View Flagged (Possibly Contaminated) Samples")
+        print("5: Submit Test Results From Analyzer File")
+        print("6: Back to Main Menu")
 
         choice = input("Enter your choice: ").strip()
 
@@ -562,9 +591,57 @@ def lab_technician_dashboard(conn, user):
         elif choice == "3":
             view_soil_sample_results_flow(conn, user)
         elif choice == "4":
+            view_lab_anomalies_flow(conn, user['lab_id'])
+        elif choice == "5":
+            submit_result_file_flow(conn, user)
+        elif choice == "6":
             break
         else:
-            print("Invalid input. Choose 1-4.")
+            print("Invalid input. Choose 1-6.")
+
+
+def auto_assign_samples_flow(conn):
+    print("\n-- Auto-Assign Waiting Samples --")
+    try:
+        labs = get_all_soil_labs()
+        for lab in labs:
+            print(f"{lab['lab_id']}: {lab['lab_name']}")
+        choice = input("Lab ID to schedule (leave blank for all labs): ").strip()
+        if choice:
+            lab_id = int(choice)
+            if lab_id not in {lab['lab_id'] for lab in labs}:
+                print("Invalid selection. Please choose a Lab ID from the list.")
+                return
+            summaries = [assign_lab(lab_id)]
+        else:
+            summaries = assign_all_labs()
+
+        if not any(summary['assigned'] for summary in summaries):
+            print("No unassigned waiting samples (or no technician capacity).")
+            return
+        for summary in summaries:
+            print_assignment_summary(summary)
+    except ValueError:
+        print("Invalid input. Please enter a numeric Lab ID.")
+    except Exception as e:
+        print(f"Error assigning samples: {e}")
+
+
+def view_lab_anomalies_flow(conn, lab_id):
+    print("\n-- Flagged Soil Samples --")
+    try:
+        anomalies = get_lab_anomalies(lab_id)
+        if not anomalies:
+            print("No flagged samples for your lab.")
+            return
+
+        for a in anomalies:
+            sample_name = a["sample_name"] or "Unnamed Sample"
+            print(f"  - Soil ID: {a['soil_id']} | Sample: {sample_name} | Region: {a['region_name']} | "
+                  f"Score: {a['anomaly_score']} (vs {a['flagged_by']}) | Flagged: {a['flagged_at']}")
+
+    except Exception as e:
+        print(f"Error fetching flagged samples: {e}")
 
 def view_soil_sample_results_flow(conn, user):
     print("\n-- View Soil Sample Results --")
@@ -651,16 +728,45 @@ def submit_test_results(conn, technician):
         c = float(input("Carbon (C): "))
         moisture = float(input("Moisture %: "))
 
-        submit_soil_test_results(soil_id, n, p, k, ca, mg, s, lime, c, moisture)
-        result = classify_soil_sample(soil_id)
+        classes = submit_soil_test_results_bulk([{
+            "soil_id": soil_id,
+            "nitrogen": n, "phosphorus": p, "potassium": k,
+            "calcium": ca, "magnesium": mg, "sulfur": s,
+            "lime": lime, "carbon": c, "moisture": moisture
+        }])
 
-        print(f"\nSoil sample {soil_id} classified as Fertility Class ID: {result['Fertility_Class_ID']}")
+        if soil_id not in classes:
+            print(f"Soil sample {soil_id} is no longer waiting for results.")
+            return
+
+        print(f"\nSoil sample {soil_id} classified as Fertility Class ID: {classes[soil_id]}")
         print("Test results submitted.")
 
     except Exception as e:
         print(f"Error submitting test results: {e}")
 
 
+def submit_result_file_flow(conn, technician):
+    print("\n-- Submit Test Results From Analyzer File --")
+    try:
+        lab_id = technician.get('lab_id')
+        if lab_id is None:
+            print("Lab ID not found for this technician.")
+            return
+
+        path = input("Path to the analyzer result file (CSV): ").strip()
+        if not path:
+            print("No file given.")
+            return
+
+        summary = submit_result_file(path, lab_id)
+        print_summary(summary)
+
+    except FileNotFoundError:
+        print("Result file not found.")
+    except Exception as e:
+        print(f"Error submitting result file: {e}")
+
 
 def admin_dashboard(conn, user):
     """Admin Dashboard offering multiple administrative functionalities."""
@@ -672,7 +778,10 @@ def admin_dashboard(conn, user):
         print("2: Manage Soil Test Labs")
         print("3: Update Soil Fertility Threshold Values")
         print("4: Monitor Regional Fertility Reports")
-        print("5: Back to Main Menu")
+        print("5: Export All Soil Samples (CSV)")
+        print("6: View Monthly Nutrient Trends")
+        print("7: Auto-Assign Waiting Samples to Technicians")
+        print("8: Back to Main Menu")
         choice = input("Enter your choice: ").strip()
 
         if choice == "1":
@@ -687,12 +796,21 @@ def admin_dashboard(conn, user):
             if reports:
                 export_option = input("\nDo you want to export the report to CSV? (y/n): ")
                 if export_option.lower() == 'y':
-                    export_report_to_csv(reports, f"{region_name}_regional_fertility_report.csv")
+                    export_report_to_csv(
+                        None if region_name == "All Regions" else region_name,
+                        f"{region_name}_regional_fertility_report.csv"
+                    )
 
         elif choice == "5":
+            export_samples_flow(conn)
+        elif choice == "6":
+            view_nutrient_trends_flow(conn)
+        elif choice == "7":
+            auto_assign_samples_flow(conn)
+        elif choice == "8":
                 break
         else:
-            print("Invalid choice. Please select 1-5.")
+            print("Invalid choice. Please select 1-8.")
 
 def admin_manage_users_flow(conn):
     """
@@ -759,7 +877,8 @@ def manage_soil_test_labs_flow(conn):
         print("1: View All Soil Test Labs")
         print("2: Add New Soil Test Lab")
         print("3: Remove Soil Test Lab")
-        print("4: Back to Admin Dashboard")
+        print("4: Set Lab Location (used for lab suggestions)")
+        print("5: Back to Admin Dashboard")
 
         choice = input("Enter your choice: ").strip()
 
@@ -786,9 +905,20 @@ def manage_soil_test_labs_flow(conn):
             print("Soil test lab removed successfully!")
 
         elif choice == "4":
+            try:
+                lab_id = int(input("Enter Lab ID: "))
+                latitude = float(input("Latitude: "))
+                longitude = float(input("Longitude: "))
+            except ValueError:
+                print("Invalid input.")
+                continue
+            set_lab_location(lab_id, latitude, longitude)
+            print("Lab location updated.")
+
+        elif choice == "5":
             break
         else:
-            print("Invalid choice. Please select 1 to 4.")
+            print("Invalid choice. Please select 1 to 5.")
 
 def update_soil_thresholds_flow(conn):
     print("\n-- Update Soil Fertility Thresholds --")
@@ -910,21 +1040,25 @@ def display_regional_fertility_reports(conn):
         return None, []
     
     print("\nAvailable Regions:")
+    print("0. All Regions")
     for idx, region in enumerate(regions, start=1):
         print(f"{idx}. {region['region_name']}")
 
     # Step 2: Prompt user to choose
     try:
         choice = int(input("\nSelect a region by number: "))
-        if choice < 1 or choice > len(regions):
+        if choice < 0 or choice > len(regions):
             print("Invalid selection.")
             return None, []
-        selected_region = regions[choice - 1]['region_name']
+        selected_region = regions[choice - 1]['region_name'] if choice else "All Regions"
     except ValueError:
         print("Invalid input.")
         return None, []
     
-    reports = get_regional_fertility_reports(conn, selected_region)
+    if choice == 0:
+        reports = get_all_regional_fertility_reports(conn)
+    else:
+        reports = get_regional_fertility_reports(conn, selected_region)
     
     if not reports:
         return selected_region, []
@@ -938,18 +1072,93 @@ def display_regional_fertility_reports(conn):
     for row in reports:
         print(f"{row['region_name']:<20}{row['total_samples']:<15}{row['avg_nitrogen']:<15.2f}"
               f"{row['avg_phosphorus']:<15.2f}{row['avg_potassium']:<15.2f}{row['avg_moisture']:<15.2f}")
+
+    print_region_percentiles([row['region_name'] for row in reports], combined=choice == 0)
     return selected_region, reports
 
 
-def export_report_to_csv(report_data, filename="regional_fertility_report.csv"):
+def print_region_percentiles(region_names, combined=False):
+    nutrients = ["nitrogen", "phosphorus", "potassium"]
+    try:
+        percentiles = get_percentiles("region", region_names, nutrients)
+        if combined:
+            percentiles["All Regions"] = get_percentiles("region", region_names, nutrients, combined=True)
+            region_names = region_names + ["All Regions"]
+    except Exception as e:
+        print(f"Error fetching nutrient percentiles: {e}")
+        return
+
+    print("\nNutrient Distribution (p10 / p50 / p90):")
+    print(f"{'Region':<20}" + "".join(f"{n.capitalize():<24}" for n in nutrients))
+    print("-" * 92)
+    for region_name in region_names:
+        by_nutrient = percentiles.get(region_name, {})
+        cells = []
+        for nutrient in nutrients:
+            values = by_nutrient.get(nutrient)
+            cells.append(" / ".join(f"{v:.1f}" for v in values) if values else "-")
+        print(f"{region_name:<20}" + "".join(f"{cell:<24}" for cell in cells))
+
+
+def export_report_to_csv(region_name=None, filename="regional_fertility_report.csv"):
     try:
-        with open(filename, mode='w', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=report_data[0].keys())
-            writer.writeheader()
-            writer.writerows(report_data)
-            print(f"Report exported to {filename}")
+        count = export_regions(filename, region_name)
+        print(f"Report exported to {filename} ({count} regions)")
     except Exception as e:
         print(f"Error exporting report: {e}")
+
+
+def view_nutrient_trends_flow(conn):
+    print("\n-- Monthly Nutrient Trends --")
+    regions = get_all_regions(conn)
+    if not regions:
+        print("No regions found.")
+        return
+
+    for idx, region in enumerate(regions, start=1):
+        print(f"{idx}. {region['region_name']}")
+    try:
+        choice = int(input("\nSelect a region by number: "))
+        if choice < 1 or choice > len(regions):
+            print("Invalid selection.")
+            return
+        region_name = regions[choice - 1]['region_name']
+
+        for idx, nutrient in enumerate(NUTRIENT_COLUMNS, start=1):
+            print(f"{idx}. {nutrient.capitalize()}")
+        choice = int(input("Select a nutrient by number: "))
+        if choice < 1 or choice > len(NUTRIENT_COLUMNS):
+            print("Invalid selection.")
+            return
+        nutrient = NUTRIENT_COLUMNS[choice - 1]
+    except ValueError:
+        print("Invalid input.")
+        return
+
+    try:
+        series = get_nutrient_trend("region", region_name, nutrient)
+        if not series:
+            print(f"No rollups for {region_name} yet. They are built by 'python -m reports.rollups --refresh'.")
+            return
+        print(f"\n-- {nutrient.capitalize()} by Month for {region_name} --")
+        print_trend(series, nutrient)
+    except Exception as e:
+        print(f"Error fetching nutrient trends: {e}")
+
+
+def export_samples_flow(conn):
+    print("\n-- Export All Soil Samples --")
+    filename = input("Output file (end with .gz to compress) [soil_samples.csv.gz]: ").strip()
+    filename = filename or "soil_samples.csv.gz"
+    region_name = input("Limit to one region (press Enter for all): ").strip() or None
+    try:
+        count = export_samples(
+            filename, region_name,
+            progress=lambda n, secs: print(f"  {n} samples written...")
+        )
+        print(f"Exported {count} samples to {filename}")
+    except Exception as e:
+        print(f"Error exporting samples: {e}")
         
 
 
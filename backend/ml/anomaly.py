@@ -0,0 +1,336 @@
+"""
+Streaming contamination / anomaly detection over soil nutrient vectors.
+
+Per-region and per-lab running statistics (Welford's online mean and
+co-moment matrix over the nine nutrient columns) are updated one sample at a
+time. A new sample is scored by its Mahalanobis distance from each group it
+belongs to before it is folded in, which costs the same no matter how much
+history the group has. Samples above the threshold are written to
+Soil_Anomaly.
+
+Each process also keeps the statistics of the samples it has seen since its
+last write. persist() merges that delta into the stored Nutrient_Stats rows
+under SELECT ... FOR UPDATE (Chan's parallel update), so concurrent
+processes add to each other's statistics instead of overwriting them. A
+final flush runs at interpreter exit.
+"""
+import argparse
+import atexit
+import json
+import threading
+import numpy as np
+import pymysql
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+
+# sqrt of the 99.9% chi-square quantile for 9 degrees of freedom
+SCORE_THRESHOLD = 5.28
+MIN_SAMPLES = 30
+PERSIST_EVERY = 50
+
+
+class RunningStats:
+    """Welford's online mean and covariance for fixed-length vectors."""
+
+    def __init__(self, dim=len(NUTRIENT_COLUMNS), count=0, mean=None, comoment=None):
+        self.count = count
+        self.mean = np.zeros(dim) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.comoment = np.zeros((dim, dim)) if comoment is None else np.asarray(comoment, dtype=np.float64)
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.comoment += np.outer(delta, x - self.mean)
+
+    def merge(self, other):
+        """Fold another RunningStats into this one in place and return self."""
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.comoment += other.comoment + np.outer(delta, delta) * (self.count * other.count / total)
+        self.mean += delta * (other.count / total)
+        self.count = total
+        return self
+
+    def copy(self):
+        return RunningStats(count=self.count, mean=self.mean.copy(), comoment=self.comoment.copy())
+
+    def covariance(self):
+        return self.comoment / (self.count - 1) if self.count > 1 else np.zeros_like(self.comoment)
+
+    def score(self, x):
+        """Mahalanobis distance of x from the current mean, or None if too few samples."""
+        if self.count < MIN_SAMPLES:
+            return None
+        cov = self.covariance()
+        # Ridge term keeps the solve stable when a nutrient barely varies.
+        ridge = 1e-6 * max(np.trace(cov) / len(cov), 1e-9)
+        delta = x - self.mean
+        return float(np.sqrt(delta @ np.linalg.solve(cov + ridge * np.eye(len(cov)), delta)))
+
+
+class AnomalyDetector:
+    def __init__(self, threshold=SCORE_THRESHOLD, persist_every=PERSIST_EVERY):
+        self.threshold = threshold
+        self.persist_every = persist_every
+        self.groups = {}
+        self._deltas = {}
+        self._since_persist = 0
+        self._lock = threading.Lock()
+
+    def _stats(self, key):
+        if key not in self.groups:
+            self.groups[key] = RunningStats()
+        return self.groups[key]
+
+    def _fold(self, key, x):
+        """Add x to the group and to this process's unsaved delta (caller holds the lock)."""
+        self._stats(key).update(x)
+        if key not in self._deltas:
+            self._deltas[key] = RunningStats(dim=len(x))
+        self._deltas[key].update(x)
+
+    def observe(self, lab_id, region_name, values):
+        """
+        Score one sample against its region and lab, then fold it in.
+        Returns (score, flagged_by) where flagged_by is None for normal samples.
+        """
+        x = np.asarray([float(v) for v in values], dtype=np.float64)
+        keys = [("lab", str(lab_id))]
+        if region_name is not None:
+            keys.insert(0, ("region", region_name))
+
+        with self._lock:
+            best_score, flagged_by = 0.0, None
+            for key in keys:
+                stats = self._stats(key)
+                score = stats.score(x)
+                if score is not None and score > best_score:
+                    best_score = score
+                    flagged_by = key[0] if score > self.threshold else flagged_by
+                self._fold(key, x)
+            self._since_persist += 1
+        return best_score, flagged_by
+
+    def load(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT group_type, group_key, sample_count, mean_vector, comoment_matrix "
+                "FROM Nutrient_Stats"
+            )
+            rows = cursor.fetchall()
+        with self._lock:
+            for row in rows:
+                self.groups[(row["group_type"], row["group_key"])] = RunningStats(
+                    count=row["sample_count"],
+                    mean=json.loads(row["mean_vector"]),
+                    comoment=json.loads(row["comoment_matrix"])
+                )
+
+    def persist(self, conn, force=False):
+        """
+        Merge the statistics gathered since the last write into Nutrient_Stats
+        and adopt the merged totals, which include other processes' samples.
+        """
+        with self._lock:
+            if not self._deltas or (not force and self._since_persist < self.persist_every):
+                return 0
+            deltas, self._deltas = self._deltas, {}
+            self._since_persist = 0
+        keys = list(deltas)
+        try:
+            with conn.cursor() as cursor:
+                placeholders = ", ".join(["(%s, %s)"] * len(keys))
+                cursor.execute(
+                    f"SELECT group_type, group_key, sample_count, mean_vector, comoment_matrix "
+                    f"FROM Nutrient_Stats WHERE (group_type, group_key) IN ({placeholders}) FOR UPDATE",
+                    [value for key in keys for value in key]
+                )
+                merged = {
+                    (row["group_type"], row["group_key"]): RunningStats(
+                        count=row["sample_count"],
+                        mean=json.loads(row["mean_vector"]),
+                        comoment=json.loads(row["comoment_matrix"])
+                    )
+                    for row in cursor.fetchall()
+                }
+                for key, delta in deltas.items():
+                    merged[key] = merged[key].merge(delta) if key in merged else delta.copy()
+                cursor.executemany(
+                    "INSERT INTO Nutrient_Stats "
+                    "(group_type, group_key, sample_count, mean_vector, comoment_matrix) "
+                    "VALUES (%s, %s, %s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE sample_count = VALUES(sample_count), "
+                    "mean_vector = VALUES(mean_vector), comoment_matrix = VALUES(comoment_matrix)",
+                    [(key[0], key[1], stats.count, json.dumps(stats.mean.tolist()),
+                      json.dumps(stats.comoment.tolist()))
+                     for key, stats in merged.items()]
+                )
+            conn.commit()
+        except Exception:
+            # Keep the delta for the next attempt; the pool rolls the connection back.
+            with self._lock:
+                for key, delta in deltas.items():
+                    if key in self._deltas:
+                        delta.merge(self._deltas[key])
+                    self._deltas[key] = delta
+            raise
+
+        with self._lock:
+            for key, stats in merged.items():
+                # Samples observed while this write was in flight stay in their delta.
+                pending = self._deltas.get(key)
+                self.groups[key] = stats.copy().merge(pending) if pending else stats
+        return len(merged)
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            detector = AnomalyDetector()
+            conn = get_connection()
+            try:
+                detector.load(conn)
+            finally:
+                conn.close()
+            _detector = detector
+        return _detector
+
+
+def flush_detector():
+    """Write any statistics not yet persisted (registered with atexit)."""
+    detector = _detector
+    if detector is None:
+        return 0
+    conn = get_connection()
+    try:
+        return detector.persist(conn, force=True)
+    except Exception as e:
+        print(f"Error saving nutrient statistics: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def observe_soil_sample(soil_id, values):
+    """
+    Feed a freshly tested sample to the detector and record it in
+    Soil_Anomaly if it is flagged. `values` are the nine nutrients in
+    NUTRIENT_COLUMNS order. Returns the anomaly score.
+    """
+    return observe_soil_samples([(soil_id, values)]).get(soil_id)
+
+
+def observe_soil_samples(samples):
+    """
+    Batch form of observe_soil_sample for (soil_id, values) pairs: one lookup
+    query, one commit. Returns {soil_id: score}.
+    """
+    samples = [(soil_id, values) for soil_id, values in samples
+               if not any(v is None for v in values)]
+    if not samples:
+        return {}
+    detector = get_detector()
+    conn = get_connection()
+    try:
+        placeholders = ", ".join(["%s"] * len(samples))
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT ss.soil_id, ss.lab_id, fl.region_name FROM Soil_Sample ss "
+                f"LEFT JOIN Farm_Location fl "
+                f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+                f"WHERE ss.soil_id IN ({placeholders})",
+                [soil_id for soil_id, _ in samples]
+            )
+            locations = {row["soil_id"]: row for row in cursor.fetchall()}
+
+        scores = {}
+        flagged = []
+        for soil_id, values in samples:
+            row = locations.get(soil_id)
+            if not row:
+                continue
+            score, flagged_by = detector.observe(row["lab_id"], row["region_name"], values)
+            scores[soil_id] = score
+            if flagged_by:
+                flagged.append([soil_id, row["lab_id"], row["region_name"], round(score, 3), flagged_by])
+
+        if flagged:
+            with conn.cursor() as cursor:
+                for args in flagged:
+                    cursor.callproc("sp_flag_soil_anomaly", args)
+            conn.commit()
+        detector.persist(conn)
+        return scores
+    finally:
+        conn.close()
+
+
+atexit.register(flush_detector)
+
+
+def rebuild_statistics(chunk_size=10000):
+    """
+    Recompute every group's statistics from the tested samples already in
+    the database (streamed through an SSCursor) and replace Nutrient_Stats.
+    Historical samples are folded in without being flagged.
+    """
+    global _detector
+    detector = AnomalyDetector()
+    read_conn = get_connection()
+    try:
+        with read_conn.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(
+                f"SELECT ss.lab_id, fl.region_name, "
+                f"{', '.join('ss.' + col for col in NUTRIENT_COLUMNS)} "
+                f"FROM Soil_Sample ss "
+                f"LEFT JOIN Farm_Location fl "
+                f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+                f"WHERE ss.sample_status = 'tested' AND "
+                + " AND ".join(f"ss.{col} IS NOT NULL" for col in NUTRIENT_COLUMNS)
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for lab_id, region_name, *values in rows:
+                    x = np.asarray(values, dtype=np.float64)
+                    detector._fold(("lab", str(lab_id)), x)
+                    if region_name is not None:
+                        detector._fold(("region", region_name), x)
+    finally:
+        read_conn.close()
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM Nutrient_Stats")
+        detector.persist(conn, force=True)
+        conn.commit()
+    finally:
+        conn.close()
+
+    with _detector_lock:
+        _detector = detector
+    return len(detector.groups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soil contamination / anomaly detector")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute region and lab statistics from all tested samples")
+    args = parser.parse_args()
+    if args.rebuild:
+        groups = rebuild_statistics()
+        print(f"Rebuilt nutrient statistics for {groups} region/lab groups.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Versioned model artifacts on disk.
+
+Each trained model is stored as MODEL_DIR/<name>/v<N>/model.pkl next to a
+metadata.json that records the feature columns, classes and metrics it was
+trained with. Versions are never overwritten; loading without a version
+picks the newest one.
+"""
+import json
+import os
+import pickle
+from datetime import datetime
+
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "models"))
+
+
+def list_versions(name, model_dir=MODEL_DIR):
+    path = os.path.join(model_dir, name)
+    if not os.path.isdir(path):
+        return []
+    versions = []
+    for entry in os.listdir(path):
+        if entry.startswith("v") and entry[1:].isdigit():
+            versions.append(int(entry[1:]))
+    return sorted(versions)
+
+
+def save_artifact(name, model, metadata, model_dir=MODEL_DIR):
+    """Write the model as the next version of `name` and return that version."""
+    versions = list_versions(name, model_dir)
+    version = versions[-1] + 1 if versions else 1
+    path = os.path.join(model_dir, name, f"v{version}")
+    os.makedirs(path)
+
+    with open(os.path.join(path, "model.pkl"), "wb") as file:
+        pickle.dump(model, file)
+
+    metadata = dict(metadata, name=name, version=version,
+                    saved_at=datetime.now().isoformat(timespec="seconds"))
+    with open(os.path.join(path, "metadata.json"), "w") as file:
+        json.dump(metadata, file, indent=2, default=str)
+    return version
+
+
+def load_artifact(name, version=None, model_dir=MODEL_DIR):
+    """Return (model, metadata) for `version`, or the newest version if None."""
+    if version is None:
+        versions = list_versions(name, model_dir)
+        if not versions:
+            raise FileNotFoundError(f"No trained '{name}' model found in {model_dir}")
+        version = versions[-1]
+    path = os.path.join(model_dir, name, f"v{version}")
+
+    with open(os.path.join(path, "metadata.json")) as file:
+        metadata = json.load(file)
+    with open(os.path.join(path, "model.pkl"), "rb") as file:
+        model = pickle.load(file)
+    return model, metadata
@@ -0,0 +1,182 @@
+"""
+Resident soil classifier with micro-batching.
+
+The newest trained model is loaded once and kept in memory. Concurrent
+classify() calls are queued and a single worker thread drains the queue in
+batches (bounded by size and by how long the first request may wait), so a
+burst of requests costs one vectorized predict per batch.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from fertility.decision_table import get_decision_table
+from ml.soil_classifier import load_classifier
+
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH", "64"))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+LATENCY_WINDOW = 10000
+
+# "rules" keeps the Fertility_Class decision table as the classifier of
+# record; "model" routes classification through the trained model.
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "rules")
+
+
+class InferenceService:
+    def __init__(self, model=None, metadata=None, version=None,
+                 max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        if model is None:
+            model, metadata = load_classifier(version)
+        self.model = model
+        self.metadata = metadata or {}
+        self.feature_columns = self.metadata.get("feature_columns", model.feature_columns)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._worker = None
+        self._running = False
+        self._submit_lock = threading.Lock()
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._worker = threading.Thread(target=self._run, name="soil-inference", daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        with self._submit_lock:
+            if not self._running:
+                return
+            self._running = False
+            self._queue.put(None)
+        self._worker.join()
+        # Requests queued behind the sentinel would otherwise wait forever.
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("Inference service stopped"))
+
+    def submit(self, sample):
+        """Queue one sample (a dict of nutrient values) and return a Future of its class ID."""
+        row = [float(sample[col]) for col in self.feature_columns]
+        future = Future()
+        with self._submit_lock:
+            if not self._running:
+                raise RuntimeError("Inference service is not running")
+            self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def classify(self, sample, timeout=None):
+        return self.submit(sample).result(timeout)
+
+    def classify_many(self, samples, timeout=None):
+        futures = [self.submit(sample) for sample in samples]
+        return [future.result(timeout) for future in futures]
+
+    def _run(self):
+        # Everything queued before the stop sentinel is still predicted.
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._predict(batch)
+
+    def _predict(self, batch):
+        try:
+            predictions = self.model.predict(np.array([row for row, _, _ in batch], dtype=np.float64))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        with self._stats_lock:
+            self._requests += len(batch)
+            self._batches += 1
+            for (_, _, queued_at) in batch:
+                self._latencies.append(finished - queued_at)
+        for (_, future, _), predicted in zip(batch, predictions):
+            future.set_result(int(predicted))
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = np.array(self._latencies) * 1000.0
+            requests, batches = self._requests, self._batches
+        return {
+            "model_version": self.metadata.get("version"),
+            "requests": requests,
+            "batches": batches,
+            "avg_batch_size": requests / batches if batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def start_inference_service(version=None):
+    """Load the model (newest version by default) and start the shared service."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = InferenceService(version=version).start()
+        return _service
+
+
+def get_inference_service():
+    return _service
+
+
+def stop_inference_service():
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.stop()
+            _service = None
+
+
+def active_model_service():
+    """The running service when CLASSIFIER_BACKEND is "model", else None."""
+    service = _service
+    return service if CLASSIFIER_BACKEND == "model" and service is not None else None
+
+
+def predict_fertility_class(nutrients):
+    """
+    Classify one sample with the resident model when CLASSIFIER_BACKEND is
+    "model" and the service is running, otherwise with the decision table.
+    """
+    service = active_model_service()
+    if service is not None:
+        return service.classify(nutrients)
+    return get_decision_table().classify_one(**nutrients)
@@ -0,0 +1,166 @@
+"""
+Soil fertility classifier trained incrementally from Soil_Sample.
+
+Labelled rows are streamed with an unbuffered server-side cursor and fed to
+a partial_fit learner one chunk at a time, so memory use depends on the
+chunk size rather than the table size. Every fifth sample (by soil_id) is
+held out and scored in a second streaming pass.
+"""
+import argparse
+import time
+import numpy as np
+import pymysql
+from sklearn.linear_model import PassiveAggressiveClassifier, SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import StandardScaler
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+from ml.artifacts import load_artifact, save_artifact
+
+MODEL_NAME = "soil_classifier"
+HOLDOUT_MODULUS = 5
+
+LEARNERS = {
+    "sgd": lambda: SGDClassifier(loss="log_loss", random_state=42),
+    "passive_aggressive": lambda: PassiveAggressiveClassifier(random_state=42),
+    "naive_bayes": GaussianNB,
+}
+
+
+class SoilClassifier:
+    """Running feature scaler plus a partial_fit learner."""
+
+    def __init__(self, learner="sgd", feature_columns=NUTRIENT_COLUMNS):
+        self.learner = learner
+        self.feature_columns = list(feature_columns)
+        self.scaler = StandardScaler()
+        self.model = LEARNERS[learner]()
+
+    def partial_fit(self, X, y, classes):
+        self.scaler.partial_fit(X)
+        self.model.partial_fit(self.scaler.transform(X), y, classes=classes)
+
+    def predict(self, X):
+        return self.model.predict(self.scaler.transform(X))
+
+    @property
+    def classes_(self):
+        return self.model.classes_
+
+
+def fetch_class_ids(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT fertility_class_id FROM Fertility_Class ORDER BY fertility_class_id")
+        return np.array([row["fertility_class_id"] for row in cursor.fetchall()], dtype=np.int64)
+
+
+def stream_labelled_samples(conn, feature_columns, holdout, chunk_size=10000):
+    """
+    Yield (X, y) chunks of tested, classified samples through an SSCursor.
+    `holdout` selects the evaluation split (True) or the training split (False).
+    """
+    not_null = " AND ".join(f"{col} IS NOT NULL" for col in feature_columns)
+    split = "=" if holdout else "<>"
+    sql = (
+        f"SELECT {', '.join(feature_columns)}, fertility_class_id FROM Soil_Sample "
+        f"WHERE sample_status = 'tested' AND fertility_class_id IS NOT NULL "
+        f"AND {not_null} AND MOD(soil_id, %s) {split} 0"
+    )
+    with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+        cursor.execute(sql, (HOLDOUT_MODULUS,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            block = np.array(rows, dtype=np.float64)
+            yield block[:, :-1], block[:, -1].astype(np.int64)
+
+
+def evaluate(classifier, chunks, classes):
+    """Accumulate a confusion matrix chunk by chunk and derive the metrics from it."""
+    index = {int(c): i for i, c in enumerate(classes)}
+    confusion = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    for X, y in chunks:
+        predicted = classifier.predict(X)
+        np.add.at(confusion, ([index[int(v)] for v in y], [index[int(v)] for v in predicted]), 1)
+
+    total = confusion.sum()
+    true_positive = np.diag(confusion)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.nan_to_num(true_positive / confusion.sum(axis=0))
+        recall = np.nan_to_num(true_positive / confusion.sum(axis=1))
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    return {
+        "samples": int(total),
+        "accuracy": float(true_positive.sum() / total) if total else None,
+        "macro_f1": float(f1.mean()) if total else None,
+        "confusion_matrix": confusion.tolist(),
+    }
+
+
+def train(learner="sgd", epochs=1, chunk_size=10000, feature_columns=NUTRIENT_COLUMNS, progress=None):
+    """Train, evaluate and save a new model version. Returns (version, metadata)."""
+    started = time.time()
+    classifier = SoilClassifier(learner, feature_columns)
+    trained_rows = 0
+
+    conn = get_connection()
+    try:
+        classes = fetch_class_ids(conn)
+        for epoch in range(epochs):
+            for X, y in stream_labelled_samples(conn, classifier.feature_columns, False, chunk_size):
+                classifier.partial_fit(X, y, classes)
+                trained_rows += len(y)
+                if progress:
+                    progress(epoch + 1, trained_rows)
+        if trained_rows == 0:
+            raise ValueError("No labelled soil samples available for training.")
+
+        metrics = evaluate(
+            classifier,
+            stream_labelled_samples(conn, classifier.feature_columns, True, chunk_size),
+            classes
+        )
+    finally:
+        conn.close()
+
+    metadata = {
+        "learner": learner,
+        "feature_columns": classifier.feature_columns,
+        "classes": classes.tolist(),
+        "epochs": epochs,
+        "trained_rows": trained_rows // epochs,
+        "holdout": f"soil_id % {HOLDOUT_MODULUS} == 0",
+        "metrics": metrics,
+        "training_seconds": round(time.time() - started, 2),
+    }
+    version = save_artifact(MODEL_NAME, classifier, metadata)
+    return version, metadata
+
+
+def load_classifier(version=None):
+    return load_artifact(MODEL_NAME, version)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the soil fertility classifier")
+    parser.add_argument("--learner", choices=sorted(LEARNERS), default="sgd")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    version, metadata = train(
+        args.learner, args.epochs, args.chunk_size,
+        progress=lambda epoch, rows: print(f"  epoch {epoch}: {rows} rows streamed")
+    )
+    metrics = metadata["metrics"]
+    print(f"Saved {MODEL_NAME} v{version} ({metadata['trained_rows']} training rows)")
+    if metrics["samples"]:
+        print(f"Hold-out accuracy: {metrics['accuracy']:.3f} | macro F1: {metrics['macro_f1']:.3f} "
+              f"on {metrics['samples']} samples")
+    else:
+        print("No hold-out samples were available for evaluation.")
+
+
+if __name__ == "__main__":
+    main()
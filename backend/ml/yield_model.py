@@ -0,0 +1,294 @@
+"""
+Crop yield prediction trained on Crop_Growth history.
+
+Each growth record is joined with the farmer's tested Soil_Sample nearest in
+time to its start date: that sample's nine nutrients and fertility class.
+The features also include the crop and the season the crop was planted in.
+Features are assembled for a whole batch at once: one query for the growth
+rows, one for the farmers' samples, and a searchsorted over (farmer, day)
+keys to pick each record's nearest sample. Harvested records with a yield
+are the training set, and every fifth record (by growth_id) is held out.
+
+Predictions are cached per (growth_id, model version) for PREDICTION_TTL
+seconds. The newest model on disk is picked up within
+MODEL_CHECK_INTERVAL seconds, and entries from older versions are dropped
+then. Until a model has been trained, estimates fall back to
+fn_calculate_yield_estimate.
+
+    python -m ml.yield_model
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+from ml.artifacts import list_versions, load_artifact, save_artifact
+
+MODEL_NAME = "yield_model"
+HOLDOUT_MODULUS = 5
+PREDICTION_TTL = 600.0
+MODEL_CHECK_INTERVAL = 30.0
+MAX_CACHED_PREDICTIONS = 100000
+
+# crop_id and fertility_class_id are categorical; NaN marks a missing sample.
+FEATURE_COLUMNS = (["crop_id", "fertility_class_id"] + list(NUTRIENT_COLUMNS)
+                   + ["sample_age_days", "season_sin", "season_cos"])
+CATEGORICAL = [True, True] + [False] * (len(FEATURE_COLUMNS) - 2)
+
+GROWTH_SQL = (
+    "SELECT growth_id, farmer_id, crop_id, start_date, yield_quantity, status "
+    "FROM Crop_Growth"
+)
+
+
+def _days(values):
+    return np.array(values, dtype="datetime64[D]").astype(np.int64)
+
+
+def fetch_growth(conn, growth_ids=None, training=False):
+    sql, params = GROWTH_SQL, ()
+    if training:
+        sql += " WHERE status = 'Harvested' AND yield_quantity IS NOT NULL"
+    elif growth_ids is not None:
+        sql += f" WHERE growth_id IN ({', '.join(['%s'] * len(growth_ids))})"
+        params = tuple(growth_ids)
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def fetch_samples(conn, farmer_ids):
+    """Tested samples of the given farmers, sorted by (farmer_id, test_date)."""
+    if not farmer_ids:
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT farmer_id, test_date, fertility_class_id, {', '.join(NUTRIENT_COLUMNS)} "
+            f"FROM Soil_Sample WHERE sample_status = 'tested' "
+            f"AND farmer_id IN ({', '.join(['%s'] * len(farmer_ids))}) "
+            f"ORDER BY farmer_id, test_date",
+            tuple(farmer_ids)
+        )
+        return cursor.fetchall()
+
+
+def assemble_features(growth, samples):
+    """
+    Feature matrix for `growth` rows (dicts with farmer_id, crop_id,
+    start_date) from `samples` sorted by (farmer_id, test_date).
+    """
+    n = len(growth)
+    X = np.full((n, len(FEATURE_COLUMNS)), np.nan)
+    if not n:
+        return X
+    g_farmer = np.array([row["farmer_id"] for row in growth], dtype=np.int64)
+    start = np.array([row["start_date"] for row in growth], dtype="datetime64[D]")
+    g_day = start.astype(np.int64)
+    X[:, 0] = [row["crop_id"] for row in growth]
+    season = (start - start.astype("datetime64[Y]").astype("datetime64[D]")).astype(np.int64) / 365.25
+    X[:, -2] = np.sin(2 * np.pi * season)
+    X[:, -1] = np.cos(2 * np.pi * season)
+    if not samples:
+        return X
+
+    s_farmer = np.array([row["farmer_id"] for row in samples], dtype=np.int64)
+    s_day = _days([row["test_date"] for row in samples])
+    values = np.array([[np.nan if row[col] is None else float(row[col]) for col in NUTRIENT_COLUMNS]
+                       for row in samples])
+    classes = np.array([np.nan if row["fertility_class_id"] is None else row["fertility_class_id"]
+                        for row in samples], dtype=np.float64)
+
+    # Nearest sample of the same farmer: look at both neighbours of the
+    # insertion point in the (farmer, day) ordering.
+    span = int(max(s_day.max(), g_day.max()) - min(s_day.min(), g_day.min())) + 1
+    base = min(s_day.min(), g_day.min())
+    s_key = s_farmer * span + (s_day - base)
+    g_key = g_farmer * span + (g_day - base)
+    pos = np.searchsorted(s_key, g_key)
+    left = np.clip(pos - 1, 0, len(samples) - 1)
+    right = np.clip(pos, 0, len(samples) - 1)
+    left_ok = (pos > 0) & (s_farmer[left] == g_farmer)
+    right_ok = (pos < len(samples)) & (s_farmer[right] == g_farmer)
+    left_gap = np.where(left_ok, np.abs(g_day - s_day[left]), np.iinfo(np.int64).max)
+    right_gap = np.where(right_ok, np.abs(s_day[right] - g_day), np.iinfo(np.int64).max)
+    nearest = np.where(right_gap < left_gap, right, left)
+    found = left_ok | right_ok
+
+    X[found, 1] = classes[nearest[found]]
+    X[found, 2:2 + len(NUTRIENT_COLUMNS)] = values[nearest[found]]
+    X[found, -3] = np.minimum(left_gap, right_gap)[found]
+    return X
+
+
+def load_features(conn, growth_ids=None, training=False):
+    """Return (growth rows, X) for the requested records in two queries."""
+    growth = fetch_growth(conn, growth_ids, training)
+    samples = fetch_samples(conn, sorted({row["farmer_id"] for row in growth}))
+    return growth, assemble_features(growth, samples)
+
+
+def train(max_iter=200, learning_rate=0.1):
+    """Fit, evaluate and save a new model version. Returns (version, metadata)."""
+    started = time.time()
+    conn = get_connection()
+    try:
+        growth, X = load_features(conn, training=True)
+    finally:
+        conn.close()
+    if not growth:
+        raise ValueError("No harvested crop growth records with a yield available for training.")
+
+    y = np.array([float(row["yield_quantity"]) for row in growth])
+    holdout = np.array([row["growth_id"] % HOLDOUT_MODULUS == 0 for row in growth])
+    model = HistGradientBoostingRegressor(
+        max_iter=max_iter, learning_rate=learning_rate,
+        categorical_features=CATEGORICAL, random_state=42
+    )
+    model.fit(X[~holdout], y[~holdout])
+
+    metrics = {"samples": int(holdout.sum())}
+    if holdout.any():
+        predicted = model.predict(X[holdout])
+        residual = y[holdout] - predicted
+        total = ((y[holdout] - y[holdout].mean()) ** 2).sum()
+        metrics.update(
+            mae=float(np.abs(residual).mean()),
+            r2=float(1 - (residual ** 2).sum() / total) if total else None,
+        )
+
+    metadata = {
+        "feature_columns": FEATURE_COLUMNS,
+        "trained_rows": int((~holdout).sum()),
+        "holdout": f"growth_id % {HOLDOUT_MODULUS} == 0",
+        "metrics": metrics,
+        "training_seconds": round(time.time() - started, 2),
+    }
+    version = save_artifact(MODEL_NAME, model, metadata)
+    return version, metadata
+
+
+class YieldPredictor:
+    def __init__(self, model, version):
+        self.model = model
+        self.version = version
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def predict_rows(self, growth, X):
+        if not growth:
+            return {}
+        predicted = np.maximum(self.model.predict(X), 0.0)
+        now = time.monotonic()
+        result = {row["growth_id"]: round(float(value), 2) for row, value in zip(growth, predicted)}
+        with self._lock:
+            if len(self._cache) + len(result) > MAX_CACHED_PREDICTIONS:
+                self._cache.clear()
+            for growth_id, value in result.items():
+                self._cache[growth_id] = (value, now)
+        return result
+
+    def estimates(self, growth_ids):
+        """{growth_id: estimate}; uncached records are predicted in one batch."""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for growth_id in growth_ids:
+                entry = self._cache.get(growth_id)
+                if entry and now - entry[1] < PREDICTION_TTL:
+                    found[growth_id] = entry[0]
+                else:
+                    missing.append(growth_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            conn = get_connection()
+            try:
+                growth, X = load_features(conn, missing)
+            finally:
+                conn.close()
+            found.update(self.predict_rows(growth, X))
+        return found
+
+    def forget(self, growth_id=None):
+        with self._lock:
+            if growth_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(growth_id, None)
+
+
+_predictor = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_yield_predictor():
+    """
+    The predictor for the newest model on disk, or None if none has been
+    trained. The model directory is checked every MODEL_CHECK_INTERVAL seconds.
+    """
+    global _predictor, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _checked_at == 0.0 or now - _checked_at >= MODEL_CHECK_INTERVAL:
+            versions = list_versions(MODEL_NAME)
+            if versions and (_predictor is None or _predictor.version != versions[-1]):
+                model, metadata = load_artifact(MODEL_NAME, versions[-1])
+                _predictor = YieldPredictor(model, metadata["version"])
+            _checked_at = now
+        return _predictor
+
+
+def predict_yields(growth_ids):
+    """{growth_id: estimate} from the model, or None if no model is trained."""
+    predictor = get_yield_predictor()
+    if predictor is None:
+        return None
+    return predictor.estimates(growth_ids)
+
+
+def attach_yield_estimates(rows):
+    """
+    Replace estimated_yield on Crop_Growth rows (which carry farmer_id,
+    crop_id and start_date) with model predictions, in one batch.
+    """
+    predictor = get_yield_predictor()
+    if predictor is None or not rows:
+        return rows
+    estimates = predictor.estimates([row["growth_id"] for row in rows])
+    for row in rows:
+        if row["growth_id"] in estimates:
+            row["estimated_yield"] = estimates[row["growth_id"]]
+    return rows
+
+
+def growth_changed(growth_id):
+    """Drop a record's cached estimate after it is updated or deleted."""
+    with _lock:
+        predictor = _predictor
+    if predictor is not None:
+        predictor.forget(growth_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the crop yield model")
+    parser.add_argument("--max-iter", type=int, default=200)
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    version, metadata = train(args.max_iter, args.learning_rate)
+    metrics = metadata["metrics"]
+    print(f"Saved {MODEL_NAME} v{version} ({metadata['trained_rows']} training rows)")
+    if metrics.get("mae") is not None:
+        r2 = f"{metrics['r2']:.3f}" if metrics["r2"] is not None else "n/a"
+        print(f"Hold-out MAE: {metrics['mae']:.2f} kg | R²: {r2} on {metrics['samples']} records")
+    else:
+        print("No hold-out records were available for evaluation.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+In-memory index of the recommendation reference data.
+
+Fertility_Class, Crop, Fertilizer and Crop_Fertilizer are small and rarely
+change. They are loaded once into dict indexes (class -> crops,
+crop -> fertilizers), so crop and fertilizer recommendations are answered
+without touching MySQL.
+
+Writes to those tables bump their Data_Version rows, through
+sp_set_fertility_thresholds and the reference-data triggers. Those rows are
+checked at most every VERSION_CHECK_INTERVAL seconds and the index reloads
+when any of them moved.
+
+Each farmer's latest classified sample is cached here as well, for
+LATEST_SAMPLE_TTL seconds. Results submitted through this process clear it
+immediately, and a fetch that overlapped such a clear is not cached.
+"""
+import threading
+import time
+from db.connection import get_connection
+
+REFERENCE_TABLES = ("Fertility_Class", "Crop", "Fertilizer", "Crop_Fertilizer")
+VERSION_CHECK_INTERVAL = 5.0
+LATEST_SAMPLE_TTL = 30.0
+
+
+class ReferenceIndex:
+    def __init__(self, classes, crops, fertilizers, links, version):
+        self.version = version
+        self.classes = {row["fertility_class_id"]: row for row in classes}
+        self.crops = {row["crop_id"]: row for row in crops}
+        self.fertilizers = {row["fertilizer_id"]: row for row in fertilizers}
+
+        self.crops_by_class = {}
+        for crop in crops:
+            self.crops_by_class.setdefault(crop["fertility_class_id"], []).append(crop)
+        self.fertilizers_by_crop = {}
+        for link in links:
+            fertilizer = self.fertilizers.get(link["fertilizer_id"])
+            if fertilizer is not None:
+                self.fertilizers_by_crop.setdefault(link["crop_id"], []).append(fertilizer)
+
+    def crops_for_class(self, fertility_class_id):
+        return [dict(crop) for crop in self.crops_by_class.get(fertility_class_id, [])]
+
+    def fertilizers_for_crop(self, crop_id):
+        return [dict(fertilizer) for fertilizer in self.fertilizers_by_crop.get(crop_id, [])]
+
+
+def fetch_version(conn):
+    placeholders = ", ".join(["%s"] * len(REFERENCE_TABLES))
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT table_name, version FROM Data_Version WHERE table_name IN ({placeholders})",
+            REFERENCE_TABLES
+        )
+        versions = {row["table_name"]: row["version"] for row in cursor.fetchall()}
+    return tuple(versions.get(table, 0) for table in REFERENCE_TABLES)
+
+
+def load_reference_index(conn):
+    version = fetch_version(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM Fertility_Class ORDER BY fertility_class_id")
+        classes = cursor.fetchall()
+        cursor.execute("SELECT * FROM Crop ORDER BY crop_id")
+        crops = cursor.fetchall()
+        cursor.execute("SELECT * FROM Fertilizer ORDER BY fertilizer_id")
+        fertilizers = cursor.fetchall()
+        cursor.execute("SELECT crop_id, fertilizer_id FROM Crop_Fertilizer ORDER BY crop_id, fertilizer_id")
+        links = cursor.fetchall()
+    return ReferenceIndex(classes, crops, fertilizers, links, version)
+
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_reference_index():
+    global _index, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _index is None or now - _checked_at >= VERSION_CHECK_INTERVAL:
+            conn = get_connection()
+            try:
+                if _index is None or fetch_version(conn) != _index.version:
+                    _index = load_reference_index(conn)
+            finally:
+                conn.close()
+            _checked_at = now
+        return _index
+
+
+def invalidate_reference_index():
+    global _index
+    with _lock:
+        _index = None
+
+
+def recommend_crops(fertility_class_id):
+    return get_reference_index().crops_for_class(fertility_class_id)
+
+
+def recommend_fertilizers(crop_id):
+    return get_reference_index().fertilizers_for_crop(crop_id)
+
+
+_latest = {}
+_latest_generations = {}
+_latest_lock = threading.Lock()
+
+
+def _latest_generation(farmer_id):
+    # None counts invalidations of every farmer.
+    return (_latest_generations.get(None, 0), _latest_generations.get(farmer_id, 0))
+
+
+def cached_latest_sample(farmer_id, fetch):
+    """
+    The farmer's latest classified sample, calling fetch(farmer_id) at most
+    once per LATEST_SAMPLE_TTL seconds.
+    """
+    now = time.monotonic()
+    with _latest_lock:
+        entry = _latest.get(farmer_id)
+        if entry and now - entry[1] < LATEST_SAMPLE_TTL:
+            return dict(entry[0]) if entry[0] else entry[0]
+        generation = _latest_generation(farmer_id)
+    sample = fetch(farmer_id)
+    with _latest_lock:
+        # Invalidated while fetching: the sample may predate the new results.
+        if _latest_generation(farmer_id) == generation:
+            _latest[farmer_id] = (sample, now)
+    return dict(sample) if sample else sample
+
+
+def invalidate_latest_samples(farmer_id=None):
+    with _latest_lock:
+        _latest_generations[farmer_id] = _latest_generations.get(farmer_id, 0) + 1
+        if farmer_id is None:
+            _latest.clear()
+        else:
+            _latest.pop(farmer_id, None)
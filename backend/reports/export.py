@@ -0,0 +1,131 @@
+"""
+Streaming CSV export of fertility reports and raw soil samples.
+
+Rows come from an unbuffered server-side cursor and are written as they
+arrive, so memory stays flat whether the export has ten rows or millions.
+A .gz filename (or --gzip) compresses the output on the fly.
+
+    python -m reports.export regions all_regions.csv
+    python -m reports.export samples samples_2024.csv.gz --region "North Region"
+"""
+import argparse
+import csv
+import gzip
+import time
+import pymysql
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+
+FETCH_SIZE = 5000
+
+SAMPLE_COLUMNS = [
+    "soil_id", "sample_name", "farmer_id", "lab_id", "region_name",
+    "farm_latitude", "farm_longitude", *NUTRIENT_COLUMNS,
+    "fertility_class_id", "class_name", "sample_status", "test_date",
+]
+
+
+def stream_rows(query, params=None, fetch_size=FETCH_SIZE):
+    """Yield result rows as dicts from an unbuffered cursor."""
+    conn = get_connection()
+    try:
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield from rows
+    finally:
+        conn.close()
+
+
+def region_report_rows(region_name=None):
+    averages = ", ".join(
+        f"{col}_sum / NULLIF({col}_count, 0) AS avg_{col}" for col in NUTRIENT_COLUMNS
+    )
+    query = (
+        f"SELECT region_name, sample_count AS total_samples, {averages} "
+        f"FROM Region_Fertility_Summary WHERE sample_count > 0"
+    )
+    if region_name:
+        return stream_rows(query + " AND region_name = %s ORDER BY region_name", (region_name,))
+    return stream_rows(query + " ORDER BY region_name")
+
+
+def sample_rows(region_name=None, tested_only=False):
+    conditions = []
+    params = []
+    if region_name:
+        conditions.append("fl.region_name = %s")
+        params.append(region_name)
+    if tested_only:
+        conditions.append("ss.sample_status = 'tested'")
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    return stream_rows(
+        f"SELECT ss.soil_id, ss.sample_name, ss.farmer_id, ss.lab_id, fl.region_name, "
+        f"ss.farm_latitude, ss.farm_longitude, "
+        f"{', '.join('ss.' + col for col in NUTRIENT_COLUMNS)}, "
+        f"ss.fertility_class_id, fc.class_name, ss.sample_status, ss.test_date "
+        f"FROM Soil_Sample ss "
+        f"JOIN Farm_Location fl "
+        f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+        f"LEFT JOIN Fertility_Class fc ON ss.fertility_class_id = fc.fertility_class_id "
+        f"{where}ORDER BY ss.soil_id",
+        params
+    )
+
+
+def write_csv(rows, path, fieldnames, compress=None, progress=None, progress_every=100000):
+    """
+    Write an iterable of dicts to `path`. Compresses when `compress` is True
+    or, if it is None, when the path ends in .gz. Returns the row count.
+    """
+    if compress is None:
+        compress = path.endswith(".gz")
+    opener = gzip.open if compress else open
+    started = time.perf_counter()
+    count = 0
+    with opener(path, "wt", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if progress and count % progress_every == 0:
+                progress(count, time.perf_counter() - started)
+    return count
+
+
+def export_regions(path, region_name=None, compress=None):
+    fieldnames = ["region_name", "total_samples"] + [f"avg_{col}" for col in NUTRIENT_COLUMNS]
+    return write_csv(region_report_rows(region_name), path, fieldnames, compress)
+
+
+def export_samples(path, region_name=None, tested_only=False, compress=None, progress=None):
+    return write_csv(sample_rows(region_name, tested_only), path, SAMPLE_COLUMNS, compress, progress)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream fertility reports or raw samples to CSV")
+    parser.add_argument("kind", choices=["regions", "samples"])
+    parser.add_argument("path")
+    parser.add_argument("--region", help="limit the export to one region")
+    parser.add_argument("--tested-only", action="store_true", help="samples: skip samples still waiting")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output even without a .gz suffix")
+    args = parser.parse_args()
+
+    compress = True if args.gzip else None
+    started = time.perf_counter()
+    if args.kind == "regions":
+        count = export_regions(args.path, args.region, compress)
+    else:
+        count = export_samples(
+            args.path, args.region, args.tested_only, compress,
+            progress=lambda n, secs: print(f"  {n} rows ({n / secs:.0f} rows/sec)")
+        )
+    print(f"Exported {count} rows to {args.path} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
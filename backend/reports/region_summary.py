@@ -0,0 +1,105 @@
+"""
+Consistency check and rebuild for Region_Fertility_Summary.
+
+The summary holds per-region sample counts plus a count and sum for every
+nutrient, kept current by the Soil_Sample triggers, so regional reports read
+one row per region instead of scanning Soil_Sample. Changes the triggers
+cannot see (rows removed by ON DELETE CASCADE, farms moved to another
+region) are caught by --check and repaired by --rebuild.
+
+    python -m reports.region_summary --check
+    python -m reports.region_summary --rebuild
+"""
+import argparse
+from decimal import Decimal
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+
+SUMMARY_COLUMNS = ["sample_count"] + [
+    f"{col}_{stat}" for col in NUTRIENT_COLUMNS for stat in ("count", "sum")
+]
+
+
+def _live_totals(conn):
+    """Recompute the summary columns straight from Soil_Sample."""
+    aggregates = ", ".join(
+        f"COUNT(ss.{col}) AS {col}_count, IFNULL(SUM(ss.{col}), 0) AS {col}_sum"
+        for col in NUTRIENT_COLUMNS
+    )
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT fl.region_name, COUNT(*) AS sample_count, {aggregates} "
+            f"FROM Soil_Sample ss "
+            f"JOIN Farm_Location fl "
+            f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+            f"WHERE fl.region_name IS NOT NULL "
+            f"GROUP BY fl.region_name"
+        )
+        return {row["region_name"]: row for row in cursor.fetchall()}
+
+
+def _stored_totals(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT region_name, {', '.join(SUMMARY_COLUMNS)} FROM Region_Fertility_Summary")
+        return {row["region_name"]: row for row in cursor.fetchall()}
+
+
+def check_consistency(conn=None):
+    """
+    Compare Region_Fertility_Summary with a full recomputation. Returns a
+    list of (region_name, column, stored, actual) for every difference;
+    an empty list means the summary is consistent.
+    """
+    own_conn = conn is None
+    conn = conn or get_connection()
+    try:
+        live = _live_totals(conn)
+        stored = _stored_totals(conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+    empty = {col: 0 for col in SUMMARY_COLUMNS}
+    mismatches = []
+    for region in sorted(set(live) | set(stored)):
+        actual = live.get(region, empty)
+        kept = stored.get(region, empty)
+        for col in SUMMARY_COLUMNS:
+            if Decimal(kept[col]) != Decimal(actual[col]):
+                mismatches.append((region, col, kept[col], actual[col]))
+    return mismatches
+
+
+def rebuild_region_summary():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.callproc("sp_rebuild_region_summary")
+            conn.commit()
+            cursor.execute("SELECT COUNT(*) AS regions FROM Region_Fertility_Summary")
+            return cursor.fetchone()["regions"]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regional fertility summary maintenance")
+    parser.add_argument("--check", action="store_true", help="compare the summary with Soil_Sample")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the summary from Soil_Sample")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_consistency()
+        if not mismatches:
+            print("Region_Fertility_Summary is consistent with Soil_Sample.")
+        for region, col, kept, actual in mismatches:
+            print(f"  {region}: {col} is {kept}, expected {actual}")
+        if mismatches and not args.rebuild:
+            print(f"{len(mismatches)} differences found. Run with --rebuild to repair.")
+    if args.rebuild:
+        regions = rebuild_region_summary()
+        print(f"Rebuilt fertility summary for {regions} regions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Monthly nutrient rollups per region and per lab.
+
+Nutrient_Rollup holds, for every (region or lab, month, nutrient), the count,
+sum, sum of squares, min and max of tested samples. Trend queries read these
+rows directly, so a multi-year series costs one indexed range read instead
+of a scan of Soil_Sample.
+
+refresh() is incremental. It finds tested samples whose updated_at is at or
+after the stored watermark, works out which (group, month) buckets they
+fall in, and recomputes just those buckets from Soil_Sample, so the refresh
+is exact even when a sample is edited. A bucket left stale by a change the
+watermark cannot see (a deleted sample, or a sample moved to another month
+or region) is repaired by --rebuild. Readers never refresh; run --refresh
+from cron or another scheduler so trends stay current.
+
+    python -m reports.rollups --refresh
+    python -m reports.rollups --trend region "North Region" nitrogen
+"""
+import argparse
+import math
+from collections import defaultdict
+from datetime import date
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+
+JOB_NAME = "nutrient_rollups"
+GROUP_KEYS = {"region": "fl.region_name", "lab": "ss.lab_id"}
+
+INSERT_ROLLUP = (
+    "INSERT INTO Nutrient_Rollup "
+    "(group_type, group_key, period, nutrient, sample_count, total, total_sq, min_value, max_value) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+def _month(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(period):
+    return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+
+
+def _aggregate(conn, group_type, conditions="", params=()):
+    """
+    Aggregate tested samples by (group, month) and return Nutrient_Rollup
+    rows, one per nutrient with at least one reading.
+    """
+    group_col = GROUP_KEYS[group_type]
+    stats = ", ".join(
+        f"COUNT(ss.{col}) AS {col}_n, SUM(ss.{col}) AS {col}_sum, "
+        f"SUM(ss.{col} * ss.{col}) AS {col}_sq, MIN(ss.{col}) AS {col}_min, MAX(ss.{col}) AS {col}_max"
+        for col in NUTRIENT_COLUMNS
+    )
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {group_col} AS group_key, "
+            f"DATE_FORMAT(ss.test_date, '%%Y-%%m-01') AS period, {stats} "
+            f"FROM Soil_Sample ss "
+            f"LEFT JOIN Farm_Location fl "
+            f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+            f"WHERE ss.sample_status = 'tested' AND {group_col} IS NOT NULL {conditions}"
+            f"GROUP BY group_key, period",
+            params
+        )
+        rows = cursor.fetchall()
+
+    rollups = []
+    for row in rows:
+        for col in NUTRIENT_COLUMNS:
+            if row[f"{col}_n"]:
+                rollups.append((
+                    group_type, str(row["group_key"]), row["period"], col, row[f"{col}_n"],
+                    row[f"{col}_sum"], row[f"{col}_sq"], row[f"{col}_min"], row[f"{col}_max"]
+                ))
+    return rollups
+
+
+def _get_watermark(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT watermark FROM Sync_Watermark WHERE job_name = %s", (JOB_NAME,))
+        row = cursor.fetchone()
+    return row["watermark"] if row else None
+
+
+def _set_watermark(conn, watermark):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO Sync_Watermark (job_name, watermark) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE watermark = VALUES(watermark)",
+            (JOB_NAME, watermark)
+        )
+
+
+def _changed_buckets(conn, watermark):
+    """
+    {group_type: {month: {group_key, ...}}} for tested samples updated at or
+    after `watermark`, plus the newest updated_at seen.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT fl.region_name, ss.lab_id, ss.test_date, ss.updated_at "
+            "FROM Soil_Sample ss "
+            "LEFT JOIN Farm_Location fl "
+            "ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+            "WHERE ss.sample_status = 'tested' AND ss.updated_at >= %s",
+            (watermark,)
+        )
+        rows = cursor.fetchall()
+
+    buckets = {group_type: defaultdict(set) for group_type in GROUP_KEYS}
+    newest = watermark
+    for row in rows:
+        period = _month(row["test_date"])
+        if row["region_name"] is not None:
+            buckets["region"][period].add(row["region_name"])
+        buckets["lab"][period].add(row["lab_id"])
+        newest = max(newest, row["updated_at"])
+    return buckets, newest
+
+
+def rebuild():
+    """Recompute every rollup from Soil_Sample and reset the watermark."""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT MAX(updated_at) AS newest FROM Soil_Sample")
+            newest = cursor.fetchone()["newest"]
+        rows = [row for group_type in GROUP_KEYS for row in _aggregate(conn, group_type)]
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM Nutrient_Rollup")
+            if rows:
+                cursor.executemany(INSERT_ROLLUP, rows)
+        _set_watermark(conn, newest)
+        conn.commit()
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def refresh():
+    """
+    Recompute only the buckets touched since the last refresh. Falls back to
+    rebuild() when there is no watermark yet. Returns the number of buckets
+    recomputed.
+    """
+    conn = get_connection()
+    try:
+        watermark = _get_watermark(conn)
+        if watermark is None:
+            conn.close()
+            conn = None
+            rebuild()
+            return None
+
+        buckets, newest = _changed_buckets(conn, watermark)
+        recomputed = 0
+        with conn.cursor() as cursor:
+            for group_type, by_month in buckets.items():
+                group_col = GROUP_KEYS[group_type]
+                for period, keys in by_month.items():
+                    keys = sorted(keys)
+                    placeholders = ", ".join(["%s"] * len(keys))
+                    end = _next_month(period)
+                    rows = _aggregate(
+                        conn, group_type,
+                        f"AND ss.test_date >= %s AND ss.test_date < %s AND {group_col} IN ({placeholders}) ",
+                        (period, end, *keys)
+                    )
+                    cursor.execute(
+                        f"DELETE FROM Nutrient_Rollup WHERE group_type = %s AND period = %s "
+                        f"AND group_key IN ({placeholders})",
+                        (group_type, period, *[str(key) for key in keys])
+                    )
+                    if rows:
+                        cursor.executemany(INSERT_ROLLUP, rows)
+                    recomputed += len(keys)
+        _set_watermark(conn, newest)
+        conn.commit()
+        return recomputed
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def get_trend(group_type, group_key, nutrient, start=None, end=None):
+    """
+    Monthly series for one nutrient of one region or lab: a list of dicts
+    with period, count, mean, stddev, min and max, oldest first. `start` and
+    `end` are optional dates bounding the months returned.
+    """
+    if group_type not in GROUP_KEYS:
+        raise ValueError(f"group_type must be one of {', '.join(GROUP_KEYS)}")
+    if nutrient not in NUTRIENT_COLUMNS:
+        raise ValueError(f"Unknown nutrient: {nutrient}")
+
+    query = (
+        "SELECT period, sample_count, total, total_sq, min_value, max_value "
+        "FROM Nutrient_Rollup WHERE group_type = %s AND group_key = %s AND nutrient = %s"
+    )
+    params = [group_type, str(group_key), nutrient]
+    if start:
+        query += " AND period >= %s"
+        params.append(_month(start))
+    if end:
+        query += " AND period <= %s"
+        params.append(_month(end))
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query + " ORDER BY period", params)
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    series = []
+    for row in rows:
+        n = row["sample_count"]
+        total, total_sq = float(row["total"]), float(row["total_sq"])
+        mean = total / n
+        variance = (total_sq - n * mean * mean) / (n - 1) if n > 1 else 0.0
+        series.append({
+            "period": row["period"],
+            "count": n,
+            "mean": mean,
+            "stddev": math.sqrt(max(variance, 0.0)),
+            "min": float(row["min_value"]),
+            "max": float(row["max_value"]),
+        })
+    return series
+
+
+def print_trend(series, nutrient):
+    print(f"{'Month':<10}{'Samples':<10}{'Mean ' + nutrient:<20}{'Std Dev':<12}{'Min':<10}{'Max':<10}")
+    print("-" * 72)
+    for point in series:
+        print(f"{point['period'].strftime('%Y-%m'):<10}{point['count']:<10}{point['mean']:<20.2f}"
+              f"{point['stddev']:<12.2f}{point['min']:<10.2f}{point['max']:<10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monthly nutrient rollups per region and lab")
+    parser.add_argument("--refresh", action="store_true", help="recompute buckets changed since the last run")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every bucket")
+    parser.add_argument("--trend", nargs=3, metavar=("GROUP_TYPE", "GROUP_KEY", "NUTRIENT"))
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"Rebuilt {rebuild()} rollup rows.")
+    elif args.refresh:
+        recomputed = refresh()
+        if recomputed is None:
+            print("No watermark yet; rebuilt all rollups.")
+        else:
+            print(f"Recomputed {recomputed} region/lab month buckets.")
+    if args.trend:
+        group_type, group_key, nutrient = args.trend
+        print_trend(get_trend(group_type, group_key, nutrient), nutrient)
+
+
+if __name__ == "__main__":
+    main()
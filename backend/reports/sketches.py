@@ -0,0 +1,296 @@
+"""
+Mergeable quantile sketches of nutrient distributions per region and lab.
+
+Each (region or lab, nutrient) keeps a KLL sketch. The sketch is a stack of
+compactors: level h holds items that each stand for 2**h samples, and a
+full level is sorted and every other item promoted to the level above. With
+k = 200 the rank error is roughly 1%, whatever the number of samples, and
+the serialized sketch stays a few kilobytes. Two sketches merge by
+concatenating their levels and compacting, so a report can combine regions
+without touching raw rows.
+
+New test results are folded into small per-batch sketches, which are then
+merged into the stored ones under SELECT ... FOR UPDATE. Concurrent writers
+therefore combine their updates rather than overwrite each other.
+
+    python -m reports.sketches --rebuild
+    python -m reports.sketches --percentiles region "North Region"
+"""
+import argparse
+import json
+import math
+import random
+import numpy as np
+import pymysql
+from db.connection import get_connection
+from fertility.engine import NUTRIENT_COLUMNS
+
+DEFAULT_K = 200
+REPORT_QUANTILES = (0.1, 0.5, 0.9)
+
+
+class KLLSketch:
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels = [[]]
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _size(self):
+        return sum(len(items) for items in self.levels)
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def update(self, value):
+        value = float(value)
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.levels[0].append(value)
+        if self._size() >= self._max_size():
+            self._compress()
+
+    def _compress(self):
+        while self._size() >= self._max_size():
+            for level, items in enumerate(self.levels):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.levels):
+                        self.levels.append([])
+                    items.sort()
+                    # An odd item out stays behind so total weight is preserved.
+                    keep = [items.pop()] if len(items) % 2 else []
+                    offset = random.getrandbits(1)
+                    self.levels[level + 1].extend(items[offset::2])
+                    self.levels[level] = keep
+                    break
+
+    def merge(self, other):
+        """Fold `other` into this sketch in place and return self."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Approximate values at the quantiles `qs` (each in [0, 1]); None when empty."""
+        if not self.count:
+            return [None] * len(qs)
+        values = np.concatenate([np.asarray(items, dtype=np.float64) for items in self.levels])
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.float64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        total = cumulative[-1]
+        results = []
+        for q in qs:
+            if q <= 0:
+                results.append(self.min)
+            elif q >= 1:
+                results.append(self.max)
+            else:
+                idx = min(int(np.searchsorted(cumulative, q * total)), len(values) - 1)
+                results.append(float(values[idx]))
+        return results
+
+    def to_json(self):
+        return json.dumps({
+            "k": self.k, "n": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "levels": [[round(v, 2) for v in items] for items in self.levels],
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        sketch = cls(data["k"])
+        sketch.count = data["n"]
+        if sketch.count:
+            sketch.min, sketch.max = data["min"], data["max"]
+        sketch.levels = [list(items) for items in data["levels"]] or [[]]
+        return sketch
+
+
+def _group_keys(row):
+    keys = [("lab", str(row["lab_id"]))]
+    if row["region_name"] is not None:
+        keys.insert(0, ("region", row["region_name"]))
+    return keys
+
+
+def _save(conn, sketches, replace=False):
+    """
+    Merge {(group_type, group_key, nutrient): sketch} into Nutrient_Sketch,
+    or overwrite the stored rows when `replace` is set. Commits.
+    """
+    if not sketches:
+        return
+    keys = list(sketches)
+    with conn.cursor() as cursor:
+        if not replace:
+            placeholders = ", ".join(["(%s, %s, %s)"] * len(keys))
+            cursor.execute(
+                f"SELECT group_type, group_key, nutrient, sketch FROM Nutrient_Sketch "
+                f"WHERE (group_type, group_key, nutrient) IN ({placeholders}) FOR UPDATE",
+                [value for key in keys for value in key]
+            )
+            for row in cursor.fetchall():
+                key = (row["group_type"], row["group_key"], row["nutrient"])
+                sketches[key] = KLLSketch.from_json(row["sketch"]).merge(sketches[key])
+        cursor.executemany(
+            "INSERT INTO Nutrient_Sketch (group_type, group_key, nutrient, sample_count, sketch) "
+            "VALUES (%s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE sample_count = VALUES(sample_count), sketch = VALUES(sketch)",
+            [(*key, sketch.count, sketch.to_json()) for key, sketch in sketches.items()]
+        )
+    conn.commit()
+
+
+def record_soil_samples(samples):
+    """
+    Add freshly tested samples, given as (soil_id, values) pairs with values
+    in NUTRIENT_COLUMNS order, to their region and lab sketches.
+    """
+    samples = [(soil_id, values) for soil_id, values in samples if values]
+    if not samples:
+        return 0
+    conn = get_connection()
+    try:
+        placeholders = ", ".join(["%s"] * len(samples))
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT ss.soil_id, ss.lab_id, fl.region_name FROM Soil_Sample ss "
+                f"LEFT JOIN Farm_Location fl "
+                f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+                f"WHERE ss.soil_id IN ({placeholders})",
+                [soil_id for soil_id, _ in samples]
+            )
+            locations = {row["soil_id"]: row for row in cursor.fetchall()}
+
+        pending = {}
+        for soil_id, values in samples:
+            row = locations.get(soil_id)
+            if not row:
+                continue
+            for group_type, group_key in _group_keys(row):
+                for col, value in zip(NUTRIENT_COLUMNS, values):
+                    if value is not None:
+                        key = (group_type, group_key, col)
+                        pending.setdefault(key, KLLSketch()).update(value)
+        _save(conn, pending)
+        return len(pending)
+    finally:
+        conn.close()
+
+
+def load_sketches(group_type, group_keys=None, nutrients=NUTRIENT_COLUMNS):
+    """{(group_key, nutrient): KLLSketch} for the given groups (all groups if None)."""
+    query = "SELECT group_key, nutrient, sketch FROM Nutrient_Sketch WHERE group_type = %s"
+    params = [group_type]
+    if group_keys is not None:
+        if not group_keys:
+            return {}
+        query += f" AND group_key IN ({', '.join(['%s'] * len(group_keys))})"
+        params.extend(str(key) for key in group_keys)
+    query += f" AND nutrient IN ({', '.join(['%s'] * len(nutrients))})"
+    params.extend(nutrients)
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+    return {(row["group_key"], row["nutrient"]): KLLSketch.from_json(row["sketch"]) for row in rows}
+
+
+def get_percentiles(group_type, group_keys=None, nutrients=NUTRIENT_COLUMNS,
+                    quantiles=REPORT_QUANTILES, combined=False):
+    """
+    {group_key: {nutrient: [values at `quantiles`]}}. With `combined`, the
+    groups' sketches are merged and a single {nutrient: [...]} is returned.
+    """
+    sketches = load_sketches(group_type, group_keys, nutrients)
+    if combined:
+        merged = {}
+        for (_, nutrient), sketch in sketches.items():
+            if nutrient in merged:
+                merged[nutrient].merge(sketch)
+            else:
+                merged[nutrient] = sketch
+        return {nutrient: sketch.quantiles(quantiles) for nutrient, sketch in merged.items()}
+
+    results = {}
+    for (group_key, nutrient), sketch in sketches.items():
+        results.setdefault(group_key, {})[nutrient] = sketch.quantiles(quantiles)
+    return results
+
+
+def rebuild_sketches(chunk_size=10000):
+    """Recompute every sketch from the tested samples in Soil_Sample."""
+    sketches = {}
+    read_conn = get_connection()
+    try:
+        with read_conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(
+                f"SELECT ss.lab_id, fl.region_name, "
+                f"{', '.join('ss.' + col for col in NUTRIENT_COLUMNS)} "
+                f"FROM Soil_Sample ss "
+                f"LEFT JOIN Farm_Location fl "
+                f"ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude "
+                f"WHERE ss.sample_status = 'tested'"
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    for group_type, group_key in _group_keys(row):
+                        for col in NUTRIENT_COLUMNS:
+                            if row[col] is not None:
+                                key = (group_type, group_key, col)
+                                sketches.setdefault(key, KLLSketch()).update(row[col])
+    finally:
+        read_conn.close()
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM Nutrient_Sketch")
+        _save(conn, sketches, replace=True)
+    finally:
+        conn.close()
+    return len(sketches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nutrient quantile sketches per region and lab")
+    parser.add_argument("--rebuild", action="store_true", help="recompute sketches from all tested samples")
+    parser.add_argument("--percentiles", nargs=2, metavar=("GROUP_TYPE", "GROUP_KEY"))
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"Rebuilt {rebuild_sketches()} nutrient sketches.")
+    if args.percentiles:
+        group_type, group_key = args.percentiles
+        by_nutrient = get_percentiles(group_type, [group_key]).get(group_key, {})
+        print(f"{'Nutrient':<12}{'p10':>10}{'p50':>10}{'p90':>10}")
+        for nutrient in NUTRIENT_COLUMNS:
+            if nutrient in by_nutrient:
+                p10, p50, p90 = by_nutrient[nutrient]
+                print(f"{nutrient:<12}{p10:>10.2f}{p50:>10.2f}{p90:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+from ml.anomaly import MIN_SAMPLES, RunningStats
+
+
+def test_running_stats_match_numpy():
+    data = np.random.default_rng(7).normal(50, 10, size=(500, 9))
+    stats = RunningStats()
+    for row in data:
+        stats.update(row)
+    assert stats.count == 500
+    assert np.allclose(stats.mean, data.mean(axis=0))
+    assert np.allclose(stats.covariance(), np.cov(data, rowvar=False))
+
+
+def test_running_stats_score_is_mahalanobis_distance():
+    data = np.random.default_rng(3).normal(0, 1, size=(MIN_SAMPLES + 200, 9))
+    stats = RunningStats()
+    assert stats.score(data[0]) is None
+    for row in data:
+        stats.update(row)
+    assert stats.score(stats.mean) == pytest.approx(0.0, abs=1e-9)
+    far = stats.mean + 10 * np.sqrt(np.diag(stats.covariance()))
+    assert stats.score(far) > 10
+
+
+def test_running_stats_merge_matches_single_pass():
+    data = np.random.default_rng(9).normal(40, 8, size=(300, 9))
+    a, b, whole = RunningStats(), RunningStats(), RunningStats()
+    for row in data[:120]:
+        a.update(row)
+    for row in data[120:]:
+        b.update(row)
+    for row in data:
+        whole.update(row)
+    a.merge(b)
+    assert a.count == whole.count
+    assert np.allclose(a.mean, whole.mean)
+    assert np.allclose(a.comoment, whole.comoment)
+    assert RunningStats().merge(whole).count == whole.count
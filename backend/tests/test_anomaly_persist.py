@@ -0,0 +1,63 @@
+import json
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+from ml.anomaly import AnomalyDetector
+
+
+class StatsTable:
+    """Nutrient_Stats held in a dict, behind the two statements persist() issues."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        keys = list(zip(params[0::2], params[1::2]))
+        self._fetched = [
+            {"group_type": key[0], "group_key": key[1], **self.rows[key]}
+            for key in keys if key in self.rows
+        ]
+
+    def fetchall(self):
+        return self._fetched
+
+    def executemany(self, sql, rows):
+        for group_type, group_key, count, mean, comoment in rows:
+            self.rows[(group_type, group_key)] = {
+                "sample_count": count, "mean_vector": mean, "comoment_matrix": comoment
+            }
+
+    def commit(self):
+        pass
+
+
+def test_two_processes_persist_without_overwriting_each_other():
+    data = np.random.default_rng(1).normal(50, 5, size=(80, 9))
+    table = StatsTable()
+    first, second = AnomalyDetector(persist_every=1000), AnomalyDetector(persist_every=1000)
+    for row in data[:30]:
+        first.observe(1, "North", row)
+    for row in data[30:]:
+        second.observe(1, "North", row)
+
+    assert first.persist(table) == 0          # below persist_every
+    first.persist(table, force=True)
+    second.persist(table, force=True)
+
+    stored = table.rows[("region", "North")]
+    assert stored["sample_count"] == len(data)
+    assert np.allclose(json.loads(stored["mean_vector"]), data.mean(axis=0))
+    assert second.groups[("lab", "1")].count == len(data)
+    assert second.persist(table, force=True) == 0   # nothing new to write
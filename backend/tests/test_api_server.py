@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+from api import server
+from api.server import ApiError, ApiServer, Request, read_request
+
+
+def request(method, path, token=None, body=b""):
+    headers = {"authorization": f"Bearer {token}"} if token else {}
+    return Request(method, path, {}, headers, body)
+
+
+def reader_for(data, limit=2 ** 16):
+    reader = asyncio.StreamReader(limit=limit)
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def test_sample_results_returns_the_single_row(monkeypatch):
+    sample = {"soil_id": 7, "farmer_id": 1, "lab_id": 3, "nitrogen": 40}
+    monkeypatch.setattr(server.sp, "get_soil_sample_results", lambda soil_id: dict(sample) if soil_id == 7 else None)
+
+    async def run():
+        api = ApiServer()
+        owner = api.sessions.create({"user_id": 1, "role": "Farmer"})
+        other = api.sessions.create({"user_id": 2, "role": "Farmer"})
+        technician = api.sessions.create({"user_id": 9, "role": "Lab_Technician", "lab_id": 3})
+        assert await api.dispatch(request("GET", "/samples/7/results", owner)) == (200, sample)
+        assert await api.dispatch(request("GET", "/samples/7/results", technician)) == (200, sample)
+        for token, path, status in [(other, "/samples/7/results", 403), (owner, "/samples/8/results", 404)]:
+            with pytest.raises(ApiError) as e:
+                await api.dispatch(request("GET", path, token))
+            assert e.value.status == status
+
+    asyncio.run(run())
+
+
+def test_timeout_answers_at_once_and_frees_the_slot_when_the_handler_ends(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(server, "ROUTES", [("GET", server.re.compile(r"/slow\Z"),
+                                           lambda request: release.wait(5) and (200, {}), None)])
+
+    async def run():
+        api = ApiServer(max_concurrent=1, queue_timeout=0.05, request_timeout=0.05)
+        started = time.monotonic()
+        with pytest.raises(ApiError) as e:
+            await api.dispatch(request("GET", "/slow"))
+        assert e.value.status == 504
+        assert time.monotonic() - started < 1
+        assert api.in_flight == 1
+
+        # The handler still holds the only slot.
+        with pytest.raises(ApiError) as e:
+            await api.dispatch(request("GET", "/slow"))
+        assert e.value.status == 503
+
+        release.set()
+        while api.in_flight:
+            await asyncio.sleep(0.01)
+        assert await api.dispatch(request("GET", "/slow")) == (200, {})
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("data", [
+    b"GET / HTTP/1.1\r\nContent-Length: ten\r\n\r\n",
+    b"GET / HTTP/1.1\r\nContent-Length: -1\r\n\r\n",
+    b"GET / HTTP/1.1\r\nX-Long: " + b"a" * 200 + b"\r\n\r\n",
+])
+def test_bad_requests_are_400(data):
+    async def run():
+        with pytest.raises(ApiError) as e:
+            await read_request(reader_for(data, limit=128))
+        assert e.value.status == 400
+
+    asyncio.run(run())
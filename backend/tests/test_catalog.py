@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+from reference.catalog import cached_latest_sample, invalidate_latest_samples
+
+
+@pytest.mark.parametrize("invalidated", [None, 5])
+def test_fetch_that_races_new_results_is_not_cached(invalidated):
+    invalidate_latest_samples()
+    samples = [{"fertility_class_id": 1}, {"fertility_class_id": 2}]
+
+    def fetch_then_submit(farmer_id):
+        sample = samples.pop(0)
+        # The farmer's new results are committed while this fetch is in flight.
+        invalidate_latest_samples(invalidated)
+        return sample
+
+    assert cached_latest_sample(5, fetch_then_submit) == {"fertility_class_id": 1}
+    assert cached_latest_sample(5, lambda farmer_id: samples.pop(0)) == {"fertility_class_id": 2}
+    assert cached_latest_sample(5, lambda farmer_id: None) == {"fertility_class_id": 2}
@@ -0,0 +1,95 @@
+from decimal import Decimal, ROUND_HALF_UP
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+from fertility.decision_table import DecisionTable
+from fertility.engine import DEFAULT_CUTOFFS, classify, classify_rows, parity_cases
+
+
+def sql_class(n, p, k, cutoffs=DEFAULT_CUTOFFS):
+    """fn_calculate_fertility_class: DECIMAL(5,2) parameters, NULL compares false."""
+    def dec(value):
+        return None if value is None else Decimal(str(value)).quantize(Decimal("0.01"), ROUND_HALF_UP)
+
+    def ge(value, cut):
+        return value is not None and value >= dec(cut)
+
+    n, p, k = dec(n), dec(p), dec(k)
+    if (ge(n, cutoffs[(1, "min_nitrogen")]) and ge(p, cutoffs[(1, "min_phosphorus")])
+            and ge(k, cutoffs[(1, "min_potassium")])):
+        return 1
+    if ge(n, cutoffs[(2, "min_nitrogen")]):
+        return 2
+    if ge(n, cutoffs[(3, "min_nitrogen")]):
+        return 3
+    return 4
+
+
+CUSTOM_CUTOFFS = {
+    (1, "min_nitrogen"): 80.5,
+    (1, "min_phosphorus"): 40,
+    (1, "min_potassium"): 55.25,
+    (2, "min_nitrogen"): 60,
+    (3, "min_nitrogen"): 25.75,
+}
+
+
+def columns(cases):
+    block = np.array(cases, dtype=object)
+    return block[:, 0], block[:, 1], block[:, 2]
+
+
+@pytest.mark.parametrize("cutoffs", [DEFAULT_CUTOFFS, CUSTOM_CUTOFFS])
+def test_classify_matches_sql_cutoffs_on_boundaries(cutoffs):
+    cases = parity_cases(cutoffs)
+    expected = [sql_class(n, p, k, cutoffs) for n, p, k in cases]
+    assert classify(*columns(cases), cutoffs=cutoffs).tolist() == expected
+
+
+@pytest.mark.parametrize("n, p, k, expected", [
+    (70, 45, 50, 1),
+    (69.99, 45, 50, 2),
+    (69.995, 45, 50, 1),     # rounds up to the cutoff as a DECIMAL(5,2)
+    (69.994, 45, 50, 2),
+    (70, 44.99, 50, 2),
+    (50, None, None, 2),
+    (49.99, 45, 50, 3),
+    (30, 0, 0, 3),
+    (29.99, 99, 99, 4),
+    (None, 99, 99, 4),
+])
+def test_classify_fixed_cases(n, p, k, expected):
+    assert sql_class(n, p, k) == expected
+    assert classify([n], [p], [k]).tolist() == [expected]
+
+
+def test_classify_rows_accepts_dict_rows():
+    rows = [{"nitrogen": 75, "phosphorus": 50, "potassium": 60},
+            {"nitrogen": None, "phosphorus": 50, "potassium": 60}]
+    assert classify_rows(rows).tolist() == [1, 4]
+
+
+def threshold_rows(cutoffs):
+    rows = [{"fertility_class_id": class_id} for class_id in (1, 2, 3, 4)]
+    for (class_id, column), value in cutoffs.items():
+        rows[class_id - 1][column] = value
+    return rows
+
+
+@pytest.mark.parametrize("cutoffs", [DEFAULT_CUTOFFS, CUSTOM_CUTOFFS])
+def test_decision_table_bands_match_sql(cutoffs):
+    table = DecisionTable(threshold_rows(cutoffs))
+    cases = parity_cases(cutoffs)
+    expected = [sql_class(n, p, k, cutoffs) for n, p, k in cases]
+    assert table.classify(*columns(cases)).tolist() == expected
+
+
+def test_decision_table_falls_back_to_defaults_for_null_thresholds():
+    table = DecisionTable([{"fertility_class_id": 1, "min_nitrogen": None}])
+    assert table.classify_one(70, 45, 50) == 1
+    assert table.classify_one(50, 0, 0) == 2
+    assert table.classify_one(30, 0, 0) == 3
+    assert table.classify_one(29.99, 0, 0) == 4
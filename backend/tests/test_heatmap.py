@@ -0,0 +1,128 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+import geo.heatmap as heatmap
+from fertility.engine import NUTRIENT_COLUMNS
+from geo.heatmap import HeatmapCache
+
+
+def farm_row(lat, lon, nitrogen, n=1):
+    row = {"latitude": lat, "longitude": lon, "region_name": "North"}
+    for col in NUTRIENT_COLUMNS:
+        row[f"{col}_sum"] = nitrogen * n if col == "nitrogen" else None
+        row[f"{col}_n"] = n if col == "nitrogen" else 0
+    return row
+
+
+class Database:
+    """
+    Soil_Sample behind the queries the cache issues: `nitrogen` maps a farm
+    to its one tested sample, `changed` lists the farms with samples inside
+    the updated_at window.
+    """
+
+    def __init__(self, nitrogen, fingerprint):
+        self.nitrogen, self.fingerprint = dict(nitrogen), fingerprint
+        self.changed = []
+        self.full_loads = 0
+
+    def connect(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if "DISTINCT" in sql:
+            self._result = [{"latitude": lat, "longitude": lon, "region_name": "North"}
+                            for lat, lon in self.changed]
+        elif "GROUP BY" in sql:
+            wanted = set(zip(params[0::2], params[1::2])) if params else set(self.nitrogen)
+            self.full_loads += not params
+            self._result = [farm_row(lat, lon, value)
+                            for (lat, lon), value in self.nitrogen.items() if (lat, lon) in wanted]
+
+    def fetchone(self):
+        return {"samples": self.fingerprint[0], "updated_at": self.fingerprint[1]}
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+
+FARM, FAR_FARM = (11.0, 71.0), (30.0, 80.0)
+
+
+def nitrogen_at(cache, farm=FARM):
+    return cache.get_tile("nitrogen", 10, *heatmap.tiles_covering(10, *farm, *farm)[0])
+
+
+def test_other_writers_only_invalidate_tiles_near_their_farms(monkeypatch):
+    db = Database({FARM: 40.0, FAR_FARM: 20.0}, (2, "t1"))
+    monkeypatch.setattr(heatmap, "get_connection", db.connect)
+    cache = HeatmapCache(ttl=0.0)
+    assert np.nanmax(nitrogen_at(cache)) == pytest.approx(40.0)
+    assert np.nanmax(nitrogen_at(cache, FAR_FARM)) == pytest.approx(20.0)
+
+    db.nitrogen[FARM], db.changed, db.fingerprint = 60.0, [FARM], (2, "t2")
+    assert np.nanmax(nitrogen_at(cache)) == pytest.approx(60.0)
+    misses = cache.misses
+    assert np.nanmax(nitrogen_at(cache, FAR_FARM)) == pytest.approx(20.0)
+    assert cache.misses == misses
+    assert cache.watermark == "t2"
+    assert db.full_loads == 1
+
+
+def test_catching_up_after_a_local_write_keeps_the_tiles(monkeypatch):
+    db = Database({FARM: 40.0}, (1, "t1"))
+    monkeypatch.setattr(heatmap, "get_connection", db.connect)
+    cache = HeatmapCache(ttl=0.0)
+    nitrogen_at(cache)
+
+    db.nitrogen[FARM], db.changed, db.fingerprint = 50.0, [FARM], (1, "t2")
+    assert cache.set_farms([(*FARM, "North")], [farm_row(*FARM, 50.0)]) == 1
+    nitrogen_at(cache)
+    misses = cache.misses
+    # The overlap window sees the same farm again, but its sums did not move.
+    assert np.nanmax(nitrogen_at(cache)) == pytest.approx(50.0)
+    assert cache.misses == misses
+    assert db.full_loads == 1
+
+
+def test_deleted_samples_trigger_a_full_reload(monkeypatch):
+    db = Database({FARM: 40.0, FAR_FARM: 20.0}, (2, "t1"))
+    monkeypatch.setattr(heatmap, "get_connection", db.connect)
+    cache = HeatmapCache(ttl=0.0)
+    nitrogen_at(cache, FAR_FARM)
+
+    del db.nitrogen[FAR_FARM]
+    db.fingerprint = (1, "t1")
+    assert np.isnan(nitrogen_at(cache, FAR_FARM)).all()
+    assert db.full_loads == 2
+
+
+def test_resubmitted_sample_replaces_the_farm_sums(monkeypatch):
+    db = Database({FARM: 40.0}, (1, "t1"))
+    monkeypatch.setattr(heatmap, "get_connection", db.connect)
+    cache = HeatmapCache()
+    nitrogen_at(cache)
+
+    # The same sample is tested again with a new value: the farm still has one sample.
+    for dropped in (1, 0):
+        assert cache.set_farms([(11.0, 71.0, "North")], [farm_row(11.0, 71.0, 50.0)]) == dropped
+        assert cache.counts[0, 0] == 1
+        assert np.nanmax(nitrogen_at(cache)) == pytest.approx(50.0)
+
+    cache.set_farms([(11.0, 71.0, "North")], [])
+    assert np.isnan(nitrogen_at(cache)).all()
@@ -0,0 +1,37 @@
+import time
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("sklearn")
+
+from ml.inference import InferenceService
+
+
+class SlowModel:
+    feature_columns = ["nitrogen"]
+
+    def predict(self, X):
+        time.sleep(0.01)
+        return (X[:, 0] > 50).astype(int) + 1
+
+
+def test_stop_resolves_every_queued_request():
+    service = InferenceService(SlowModel(), {"feature_columns": ["nitrogen"]}, max_batch_size=2).start()
+    futures = [service.submit({"nitrogen": value}) for value in range(0, 100, 5)]
+    service.stop()
+    assert all(future.done() for future in futures)
+    assert [future.result() for future in futures] == [2 if value > 50 else 1 for value in range(0, 100, 5)]
+    with pytest.raises(RuntimeError):
+        service.submit({"nitrogen": 1})
+
+
+def test_stats_report_batches_and_latency():
+    service = InferenceService(SlowModel(), {"feature_columns": ["nitrogen"], "version": 3}).start()
+    try:
+        assert service.classify_many([{"nitrogen": 10}, {"nitrogen": 60}]) == [1, 2]
+    finally:
+        service.stop()
+    stats = service.stats()
+    assert stats["requests"] == 2 and stats["model_version"] == 3
+    assert stats["p50_ms"] is not None
@@ -0,0 +1,38 @@
+from db.lookup_cache import LABS, CROPS, LookupCache
+
+
+def test_load_that_races_an_invalidation_is_not_stored():
+    cache = LookupCache(ttl=60)
+    labs = [["old lab list"], ["new lab list"]]
+
+    def load_then_write():
+        value = labs.pop(0)
+        # Another thread adds a lab and invalidates while this load is in flight.
+        cache.invalidate(LABS)
+        return value
+
+    assert cache.get("sp_get_all_labs", (), LABS, load_then_write) == ["old lab list"]
+    assert cache.get("sp_get_all_labs", (), LABS, lambda: labs.pop(0)) == ["new lab list"]
+    assert cache.get("sp_get_all_labs", (), LABS, lambda: ["not called"]) == ["new lab list"]
+
+
+def test_invalidating_every_group_also_discards_racing_loads():
+    cache = LookupCache(ttl=60)
+
+    def load_then_invalidate_all():
+        cache.invalidate()
+        return ["stale crops"]
+
+    cache.get("sp_get_all_crops", (), CROPS, load_then_invalidate_all)
+    assert cache.get("sp_get_all_crops", (), CROPS, lambda: ["fresh crops"]) == ["fresh crops"]
+
+
+def test_other_groups_are_still_cached():
+    cache = LookupCache(ttl=60)
+
+    def load_then_invalidate_labs():
+        cache.invalidate(LABS)
+        return ["crops"]
+
+    cache.get("sp_get_all_crops", (), CROPS, load_then_invalidate_labs)
+    assert cache.get("sp_get_all_crops", (), CROPS, lambda: ["not called"]) == ["crops"]
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+pytest.importorskip("sklearn")
+
+import db.stored_procedures as sp
+
+
+def test_failing_hooks_do_not_fail_committed_results(monkeypatch, capsys):
+    landed = []
+
+    def broken(samples):
+        raise RuntimeError("Lost connection to MySQL server")
+
+    monkeypatch.setattr(sp, "observe_soil_samples", broken)
+    monkeypatch.setattr(sp, "record_soil_samples", broken)
+    monkeypatch.setattr(sp, "samples_landed", landed.extend)
+
+    samples = [(1, [10.0] * 9)]
+    assert sp.samples_tested(samples) == {}
+    assert landed == samples
+    assert capsys.readouterr().out.count("Lost connection") == 2
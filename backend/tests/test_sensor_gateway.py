@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+import ingest.sensor_gateway as gateway_module
+from ingest.sensor_gateway import SensorGateway
+
+
+class Connection:
+    def close(self):
+        pass
+
+
+class Resolver:
+    """Resolves a sample to its row unchanged."""
+
+    def __init__(self):
+        self.conn = None
+
+    def prefetch(self, batch):
+        pass
+
+    def resolve(self, sample):
+        return sample
+
+
+class Reader:
+    def __init__(self, lines):
+        self.lines = [line.encode() + b"\n" for line in lines]
+
+    async def readline(self):
+        return self.lines.pop(0) if self.lines else b""
+
+
+class Writer:
+    def close(self):
+        pass
+
+
+def test_non_object_lines_are_rejected():
+    gateway = SensorGateway()
+    lines = ["42", '"text"', "[1, 2]", "null", "not json"]
+    asyncio.run(gateway.handle_client(Reader(lines), Writer()))
+    assert gateway.stats.received == len(lines)
+    assert gateway.stats.rejected == len(lines)
+    assert gateway.queue.empty()
+
+
+def test_failed_batch_keeps_the_valid_rows(monkeypatch):
+    stored = []
+
+    def insert_batch(conn, rows):
+        if any(row == "bad" for row in rows):
+            raise RuntimeError("Data too long for column")
+        stored.extend(rows)
+
+    monkeypatch.setattr(gateway_module, "insert_batch", insert_batch)
+    monkeypatch.setattr(gateway_module, "get_connection", Connection)
+    gateway = SensorGateway()
+    gateway._conn, gateway._resolver = Connection(), Resolver()
+
+    assert gateway._write(["a", "bad", "b"]) == (2, 1)
+    assert stored == ["a", "b"]
+    assert gateway.stats.failed_batches == 1
+
+
+def test_writer_survives_a_failed_batch():
+    gateway = SensorGateway(batch_size=2, max_wait_ms=10)
+    calls = []
+
+    def write(batch):
+        calls.append(list(batch))
+        if len(calls) == 1:
+            raise RuntimeError("Lost connection to MySQL server")
+        return len(batch), 0
+
+    gateway._write = write
+    gateway._conn = Connection()
+
+    async def run():
+        writer = asyncio.create_task(gateway.batch_writer())
+        for sample in ["a", "b", "c", "d"]:
+            await gateway.queue.put(sample)
+            if sample == "b":
+                await gateway.queue.join()
+        await asyncio.wait_for(gateway.queue.join(), 5)
+        writer.cancel()
+
+    asyncio.run(run())
+    assert calls == [["a", "b"], ["c", "d"]]
+    assert gateway.stats.failed_batches == 1
+    assert gateway.stats.failed == 2
+    assert gateway.stats.written == 2
+    assert gateway._conn is None
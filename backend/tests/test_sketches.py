@@ -0,0 +1,47 @@
+import random
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+from reports.sketches import KLLSketch
+
+
+def rank_error(sketch, data, q):
+    value = sketch.quantiles([q])[0]
+    return abs(np.searchsorted(np.sort(data), value, side="right") / len(data) - q)
+
+
+def test_kll_quantiles_within_rank_error():
+    random.seed(11)
+    data = np.random.default_rng(11).uniform(0, 999.99, size=50000)
+    sketch = KLLSketch()
+    for value in data:
+        sketch.update(value)
+    assert sketch.count == len(data)
+    assert sketch.quantiles([0, 1]) == [data.min(), data.max()]
+    assert sum(len(items) * 2 ** level for level, items in enumerate(sketch.levels)) == len(data)
+    for q in (0.1, 0.5, 0.9):
+        assert rank_error(sketch, data, q) < 0.02
+
+
+def test_kll_merge_and_json_round_trip():
+    random.seed(5)
+    rng = np.random.default_rng(5)
+    left, right = rng.normal(30, 5, 20000), rng.normal(70, 5, 20000)
+    a, b = KLLSketch(), KLLSketch()
+    for value in left:
+        a.update(value)
+    for value in right:
+        b.update(value)
+    merged = KLLSketch.from_json(a.to_json()).merge(KLLSketch.from_json(b.to_json()))
+    both = np.concatenate([left, right])
+    assert merged.count == len(both)
+    for q in (0.1, 0.5, 0.9):
+        assert rank_error(merged, both, q) < 0.02
+
+
+def test_kll_empty_sketch():
+    assert KLLSketch().quantiles([0.5]) == [None]
+    assert KLLSketch.from_json(KLLSketch().to_json()).count == 0
@@ -0,0 +1,47 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pymysql")
+pytest.importorskip("dotenv")
+
+from geo.spatial_index import FarmIndex, haversine_km
+
+
+@pytest.fixture
+def farms():
+    rng = np.random.default_rng(7)
+    lats, lons = rng.uniform(10, 12, 400), rng.uniform(70, 72, 400)
+    return [{"latitude": round(lat, 6), "longitude": round(lon, 6), "user_id": i}
+            for i, (lat, lon) in enumerate(zip(lats, lons))]
+
+
+def brute_force(farms, lat, lon):
+    distances = haversine_km(lat, lon, np.array([f["latitude"] for f in farms]),
+                             np.array([f["longitude"] for f in farms]))
+    return sorted(zip(distances, (f["user_id"] for f in farms)))
+
+
+def test_within_radius_matches_a_full_scan(farms):
+    index = FarmIndex(farms)
+    found = index.within_radius(11.0, 71.0, 25.0)
+    expected = [user_id for distance, user_id in brute_force(farms, 11.0, 71.0) if distance <= 25.0]
+    assert [f["user_id"] for f in found] == expected
+    assert all(f["distance_km"] <= 25.0 for f in found)
+
+
+def test_nearest_matches_a_full_scan(farms):
+    index = FarmIndex(farms)
+    found = index.nearest(10.5, 71.5, k=7)
+    assert [f["user_id"] for f in found] == [user_id for _, user_id in brute_force(farms, 10.5, 71.5)[:7]]
+
+
+def test_bbox_and_updates(farms):
+    index = FarmIndex(farms)
+    inside = {f["user_id"] for f in farms
+              if 10.5 <= f["latitude"] <= 11.0 and 70.5 <= f["longitude"] <= 71.0}
+    assert {f["user_id"] for f in index.in_bbox(10.5, 70.5, 11.0, 71.0)} == inside
+
+    index.remove(farms[0]["latitude"], farms[0]["longitude"])
+    index.add({"latitude": 10.75, "longitude": 70.75, "user_id": 999})
+    found = {f["user_id"] for f in index.in_bbox(10.5, 70.5, 11.0, 71.0)}
+    assert found == (inside - {0}) | {999}
@@ -174,6 +174,9 @@ CREATE PROCEDURE sp_add_farm_location(
 BEGIN
     INSERT INTO Farm_Location(region_name, street, city, state, country, zipcode, latitude, longitude, user_id)
     VALUES(in_region_name, in_street, in_city, in_state, in_country, in_zipcode, in_latitude, in_longitude, in_user_id);
+
+    INSERT INTO Data_Version (table_name, version) VALUES ('Farm_Location', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1;
 END //
 DELIMITER ;
 
@@ -254,6 +257,79 @@ BEGIN
 END //
 DELIMITER ;
 
+-- Bulk variant for whole plates: in_results is a JSON array of
+-- {"soil_id": ..., "nitrogen": ..., ..., "moisture": ...} objects. Results are
+-- applied and classified by one set-based UPDATE, then the classes are returned.
+DROP PROCEDURE IF EXISTS sp_submit_soil_test_results_bulk;
+DELIMITER //
+CREATE PROCEDURE sp_submit_soil_test_results_bulk(
+    IN in_results JSON
+)
+BEGIN
+    DROP TEMPORARY TABLE IF EXISTS tmp_soil_results;
+    CREATE TEMPORARY TABLE tmp_soil_results (
+        soil_id INT PRIMARY KEY,
+        nitrogen DECIMAL(5,2),
+        phosphorus DECIMAL(5,2),
+        potassium DECIMAL(5,2),
+        calcium DECIMAL(5,2),
+        magnesium DECIMAL(5,2),
+        sulfur DECIMAL(5,2),
+        lime DECIMAL(5,2),
+        carbon DECIMAL(5,2),
+        moisture DECIMAL(5,2),
+        applied BOOLEAN NOT NULL DEFAULT FALSE
+    );
+
+    INSERT INTO tmp_soil_results (soil_id, nitrogen, phosphorus, potassium, calcium,
+        magnesium, sulfur, lime, carbon, moisture)
+    SELECT jt.*
+    FROM JSON_TABLE(in_results, '$[*]' COLUMNS (
+        soil_id INT PATH '$.soil_id' ERROR ON EMPTY ERROR ON ERROR,
+        nitrogen DECIMAL(5,2) PATH '$.nitrogen' ERROR ON EMPTY ERROR ON ERROR,
+        phosphorus DECIMAL(5,2) PATH '$.phosphorus' ERROR ON EMPTY ERROR ON ERROR,
+        potassium DECIMAL(5,2) PATH '$.potassium' ERROR ON EMPTY ERROR ON ERROR,
+        calcium DECIMAL(5,2) PATH '$.calcium' ERROR ON EMPTY ERROR ON ERROR,
+        magnesium DECIMAL(5,2) PATH '$.magnesium' ERROR ON EMPTY ERROR ON ERROR,
+        sulfur DECIMAL(5,2) PATH '$.sulfur' ERROR ON EMPTY ERROR ON ERROR,
+        lime DECIMAL(5,2) PATH '$.lime' ERROR ON EMPTY ERROR ON ERROR,
+        carbon DECIMAL(5,2) PATH '$.carbon' ERROR ON EMPTY ERROR ON ERROR,
+        moisture DECIMAL(5,2) PATH '$.moisture' ERROR ON EMPTY ERROR ON ERROR
+    )) AS jt;
+
+    UPDATE Soil_Sample ss
+    JOIN tmp_soil_results r ON ss.soil_id = r.soil_id
+    SET 
+        ss.nitrogen = r.nitrogen,
+        ss.phosphorus = r.phosphorus,
+        ss.potassium = r.potassium,
+        ss.calcium = r.calcium,
+        ss.magnesium = r.magnesium,
+        ss.sulfur = r.sulfur,
+        ss.lime = r.lime,
+        ss.carbon = r.carbon,
+        ss.moisture = r.moisture,
+        ss.test_date = NOW(),
+        ss.sample_status = 'tested',
+        ss.fertility_class_id = fn_calculate_fertility_class(
+            r.nitrogen, r.phosphorus, r.potassium, r.calcium, r.magnesium,
+            r.sulfur, r.lime, r.carbon, r.moisture
+        ),
+        r.applied = TRUE
+    WHERE ss.sample_status = 'waiting';
+
+    -- Only the samples this call actually tested; unknown or already
+    -- tested soil_ids are left out.
+    SELECT r.soil_id, ss.fertility_class_id AS Fertility_Class_ID
+    FROM tmp_soil_results r
+    JOIN Soil_Sample ss ON ss.soil_id = r.soil_id
+    WHERE r.applied
+    ORDER BY r.soil_id;
+
+    DROP TEMPORARY TABLE tmp_soil_results;
+END //
+DELIMITER ;
+
 
 DELIMITER //
 CREATE PROCEDURE sp_get_soil_sample_results(
@@ -300,6 +376,18 @@ BEGIN
 END //
 DELIMITER ;
 
+DELIMITER //
+CREATE PROCEDURE sp_set_soil_sample_class(
+    IN in_soil_id INT,
+    IN in_fertility_class_id INT
+)
+BEGIN
+    UPDATE Soil_Sample
+    SET fertility_class_id = in_fertility_class_id
+    WHERE soil_id = in_soil_id;
+END //
+DELIMITER ;
+
 DELIMITER //
 CREATE PROCEDURE sp_get_crop_recommendations(
     IN in_fert_class_id INT
@@ -404,6 +492,42 @@ DELIMITER ;
 
 
 
+-- Growth listings with the yield estimate in the same result set, so a
+-- listing is one round trip instead of one sp_get_yield_estimate call per record.
+DELIMITER //
+CREATE PROCEDURE sp_get_crop_growth_with_estimates(
+    IN in_farmer_id INT
+)
+BEGIN
+    SELECT cg.*, c.crop_name,
+           fn_yield_estimate_from_quantity(cg.yield_quantity) AS estimated_yield
+    FROM Crop_Growth cg
+    JOIN Crop c ON cg.crop_id = c.crop_id
+    WHERE cg.farmer_id = in_farmer_id
+    ORDER BY cg.start_date, cg.growth_id;
+END //
+DELIMITER ;
+
+
+
+DELIMITER //
+CREATE PROCEDURE sp_get_region_crop_growth_with_estimates(
+    IN in_region_name VARCHAR(100)
+)
+BEGIN
+    SELECT cg.*, c.crop_name,
+           fn_yield_estimate_from_quantity(cg.yield_quantity) AS estimated_yield
+    FROM Crop_Growth cg
+    JOIN Crop c ON cg.crop_id = c.crop_id
+    WHERE cg.farmer_id IN (
+        SELECT user_id FROM Farm_Location WHERE region_name = in_region_name
+    )
+    ORDER BY cg.farmer_id, cg.start_date, cg.growth_id;
+END //
+DELIMITER ;
+
+
+
 DELIMITER //
 CREATE PROCEDURE sp_map_farm_crop(
     IN in_farm_latitude DECIMAL(9,6),
@@ -427,17 +551,16 @@ CREATE PROCEDURE sp_get_regional_fertility_reports(
     IN in_region_name VARCHAR(100)
 )
 BEGIN
-    SELECT fl.region_name,
-           COUNT(ss.soil_id) AS total_samples,
-           AVG(ss.nitrogen) AS avg_nitrogen,
-           AVG(ss.phosphorus) AS avg_phosphorus,
-           AVG(ss.potassium) AS avg_potassium,
-           AVG(ss.moisture) AS avg_moisture
-    FROM Soil_Sample ss
-    JOIN Farm_Location fl 
-         ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude
-    WHERE fl.region_name = in_region_name
-    GROUP BY fl.region_name;
+    -- Served from the trigger-maintained summary instead of scanning Soil_Sample.
+    SELECT region_name,
+           sample_count AS total_samples,
+           nitrogen_sum / NULLIF(nitrogen_count, 0) AS avg_nitrogen,
+           phosphorus_sum / NULLIF(phosphorus_count, 0) AS avg_phosphorus,
+           potassium_sum / NULLIF(potassium_count, 0) AS avg_potassium,
+           moisture_sum / NULLIF(moisture_count, 0) AS avg_moisture
+    FROM Region_Fertility_Summary
+    WHERE region_name = in_region_name
+      AND sample_count > 0;
 END //
 DELIMITER ;
 
@@ -483,6 +606,9 @@ BEGIN
         min_moisture = IFNULL(in_min_moisture, min_moisture),
         max_moisture = IFNULL(in_max_moisture, max_moisture)
     WHERE fertility_class_id = in_fertility_class_id;
+
+    INSERT INTO Data_Version (table_name, version) VALUES ('Fertility_Class', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1;
 END //
 DELIMITER ;
 
@@ -645,19 +771,31 @@ BEGIN
 END //
 DELIMITER ;
 
+-- The yield estimate rule, applied to a yield_quantity already in hand so
+-- listings need no per-row lookup.
+DELIMITER //
+CREATE FUNCTION fn_yield_estimate_from_quantity(in_yield_quantity DECIMAL(6,2))
+RETURNS DECIMAL(6,2)
+DETERMINISTIC
+BEGIN
+    RETURN COALESCE(in_yield_quantity, 0) * 1.1;
+END //
+DELIMITER ;
+
 DELIMITER //
 CREATE FUNCTION fn_calculate_yield_estimate(in_growth_id INT)
 RETURNS DECIMAL(6,2)
 DETERMINISTIC
 BEGIN
     DECLARE yield_est DECIMAL(6,2);
-    SELECT COALESCE(yield_quantity, 0) * 1.1 INTO yield_est
+    SELECT fn_yield_estimate_from_quantity(yield_quantity) INTO yield_est
     FROM Crop_Growth
     WHERE growth_id = in_growth_id;
     RETURN yield_est;
 END //
 DELIMITER ;
 
+DROP FUNCTION IF EXISTS fn_calculate_fertility_class;
 DELIMITER //
 CREATE FUNCTION fn_calculate_fertility_class(
     n_val DECIMAL(5,2), 
@@ -670,14 +808,23 @@ CREATE FUNCTION fn_calculate_fertility_class(
     c_val DECIMAL(5,2), 
     moisture_val DECIMAL(5,2)
 ) RETURNS INT
-DETERMINISTIC
+READS SQL DATA
 BEGIN
     DECLARE fert_class INT;
-    IF n_val >= 70 AND p_val >= 45 AND k_val >= 50 THEN
+    DECLARE vh_n, vh_p, vh_k, h_n, m_n DECIMAL(5,2);
+
+    -- Cutoffs come from Fertility_Class so admin threshold edits apply;
+    -- the literals are only used if a threshold has been left NULL.
+    SELECT min_nitrogen, min_phosphorus, min_potassium INTO vh_n, vh_p, vh_k
+    FROM Fertility_Class WHERE fertility_class_id = 1;
+    SELECT min_nitrogen INTO h_n FROM Fertility_Class WHERE fertility_class_id = 2;
+    SELECT min_nitrogen INTO m_n FROM Fertility_Class WHERE fertility_class_id = 3;
+
+    IF n_val >= COALESCE(vh_n, 70) AND p_val >= COALESCE(vh_p, 45) AND k_val >= COALESCE(vh_k, 50) THEN
         SET fert_class = 1;
-    ELSEIF n_val >= 50 THEN
+    ELSEIF n_val >= COALESCE(h_n, 50) THEN
         SET fert_class = 2;
-    ELSEIF n_val >= 30 THEN
+    ELSEIF n_val >= COALESCE(m_n, 30) THEN
         SET fert_class = 3;
     ELSE
         SET fert_class = 4;
@@ -776,6 +923,20 @@ END //
 
 DELIMITER ;
 
+DELIMITER //
+CREATE PROCEDURE sp_set_lab_location(
+    IN in_lab_id INT,
+    IN in_latitude DECIMAL(9,6),
+    IN in_longitude DECIMAL(9,6)
+)
+BEGIN
+    UPDATE Soil_Test_Lab
+    SET latitude = in_latitude, longitude = in_longitude
+    WHERE lab_id = in_lab_id;
+END //
+
+DELIMITER ;
+
 -- Lab Technician Additions
 
 
@@ -1004,4 +1165,301 @@ CREATE PROCEDURE sp_manage_users(
          contact_number = IFNULL(in_contact, contact_number)
     WHERE user_id = in_user_id;
  END //
- DELIMITER ;
\ No newline at end of file
+ DELIMITER ;
+
+
+/* ===============================
+   6. Contamination / Anomaly Detection
+   =============================== */
+
+DELIMITER //
+CREATE PROCEDURE sp_flag_soil_anomaly(
+    IN in_soil_id INT,
+    IN in_lab_id INT,
+    IN in_region_name VARCHAR(100),
+    IN in_anomaly_score DECIMAL(8,3),
+    IN in_flagged_by ENUM('region', 'lab')
+)
+BEGIN
+    INSERT INTO Soil_Anomaly (soil_id, lab_id, region_name, anomaly_score, flagged_by)
+    VALUES (in_soil_id, in_lab_id, in_region_name, in_anomaly_score, in_flagged_by);
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE PROCEDURE sp_get_lab_anomalies(
+    IN in_lab_id INT
+)
+BEGIN
+    SELECT sa.anomaly_id, sa.soil_id, ss.sample_name, sa.region_name,
+           sa.anomaly_score, sa.flagged_by, sa.flagged_at
+    FROM Soil_Anomaly sa
+    JOIN Soil_Sample ss ON sa.soil_id = ss.soil_id
+    WHERE sa.lab_id = in_lab_id
+    ORDER BY sa.flagged_at DESC;
+END //
+DELIMITER ;
+
+
+/* ===============================
+   7. Regional Fertility Summary
+   =============================== */
+
+-- Adds (in_sign = 1) or removes (in_sign = -1) one sample's nutrients from
+-- its region's row in Region_Fertility_Summary.
+DELIMITER //
+CREATE PROCEDURE sp_apply_region_summary_delta(
+    IN in_latitude DECIMAL(9,6),
+    IN in_longitude DECIMAL(9,6),
+    IN in_sign INT,
+    IN in_nitrogen DECIMAL(5,2),
+    IN in_phosphorus DECIMAL(5,2),
+    IN in_potassium DECIMAL(5,2),
+    IN in_calcium DECIMAL(5,2),
+    IN in_magnesium DECIMAL(5,2),
+    IN in_sulfur DECIMAL(5,2),
+    IN in_lime DECIMAL(5,2),
+    IN in_carbon DECIMAL(5,2),
+    IN in_moisture DECIMAL(5,2)
+)
+BEGIN
+    DECLARE v_region_name VARCHAR(100) DEFAULT NULL;
+
+    SELECT region_name INTO v_region_name
+    FROM Farm_Location
+    WHERE latitude = in_latitude AND longitude = in_longitude;
+
+    IF v_region_name IS NOT NULL THEN
+        INSERT INTO Region_Fertility_Summary (region_name, sample_count, nitrogen_count, nitrogen_sum, phosphorus_count, phosphorus_sum, potassium_count, potassium_sum, calcium_count, calcium_sum, magnesium_count, magnesium_sum, sulfur_count, sulfur_sum, lime_count, lime_sum, carbon_count, carbon_sum, moisture_count, moisture_sum)
+        VALUES (
+            v_region_name,
+            in_sign,
+            in_sign * (in_nitrogen IS NOT NULL),
+            in_sign * IFNULL(in_nitrogen, 0),
+            in_sign * (in_phosphorus IS NOT NULL),
+            in_sign * IFNULL(in_phosphorus, 0),
+            in_sign * (in_potassium IS NOT NULL),
+            in_sign * IFNULL(in_potassium, 0),
+            in_sign * (in_calcium IS NOT NULL),
+            in_sign * IFNULL(in_calcium, 0),
+            in_sign * (in_magnesium IS NOT NULL),
+            in_sign * IFNULL(in_magnesium, 0),
+            in_sign * (in_sulfur IS NOT NULL),
+            in_sign * IFNULL(in_sulfur, 0),
+            in_sign * (in_lime IS NOT NULL),
+            in_sign * IFNULL(in_lime, 0),
+            in_sign * (in_carbon IS NOT NULL),
+            in_sign * IFNULL(in_carbon, 0),
+            in_sign * (in_moisture IS NOT NULL),
+            in_sign * IFNULL(in_moisture, 0)
+        )
+        ON DUPLICATE KEY UPDATE
+        sample_count = sample_count + VALUES(sample_count),
+        nitrogen_count = nitrogen_count + VALUES(nitrogen_count),
+        nitrogen_sum = nitrogen_sum + VALUES(nitrogen_sum),
+        phosphorus_count = phosphorus_count + VALUES(phosphorus_count),
+        phosphorus_sum = phosphorus_sum + VALUES(phosphorus_sum),
+        potassium_count = potassium_count + VALUES(potassium_count),
+        potassium_sum = potassium_sum + VALUES(potassium_sum),
+        calcium_count = calcium_count + VALUES(calcium_count),
+        calcium_sum = calcium_sum + VALUES(calcium_sum),
+        magnesium_count = magnesium_count + VALUES(magnesium_count),
+        magnesium_sum = magnesium_sum + VALUES(magnesium_sum),
+        sulfur_count = sulfur_count + VALUES(sulfur_count),
+        sulfur_sum = sulfur_sum + VALUES(sulfur_sum),
+        lime_count = lime_count + VALUES(lime_count),
+        lime_sum = lime_sum + VALUES(lime_sum),
+        carbon_count = carbon_count + VALUES(carbon_count),
+        carbon_sum = carbon_sum + VALUES(carbon_sum),
+        moisture_count = moisture_count + VALUES(moisture_count),
+        moisture_sum = moisture_sum + VALUES(moisture_sum);
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_region_summary_after_insert
+AFTER INSERT ON Soil_Sample
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_region_summary_delta(NEW.farm_latitude, NEW.farm_longitude, 1,
+        NEW.nitrogen, NEW.phosphorus, NEW.potassium, NEW.calcium, NEW.magnesium, NEW.sulfur, NEW.lime, NEW.carbon, NEW.moisture);
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_region_summary_after_update
+AFTER UPDATE ON Soil_Sample
+FOR EACH ROW
+BEGIN
+    IF NOT (NEW.farm_latitude <=> OLD.farm_latitude) OR NOT (NEW.farm_longitude <=> OLD.farm_longitude)
+       OR NOT (NEW.nitrogen <=> OLD.nitrogen) OR NOT (NEW.phosphorus <=> OLD.phosphorus) OR NOT (NEW.potassium <=> OLD.potassium) OR NOT (NEW.calcium <=> OLD.calcium) OR NOT (NEW.magnesium <=> OLD.magnesium) OR NOT (NEW.sulfur <=> OLD.sulfur) OR NOT (NEW.lime <=> OLD.lime) OR NOT (NEW.carbon <=> OLD.carbon) OR NOT (NEW.moisture <=> OLD.moisture) THEN
+        CALL sp_apply_region_summary_delta(OLD.farm_latitude, OLD.farm_longitude, -1,
+            OLD.nitrogen, OLD.phosphorus, OLD.potassium, OLD.calcium, OLD.magnesium, OLD.sulfur, OLD.lime, OLD.carbon, OLD.moisture);
+        CALL sp_apply_region_summary_delta(NEW.farm_latitude, NEW.farm_longitude, 1,
+            NEW.nitrogen, NEW.phosphorus, NEW.potassium, NEW.calcium, NEW.magnesium, NEW.sulfur, NEW.lime, NEW.carbon, NEW.moisture);
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_region_summary_after_delete
+AFTER DELETE ON Soil_Sample
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_region_summary_delta(OLD.farm_latitude, OLD.farm_longitude, -1,
+        OLD.nitrogen, OLD.phosphorus, OLD.potassium, OLD.calcium, OLD.magnesium, OLD.sulfur, OLD.lime, OLD.carbon, OLD.moisture);
+END //
+DELIMITER ;
+
+-- Recomputes the whole summary from Soil_Sample. Needed after changes the
+-- triggers cannot see: rows removed by ON DELETE CASCADE and farms whose
+-- region_name is edited.
+DELIMITER //
+CREATE PROCEDURE sp_rebuild_region_summary()
+BEGIN
+    DELETE FROM Region_Fertility_Summary;
+    INSERT INTO Region_Fertility_Summary (region_name, sample_count, nitrogen_count, nitrogen_sum, phosphorus_count, phosphorus_sum, potassium_count, potassium_sum, calcium_count, calcium_sum, magnesium_count, magnesium_sum, sulfur_count, sulfur_sum, lime_count, lime_sum, carbon_count, carbon_sum, moisture_count, moisture_sum)
+    SELECT fl.region_name,
+           COUNT(*),
+           COUNT(ss.nitrogen),
+           IFNULL(SUM(ss.nitrogen), 0),
+           COUNT(ss.phosphorus),
+           IFNULL(SUM(ss.phosphorus), 0),
+           COUNT(ss.potassium),
+           IFNULL(SUM(ss.potassium), 0),
+           COUNT(ss.calcium),
+           IFNULL(SUM(ss.calcium), 0),
+           COUNT(ss.magnesium),
+           IFNULL(SUM(ss.magnesium), 0),
+           COUNT(ss.sulfur),
+           IFNULL(SUM(ss.sulfur), 0),
+           COUNT(ss.lime),
+           IFNULL(SUM(ss.lime), 0),
+           COUNT(ss.carbon),
+           IFNULL(SUM(ss.carbon), 0),
+           COUNT(ss.moisture),
+           IFNULL(SUM(ss.moisture), 0)
+    FROM Soil_Sample ss
+    JOIN Farm_Location fl
+         ON ss.farm_latitude = fl.latitude AND ss.farm_longitude = fl.longitude
+    WHERE fl.region_name IS NOT NULL
+    GROUP BY fl.region_name;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE PROCEDURE sp_get_all_regional_fertility_reports()
+BEGIN
+    SELECT region_name,
+           sample_count AS total_samples,
+           nitrogen_sum / NULLIF(nitrogen_count, 0) AS avg_nitrogen,
+           phosphorus_sum / NULLIF(phosphorus_count, 0) AS avg_phosphorus,
+           potassium_sum / NULLIF(potassium_count, 0) AS avg_potassium,
+           moisture_sum / NULLIF(moisture_count, 0) AS avg_moisture
+    FROM Region_Fertility_Summary
+    WHERE sample_count > 0
+    ORDER BY region_name;
+END //
+DELIMITER ;
+
+-- Initialise the summary for samples loaded before the triggers existed.
+CALL sp_rebuild_region_summary();
+
+
+/* ===============================
+   8. Reference Data Versioning
+   =============================== */
+
+-- Crop, Fertilizer and Crop_Fertilizer have no writer procedures, so
+-- triggers bump their Data_Version rows for in-memory reference indexes.
+DELIMITER //
+CREATE PROCEDURE sp_bump_data_version(
+    IN in_table_name VARCHAR(64)
+)
+BEGIN
+    INSERT INTO Data_Version (table_name, version) VALUES (in_table_name, 1)
+    ON DUPLICATE KEY UPDATE version = version + 1;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_crop_version_after_insert
+AFTER INSERT ON Crop
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Crop');
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_crop_version_after_update
+AFTER UPDATE ON Crop
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Crop');
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_crop_version_after_delete
+AFTER DELETE ON Crop
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Crop');
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_fertilizer_version_after_insert
+AFTER INSERT ON Fertilizer
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Fertilizer');
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_fertilizer_version_after_update
+AFTER UPDATE ON Fertilizer
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Fertilizer');
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_fertilizer_version_after_delete
+AFTER DELETE ON Fertilizer
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Fertilizer');
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_crop_fertilizer_version_after_insert
+AFTER INSERT ON Crop_Fertilizer
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Crop_Fertilizer');
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_crop_fertilizer_version_after_update
+AFTER UPDATE ON Crop_Fertilizer
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Crop_Fertilizer');
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER trg_crop_fertilizer_version_after_delete
+AFTER DELETE ON Crop_Fertilizer
+FOR EACH ROW
+BEGIN
+    CALL sp_bump_data_version('Crop_Fertilizer');
+END //
+DELIMITER ;
@@ -18,9 +18,9 @@ INSERT INTO Admin (user_id, hire_date) VALUES
 (1, '2020-01-15');
 
 -- Soil Test Labs
-INSERT INTO Soil_Test_Lab (lab_name, address, contact, admin_id) VALUES
-('AgriSoil Labs', '123 Green St, Jaipur', '9823456780', 1),
-('SoilCheck Center', '456 Farm Rd, Pune', '9876543212', 1);
+INSERT INTO Soil_Test_Lab (lab_name, address, contact, admin_id, latitude, longitude) VALUES
+('AgriSoil Labs', '123 Green St, Jaipur', '9823456780', 1, 26.9124, 75.7873),
+('SoilCheck Center', '456 Farm Rd, Pune', '9876543212', 1, 18.5204, 73.8567);
 
 -- Lab Technicians
 INSERT INTO Lab_Technician (user_id, certification, specialization, hire_date, lab_id) VALUES
@@ -27,6 +27,8 @@ CREATE TABLE Soil_Test_Lab (
     address TEXT,
     contact VARCHAR(15),
     admin_id INT,
+    latitude DECIMAL(9,6) NULL,
+    longitude DECIMAL(9,6) NULL,
     FOREIGN KEY (admin_id) REFERENCES Admin(user_id)
         ON DELETE SET NULL ON UPDATE CASCADE
 );
@@ -69,6 +71,9 @@ CREATE TABLE Farm_Location (
         ON DELETE CASCADE ON UPDATE CASCADE
 );
 
+-- Farms by region (regional crop growth listings)
+CREATE INDEX idx_farm_location_region ON Farm_Location (region_name, user_id);
+
 -- 7. Fertility Class Table
 CREATE TABLE Fertility_Class (
     fertility_class_id INT PRIMARY KEY AUTO_INCREMENT,
@@ -144,6 +149,16 @@ CREATE TABLE Soil_Sample (
         ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+-- Nutrient indexes used to find samples near a changed fertility threshold
+CREATE INDEX idx_soil_sample_nitrogen ON Soil_Sample (nitrogen);
+CREATE INDEX idx_soil_sample_phosphorus ON Soil_Sample (phosphorus);
+CREATE INDEX idx_soil_sample_potassium ON Soil_Sample (potassium);
+-- Used by incremental jobs (updated_at watermark) and monthly rollups
+CREATE INDEX idx_soil_sample_updated_at ON Soil_Sample (updated_at);
+CREATE INDEX idx_soil_sample_test_date ON Soil_Sample (test_date);
+-- Per-lab waiting queue depth (lab routing, pending sample lists)
+CREATE INDEX idx_soil_sample_lab_status ON Soil_Sample (lab_id, sample_status);
+
 
 -- 11. Crop Growth Table
 CREATE TABLE Crop_Growth (
@@ -198,4 +213,94 @@ CREATE TABLE Sample_Testing (
 
     FOREIGN KEY (soil_id) REFERENCES Soil_Sample(soil_id)
         ON DELETE CASCADE ON UPDATE CASCADE
-);
\ No newline at end of file
+);
+
+-- 15. Data Version Table (bumped by writers so in-memory copies can reload)
+CREATE TABLE Data_Version (
+    table_name VARCHAR(64) PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0
+);
+
+-- 16. Nutrient Statistics (running mean and co-moment matrix per region / lab)
+CREATE TABLE Nutrient_Stats (
+    group_type ENUM('region', 'lab') NOT NULL,
+    group_key VARCHAR(100) NOT NULL,
+    sample_count INT NOT NULL,
+    mean_vector JSON NOT NULL,
+    comoment_matrix JSON NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_type, group_key)
+);
+
+-- 17. Soil Anomaly (samples flagged as possible contamination)
+CREATE TABLE Soil_Anomaly (
+    anomaly_id INT PRIMARY KEY AUTO_INCREMENT,
+    soil_id INT NOT NULL,
+    lab_id INT NOT NULL,
+    region_name VARCHAR(100),
+    anomaly_score DECIMAL(8,3) NOT NULL,
+    flagged_by ENUM('region', 'lab') NOT NULL,
+    flagged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_soil_anomaly_lab (lab_id, flagged_at),
+    FOREIGN KEY (soil_id) REFERENCES Soil_Sample(soil_id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (lab_id) REFERENCES Soil_Test_Lab(lab_id)
+        ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- 18. Regional Fertility Summary (per-region counts and sums, kept current by Soil_Sample triggers)
+CREATE TABLE Region_Fertility_Summary (
+    region_name VARCHAR(100) PRIMARY KEY,
+    sample_count INT NOT NULL DEFAULT 0,
+    nitrogen_count INT NOT NULL DEFAULT 0,
+    nitrogen_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    phosphorus_count INT NOT NULL DEFAULT 0,
+    phosphorus_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    potassium_count INT NOT NULL DEFAULT 0,
+    potassium_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    calcium_count INT NOT NULL DEFAULT 0,
+    calcium_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    magnesium_count INT NOT NULL DEFAULT 0,
+    magnesium_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    sulfur_count INT NOT NULL DEFAULT 0,
+    sulfur_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    lime_count INT NOT NULL DEFAULT 0,
+    lime_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    carbon_count INT NOT NULL DEFAULT 0,
+    carbon_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    moisture_count INT NOT NULL DEFAULT 0,
+    moisture_sum DECIMAL(15,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- 19. Nutrient Rollups (per region / lab, per month, per nutrient)
+CREATE TABLE Nutrient_Rollup (
+    group_type ENUM('region', 'lab') NOT NULL,
+    group_key VARCHAR(100) NOT NULL,
+    period DATE NOT NULL,
+    nutrient VARCHAR(20) NOT NULL,
+    sample_count INT NOT NULL,
+    total DECIMAL(15,2) NOT NULL,
+    total_sq DECIMAL(20,4) NOT NULL,
+    min_value DECIMAL(5,2) NOT NULL,
+    max_value DECIMAL(5,2) NOT NULL,
+    PRIMARY KEY (group_type, group_key, nutrient, period)
+);
+
+-- 20. Sync Watermarks (last updated_at processed by incremental jobs)
+CREATE TABLE Sync_Watermark (
+    job_name VARCHAR(64) PRIMARY KEY,
+    watermark TIMESTAMP NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- 21. Nutrient Sketches (mergeable KLL quantile sketch per region / lab and nutrient)
+CREATE TABLE Nutrient_Sketch (
+    group_type ENUM('region', 'lab') NOT NULL,
+    group_key VARCHAR(100) NOT NULL,
+    nutrient VARCHAR(20) NOT NULL,
+    sample_count INT NOT NULL,
+    sketch JSON NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_type, group_key, nutrient)
+);